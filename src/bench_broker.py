@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+発注・約定待ちのスループット計測用スクリプト
+kabuステーションAPIの模擬サーバー（taq/simulator.py）を起動し、
+trader.execute_orders で複数銘柄の成行注文を同時に発注して所要時間を計測する
+
+このスクリプトは模擬サーバーにのみ接続し、実際の取引は行いません。
+"""
+
+import sys
+import time
+import argparse
+
+from logger import flush
+from taq import api_client, trader
+from taq.simulator import DEFAULT_CONFIG, start_simulator
+from taq.token_store import get_token_manager
+
+def main():
+    parser = argparse.ArgumentParser(description="発注・約定待ちのスループット計測")
+    parser.add_argument('--orders', type=int, default=50, help="発注する注文数")
+    parser.add_argument('--workers', type=int, default=trader.ORDER_WORKERS, help="同時に処理する注文数")
+    parser.add_argument('--port', type=int, default=18999, help="模擬サーバーのポート")
+    parser.add_argument('--latency-ms', type=float, default=20.0)
+    parser.add_argument('--latency-tail-ms', type=float, default=30.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--order-rate-limit', type=float, default=DEFAULT_CONFIG['order_rate_limit'], help="発注系APIの秒間リクエスト上限（0で無制限）")
+    parser.add_argument('--info-rate-limit', type=float, default=DEFAULT_CONFIG['info_rate_limit'], help="情報系APIの秒間リクエスト上限（0で無制限）")
+    parser.add_argument('--fill-delay', type=float, default=2.0)
+    args = parser.parse_args()
+
+    server, simulator = start_simulator(
+        args.port,
+        latency_ms=args.latency_ms,
+        latency_tail_ms=args.latency_tail_ms,
+        error_rate=args.error_rate,
+        order_rate_limit=args.order_rate_limit,
+        info_rate_limit=args.info_rate_limit,
+        fill_delay=args.fill_delay,
+    )
+
+    # 本番APIの接続先を模擬サーバーに差し替え、約定待ちまで本番と同じ経路で処理する
+    base_url = f'http://127.0.0.1:{args.port}'
+    api_client.configure_base_urls(test_base_url=base_url, production_base_url=base_url)
+    trader.USE_TEST_API = False
+    token = api_client.get_client(False).post('/kabusapi/token', {'APIPassword': 'bench'}, auth=False)['Token']
+    get_token_manager(False).set(token, persist=False)
+
+    orders = [('buy', f'{9000 + i}', f'模擬銘柄{i}', 100) for i in range(args.orders)]
+
+    started = time.perf_counter()
+    outcomes = trader.execute_orders(orders, max_workers=args.workers)
+    elapsed = time.perf_counter() - started
+
+    flush()
+    filled = sum(o['status'] == 'filled' for o in outcomes)
+    print("=" * 50)
+    print(f"注文数: {len(orders)}  同時処理数: {args.workers}")
+    print(f"約定: {filled}/{len(orders)}件")
+    print(f"所要時間: {elapsed:.2f}秒 ({len(orders) / elapsed:.1f}件/秒)")
+    print(f"模擬サーバー統計: {simulator.stats}")
+
+    server.shutdown()
+    return 0 if filled == len(orders) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+模擬約定エンジン（taq/paper_broker.py）での全銘柄ドライラン計測用スクリプト
+出来高上位データの全銘柄を発注し、trader.execute_orders の処理件数を計測する
+
+このスクリプトはkabuステーションAPIに接続せず、実際の取引は行いません。
+"""
+
+import sys
+import time
+import argparse
+
+from logger import flush
+from taq import trader
+from taq.broker import use_paper_broker
+from taq.liquidity import load_liquidity_index
+
+def main():
+    parser = argparse.ArgumentParser(description="模擬約定エンジンでの全銘柄ドライラン")
+    parser.add_argument('--repeat', type=int, default=20, help="出来高上位銘柄を繰り返して発注する回数")
+    parser.add_argument('--qty', type=int, default=100, help="1注文あたりの株数")
+    parser.add_argument('--workers', type=int, default=trader.ORDER_WORKERS, help="同時に処理する注文数")
+    args = parser.parse_args()
+
+    use_paper_broker()
+
+    universe = list(load_liquidity_index().items())
+    if not universe:
+        print("出来高上位データが見つかりません")
+        return 1
+
+    orders = [
+        ('buy', symbol, record['name'], args.qty)
+        for _ in range(args.repeat)
+        for symbol, record in universe
+    ]
+
+    started = time.perf_counter()
+    outcomes = trader.execute_orders(orders, max_workers=args.workers)
+    elapsed = time.perf_counter() - started
+
+    flush()
+    statuses = {}
+    for o in outcomes:
+        statuses[o['status']] = statuses.get(o['status'], 0) + 1
+    print("=" * 50)
+    print(f"注文数: {len(orders)}（{len(universe)}銘柄 × {args.repeat}回）")
+    print(f"結果: {statuses}")
+    print(f"所要時間: {elapsed:.2f}秒 ({len(orders) / elapsed:.0f}件/秒)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
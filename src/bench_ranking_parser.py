@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+ランキングページ解析（taq/ranking_parser.py）の検証・計測用スクリプト
+
+taq/fixtures/ranking/ に保存したHTMLを各バックエンドで解析し、
+保存済みの期待値（同名の.json）と一致するかを確認したうえで解析時間を比較する。
+no_meta_charset.html はmeta charsetのないページ（文字コードを内容から判定する場合）の確認用。
+--record を指定すると現在のランキングページを取得してHTMLと期待値を保存し直す。
+
+このスクリプトはネットワークに接続しません（--record を指定した場合を除く）。
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+from taq import ranking_parser
+from taq.data_fetcher import MARKETS, RANKING_URL, get_ranking_fetcher
+
+def get_fixture_dir():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(script_dir, 'taq', 'fixtures', 'ranking')
+
+def load_fixtures():
+    """[(名前, HTML, 期待値), ...] を返す"""
+    fixture_dir = get_fixture_dir()
+    fixtures = []
+    for filename in sorted(os.listdir(fixture_dir)):
+        if not filename.endswith('.html'):
+            continue
+        name = filename[:-len('.html')]
+        with open(os.path.join(fixture_dir, filename), 'rb') as f:
+            content = f.read()
+        with open(os.path.join(fixture_dir, f'{name}.json'), 'r', encoding='utf-8') as f:
+            expected = json.load(f)
+        fixtures.append((name, content, expected))
+    return fixtures
+
+def record_fixtures():
+    """現在のランキングページ（各市場の1ページ目）を取得してHTMLと期待値を保存する"""
+    fixture_dir = get_fixture_dir()
+    session = get_ranking_fetcher().session
+    for market, code in MARKETS.items():
+        response = session.get(f"{RANKING_URL}?market={code}&term=daily", timeout=15)
+        response.raise_for_status()
+        rows = ranking_parser.parse_ranking_page(response.content, backend='bs4', encoding=ranking_parser.response_encoding(response))
+        with open(os.path.join(fixture_dir, f'{market}.html'), 'wb') as f:
+            f.write(response.content)
+        with open(os.path.join(fixture_dir, f'{market}.json'), 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False, indent=1)
+        print(f"{market}: {len(rows)}行を保存しました")
+
+def main():
+    parser = argparse.ArgumentParser(description="ランキングページ解析の検証と計測")
+    parser.add_argument('--repeat', type=int, default=20, help="1フィクスチャあたりの解析回数")
+    parser.add_argument('--record', action='store_true', help="現在のページを取得してフィクスチャを保存し直す")
+    args = parser.parse_args()
+
+    if args.record:
+        record_fixtures()
+
+    fixtures = load_fixtures()
+    if not fixtures:
+        print(f"フィクスチャが見つかりません: {get_fixture_dir()}")
+        return 1
+
+    failed = False
+    timings = {}
+    for backend in ranking_parser.PARSERS:
+        elapsed = 0.0
+        for name, content, expected in fixtures:
+            rows = ranking_parser.parse_ranking_page(content, backend=backend)
+            if not rows:
+                print(f"[NG] {backend} {name}: 行が見つかりません（クラス名が変更された可能性があります）")
+                failed = True
+            elif rows != expected:
+                print(f"[NG] {backend} {name}: 期待値と一致しません（{len(rows)}行 / 期待値{len(expected)}行）")
+                failed = True
+
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                ranking_parser.parse_ranking_page(content, backend=backend)
+            elapsed += time.perf_counter() - started
+        timings[backend] = elapsed / (args.repeat * len(fixtures))
+
+    print(f"フィクスチャ: {len(fixtures)}ページ  解析回数: {args.repeat}回/ページ")
+    baseline = timings.get('bs4')
+    for backend, seconds in timings.items():
+        speedup = f"  ({baseline / seconds:.1f}倍)" if baseline and backend != 'bs4' else ""
+        print(f"{backend:>5}: {seconds * 1000:8.2f} ms/ページ{speedup}")
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+起動時間（import時間）の計測用スクリプト
+
+`python -X importtime` で main の読み込みと、各モード（株 / 競馬）の
+依存の読み込みを別プロセスで計測し、合計時間と時間のかかったモジュールを表示する。
+--max-ms を指定した場合は main の読み込みが上限を超えると終了コード1を返す（定期計測用）。
+
+このスクリプトは取引・投票を行いません（モジュールを読み込むだけです）。
+"""
+
+import os
+import re
+import sys
+import argparse
+import subprocess
+
+# 計測する読み込み（名前, 実行するimport文）
+SCENARIOS = [
+    ('main', 'import main'),
+    ('株モード', 'import main; import taq.trader'),
+    ('競馬モード', 'import main; import keiko.bet'),
+]
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+def measure(statement, repeat):
+    """
+    import文を別プロセスで実行し、-X importtime の出力を集計する
+
+    Returns:
+        dict: {'total_ms': トップレベルの累積時間の合計（ミリ秒、最小値）,
+               'modules': [(累積時間ms, モジュール名), ...]（最小値の回のもの）, 'error': エラー内容}
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    best = None
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', statement],
+            cwd=script_dir, capture_output=True, text=True,
+        )
+        modules = []
+        total_us = 0
+        for line in proc.stderr.splitlines():
+            match = IMPORTTIME_LINE.match(line)
+            if not match:
+                continue
+            cumulative_us = int(match.group(2))
+            modules.append((cumulative_us / 1000, match.group(4)))
+            # インデントが1段（トップレベル）のものだけを合計する
+            if len(match.group(3)) <= 1:
+                total_us += cumulative_us
+        result = {
+            'total_ms': total_us / 1000,
+            'modules': sorted(modules, reverse=True),
+            'error': proc.stderr.strip().splitlines()[-1] if proc.returncode != 0 else None,
+        }
+        if best is None or result['total_ms'] < best['total_ms']:
+            best = result
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="起動時間（import時間）の計測")
+    parser.add_argument('--repeat', type=int, default=3, help="計測回数（最小値を採用）")
+    parser.add_argument('--top', type=int, default=10, help="表示する時間のかかったモジュール数")
+    parser.add_argument('--max-ms', type=float, default=None, help="main の読み込み時間の上限（ミリ秒）")
+    args = parser.parse_args()
+
+    results = {}
+    for name, statement in SCENARIOS:
+        result = measure(statement, args.repeat)
+        results[name] = result
+        print(f"{name}: {result['total_ms']:8.1f} ms  ({statement})")
+        if result['error']:
+            print(f"  読み込みに失敗: {result['error']}")
+        for cumulative_ms, module in result['modules'][:args.top]:
+            print(f"  {cumulative_ms:8.1f} ms  {module}")
+
+    if args.max_ms is not None and results['main']['total_ms'] > args.max_ms:
+        print(f"main の読み込みが上限を超えました: {results['main']['total_ms']:.1f} ms > {args.max_ms:.1f} ms")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,11 @@
 import os
-from time import sleep
+import time
 import random
-import pandas as pd
-from io import StringIO
 import re
+import json
 from datetime import datetime
+from typing import NamedTuple, Optional
 
-from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import Select
@@ -14,15 +13,57 @@ from selenium.webdriver.common.alert import Alert
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
 
 from urllib.parse import urlparse, parse_qs
 
 from logger import slog
 from utils import get_env_value
+from keiko.browser import get_session
+from keiko.fetcher import RACE_LIST_URL, fetch_race_list, parse_race_list, result_url, fetch_race_result, parse_race_result, wait_for_result, wait_for_results
+from keiko.steps import StepTimer, wait_for, present, visible, clickable, click, new_window, alert, text_changes
+from resilience import Deadline
 
 # TODO: 後でconfigに書く。
 setmoney = 1000
 waku_num = 6
+# 前回WEBログインした時刻（time.monotonic、未ログインの場合はNone）
+logged_in_at = None
+
+# 購入処理・入金処理全体の期限（秒）
+PURCHASE_DEADLINE = 120
+PAYMENT_DEADLINE = 120
+# ログイン後の画面表示の待機上限（秒）
+LOGIN_TIMEOUT = 15
+# ログイン済みのセッションを使い回す上限（秒、IPATの無操作ログアウトより短くする）
+SESSION_MAX_AGE = 20 * 60
+# 再読み込み後に投票メニューが表示されるまでの待機上限（秒）
+SESSION_PROBE_TIMEOUT = 10
+# お知らせの有無を判定するまでの待機上限（秒）
+NOTICE_TIMEOUT = 3
+# レース番号ボタンの待機上限（秒、表示されなければ締切後とみなす）
+RACE_BUTTON_TIMEOUT = 5
+# 式別の変更後にオッズが切り替わるまでの待機上限（秒）
+ODDS_REFRESH_TIMEOUT = 3
+# 入金が残高に反映されるまでの待機上限と確認間隔（秒）
+DEPOSIT_TIMEOUT = 30
+DEPOSIT_POLL_INTERVAL = 3
+
+# 投票メニューのオッズ投票ボタン
+ODDS_MENU_XPATH = "//button[@ui-sref='bet.odds.type']"
+# 購入限度額
+BALANCE_XPATH = "//td[@class='text-lg text-right ng-binding']"
+# 一番人気のオッズボタン
+ODDS_BUTTON_XPATH = "//button[@class='btn-odds' and starts-with(@ng-click, 'vm.selectOdds(oOdds)')]"
+# 馬番を指定したオッズボタン（馬番の列の値が一致する行のボタン）
+HORSE_ODDS_BUTTON_XPATH = "//tr[td[count(//th[normalize-space()='馬番'][1]/preceding-sibling::th) + 1][normalize-space()='{horse}']]//button[@class='btn-odds' and starts-with(@ng-click, 'vm.selectOdds(oOdds)')]"
+# レース番号のボタン（まとめて購入用、番号が完全に一致するもの）
+BATCH_RACE_BUTTON_XPATH = "//button[contains(@class, 'btn btn-default btn-lg btn-block ng-scope')][starts-with(normalize-space(.), '{race}R') or normalize-space(.)='{race}']"
+
+# まとめて購入できる式別（1頭を選ぶもの）
+BATCH_BET_TYPES = ('単勝', '複勝')
+# まとめて購入で1点ごとに延ばす期限（秒）
+BATCH_STEP_DEADLINE = 30
 
 # JRA 場番号
 JRA_VENUE_CODES = {
@@ -39,19 +80,30 @@ JRA_VENUE_CODES = {
 }
 
 def get_driver():
+	"""共有のChromeセッションを取得する（未起動・応答なしの場合は起動する）"""
 	global driver
-	options = webdriver.ChromeOptions()
-	# Webドライバ－の警告を出さないようにする。
-	options.add_experimental_option('excludeSwitches', ['enable-logging'])
-	# DOM読み込みまで
-	options.set_capability('pageLoadStrategy', 'eager')
-	# User Agentを設定
-	options.add_argument("user-agent=Desired User Agent String")
-	#headlessの指定をする場合、以下が必要。
-	# options.add_argument('--headless')
-	driver = webdriver.Chrome(options) #Chrome起動
+	driver = get_session().get()
 	return None
 
+def is_logged_in():
+	"""
+	IPATにログイン済みのセッションかどうか
+
+	画面に投票メニューが残っていてもサーバー側のセッションが切れていることがあるため
+	（常駐モードで翌日まで開いたままの場合など）、前回のログインから SESSION_MAX_AGE 秒を
+	過ぎていれば無効とし、それ以外はページを再読み込みして投票メニューが表示されるかを確認する。
+	"""
+	if logged_in_at is None or time.monotonic() - logged_in_at > SESSION_MAX_AGE:
+		return False
+	try:
+		if 'ipat.jra.go.jp' not in driver.current_url:
+			return False
+		driver.refresh()
+		visible(driver, By.XPATH, ODDS_MENU_XPATH, SESSION_PROBE_TIMEOUT)
+		return True
+	except Exception:
+		return False
+
 def web_login():
 	slog("INFO", f"WEBログインを実行します。")
 	
@@ -60,20 +112,23 @@ def web_login():
 		return False
 	
 	get_driver()
+	if is_logged_in():
+		slog("INFO", "ログイン済みのセッションを使用します。")
+		return True
+
 	driver.get('https://www.ipat.jra.go.jp/') #中央競馬
 	# ログイン可能か判定
 	try:
 		number_inet = driver.find_element(By.NAME, 'inetid')
 	except Exception as e:
 		slog("ERROR", "WEBログインができませんでした。")
-		driver.quit() 
+		get_session().quit()
 		return False
 
 	number_inet.send_keys(get_env_value("INETID")) #INET-ID
-	sleep(1)
 	#ログインボタン
-	driver.find_element(By.CLASS_NAME, 'button').click()
-	number_kanyu = driver.find_element(By.NAME, 'i')
+	click(driver, By.CLASS_NAME, 'button')
+	number_kanyu = present(driver, By.NAME, 'i')
 	number_kanyu.send_keys(get_env_value("SUBNUM"))
 	number_ansho = driver.find_element(By.NAME, 'p')
 	number_ansho.send_keys(get_env_value("KPASS"))
@@ -81,19 +136,31 @@ def web_login():
 	number_pars.send_keys(get_env_value("PARS"))
 
 	driver.find_element(By.CLASS_NAME, 'buttonModern').click()
-	sleep(5)
+	# 投票メニューまたはお知らせが表示されるまで待つ
+	try:
+		wait_for(driver, lambda d: d.find_elements(By.XPATH, f"{ODDS_MENU_XPATH} | {BALANCE_XPATH} | //button[contains(@class, 'btn-ok')]"), LOGIN_TIMEOUT)
+	except TimeoutException:
+		slog("WARNING", "ログイン後の画面を確認できませんでした。")
+	global logged_in_at
+	logged_in_at = time.monotonic()
 	slog("INFO", f"WEBログイン完了しました。")
 	return True
 
-def payment():
+def payment(required=None):
+	"""
+	購入限度額が足りない場合に入金する
+
+	Args:
+		required: 必要な購入限度額（円、省略時は setmoney）
+	"""
 	slog("INFO", f"JRA 入金処理を実行します。")
+	amount = max(int(setmoney), required or 0)
 
 	try:
-		genmoney = driver.find_element(By.XPATH, "//td[@class='text-lg text-right ng-binding']").text
+		genmoney = visible(driver, By.XPATH, BALANCE_XPATH, NOTICE_TIMEOUT).text
 	except Exception as e: # ここでお知らせある場合、OK押してから入金へ進む。
-			driver.find_element(By.XPATH,"//button[@class='btn btn-default btn-lg btn-ok' and starts-with(@ui-sref, 'home')]").click()
-			sleep(2)
-			genmoney = driver.find_element(By.XPATH,"//td[@class='text-lg text-right ng-binding']").text
+			click(driver, By.XPATH, "//button[@class='btn btn-default btn-lg btn-ok' and starts-with(@ui-sref, 'home')]")
+			genmoney = visible(driver, By.XPATH, BALANCE_XPATH).text
 
 	slog("INFO", "現在の購入限度額は" + genmoney + "です。")
 	if genmoney != "0円":
@@ -101,99 +168,105 @@ def payment():
 		# 整数型に変換
 		genmoney = int(genmoney.replace("円", "").replace(",", ""))
 
-		if genmoney < int(setmoney):
+		if genmoney < amount:
 			slog("INFO", "残金が足りません。入金指示を実行します。")
-			enter_payment(setmoney)
+			enter_payment(amount)
 			slog("INFO", "入金処理を完了しました。\n")
 	else:
 		# 最初の入金処理
 		slog("INFO", "入金されていません。入金指示を実行します。")
-		enter_payment(setmoney)
+		enter_payment(amount)
 		slog("INFO", "入金処理を完了しました。\n")
 
 	return True
 
 
 def enter_payment(setmoney):
-	driver.find_element(By.XPATH, "//button[@ng-click='vm.clickPayment()']").click()
-	sleep(2)
-	# 全てのウィンドウハンドルを取得
-	window_handles = driver.window_handles
-	# 最後に開いたタブに移動
-	driver.switch_to.window(window_handles[-1])
-
-	driver.find_element(By.XPATH, "//a[@onclick=\"javascript:submitForm(menuForm, 'nyukin');\"]").click()
-	driver.find_element(By.ID, "NYUKIN_ID").send_keys(setmoney)
-	driver.find_element(By.XPATH, "//a[@onclick=\"javascript:submitForm(nyukinForm, 'CNFRM');\"]").click()
-	sleep(2)
-	# 入金指示 最終確認
-	driver.find_element(By.ID, "PASS_WORD_ID").send_keys(get_env_value("KPASS"))
-	driver.find_element(By.XPATH, "//a[@onclick=\"javascript:submitForm(this, nyukinForm, 'EXEC');\"]").click()
-	# ポップアップ "入金します。よろしいですか？"
-	Alert(driver).accept()
-	sleep(1)
-	driver.find_element(By.XPATH, "//a[@onclick=\"javascript:submitGoLogoff();\"]")
-	# 全てのウィンドウハンドルを取得
-	window_handles = driver.window_handles
-	# 最初のタブに移動
-	driver.switch_to.window(window_handles[0])
-	# 最初のタブ以外を閉じる
-	for handle in window_handles[1:]:
-		driver.switch_to.window(handle)
-		driver.close()
+	timer = StepTimer("入金処理", deadline=PAYMENT_DEADLINE)
+	before = ''
+	balance = driver.find_elements(By.XPATH, BALANCE_XPATH)
+	if balance:
+		before = balance[0].text
 
-	# コントロールを最初のタブに戻す
-	driver.switch_to.window(window_handles[0])
-	# 入金待ち時間
-	sleep(5)
-	# 更新ボタンを押す。
-	driver.find_element(By.XPATH,"//button[@class='btn btn-default btn-lg pull-right' and starts-with(@ng-click, 'vm.getBalanceData()')]").click()
+	try:
+		with timer.step("入金画面を開く") as timeout:
+			handles = len(driver.window_handles)
+			click(driver, By.XPATH, "//button[@ng-click='vm.clickPayment()']", timeout)
+			# 最後に開いたタブに移動
+			new_window(driver, handles + 1, timeout)
+
+		with timer.step("入金額の入力") as timeout:
+			click(driver, By.XPATH, "//a[@onclick=\"javascript:submitForm(menuForm, 'nyukin');\"]", timeout)
+			present(driver, By.ID, "NYUKIN_ID", timeout).send_keys(setmoney)
+			click(driver, By.XPATH, "//a[@onclick=\"javascript:submitForm(nyukinForm, 'CNFRM');\"]", timeout)
+
+		# 入金指示 最終確認
+		with timer.step("入金指示") as timeout:
+			present(driver, By.ID, "PASS_WORD_ID", timeout).send_keys(get_env_value("KPASS"))
+			click(driver, By.XPATH, "//a[@onclick=\"javascript:submitForm(this, nyukinForm, 'EXEC');\"]", timeout)
+			# ポップアップ "入金します。よろしいですか？"
+			alert(driver, timeout).accept()
+			present(driver, By.XPATH, "//a[@onclick=\"javascript:submitGoLogoff();\"]", timeout)
+
+		with timer.step("入金画面を閉じる"):
+			# 全てのウィンドウハンドルを取得
+			window_handles = driver.window_handles
+			# 最初のタブ以外を閉じる
+			for handle in window_handles[1:]:
+				driver.switch_to.window(handle)
+				driver.close()
+			# コントロールを最初のタブに戻す
+			driver.switch_to.window(window_handles[0])
+
+		# 入金が反映されるまで更新ボタンを押して残高を確認する
+		with timer.step("入金の反映", timeout=DEPOSIT_TIMEOUT) as timeout:
+			deadline = Deadline(timeout)
+			while True:
+				click(driver, By.XPATH, "//button[@class='btn btn-default btn-lg pull-right' and starts-with(@ng-click, 'vm.getBalanceData()')]", deadline.remaining())
+				try:
+					after = text_changes(driver, By.XPATH, BALANCE_XPATH, before, min(DEPOSIT_POLL_INTERVAL, deadline.remaining()))
+					slog("INFO", f"購入限度額が更新されました: {before or '不明'} → {after}")
+					break
+				except TimeoutException:
+					if deadline.expired():
+						slog("WARNING", "入金の反映を確認できませんでした。")
+						break
+	finally:
+		timer.report()
 
 	return True
 
 def get_race_list():
-	global driver
+	"""
+	本日のレース一覧を取得する
 
+	netkeibaの一覧をHTTPで取得して1回の走査で解析する（ブラウザは使わない）。
+	取得できなかった場合はブラウザの新しいタブで開き、page_sourceを1回だけ取得して同じ解析を行う。
+
+	Returns:
+		tuple: (RaceEntryのリスト, netkeibaのURLリスト)
+	"""
 	print("本日のレースを取得します。")
 
-	now = datetime.now()
-	now_datetime = now.strftime("%Y%m%d")
-	url = f'https://race.netkeiba.com/top/race_list.html?kaisai_date={now_datetime}'
+	now_datetime = datetime.now().strftime("%Y%m%d")
+	races = fetch_race_list(now_datetime)
 
-	# 新しいタブでnetkeibaを開く（JRAセッションを維持するため）
-	driver.execute_script("window.open('');")
-	window_handles = driver.window_handles
-	driver.switch_to.window(window_handles[-1])  # 新しいタブに移動
-	driver.get(url)
-	sleep(3)
-	rs = driver.find_elements(by=By.CLASS_NAME, value='RaceList_DataList')
-	rsnames = [rsn.find_element(by=By.CLASS_NAME, value='RaceList_DataTitle').text for rsn in rs ]
-
-	racelist = [] # レースデータリスト
-	urllist = [] # netkeibaのURLリスト
-	for rss in rs:
-		rsname = rss.find_element(by=By.CLASS_NAME, value='RaceList_DataTitle').text
-		rsis = rss.find_elements(by=By.CLASS_NAME, value='RaceList_DataItem')
-		for rsi in rsis:
-			rsia = rsi.find_element(by=By.TAG_NAME, value='a')
-			rsin = rsi.find_element(by=By.CLASS_NAME, value='Race_Num')
-			rsi2 = rsi.find_element(by=By.CLASS_NAME, value='RaceList_ItemContent')
-			rsi2t = rsi2.find_element(by=By.CLASS_NAME, value='ItemTitle')
-			rsi2gradebk = rsi2.find_elements(by=By.CLASS_NAME, value='Icon_GradeType')
-			if len(rsi2gradebk) > 0 and 'Icon_GradeType ' in rsi2gradebk[0].get_attribute('class'):
-				classes = rsi2gradebk[0].get_attribute('class').split(" ")
-			else:
-				rsi2grade = "未勝利"
-			rsi2d = rsi2.find_element(by=By.CLASS_NAME, value='RaceData')
-			rsi2d2 = rsi2d.find_element(by=By.CLASS_NAME, value='RaceList_Itemtime')
-			rsi2d3 = rsi2d.find_elements(by=By.CLASS_NAME, value='RaceList_ItemLong')
-			if rsi2d3 is not None and rsi2d3 != []:
-				rsi2d3 = rsi2d3[0].text # コース情報
-			else:
-				rsi2d3 = rsi2d.find_elements(by=By.TAG_NAME, value='span')[1].text
-			rurl = rsia.get_attribute('href')
-			urllist.append(rurl) # netkeiba URL
-			racelist.append((rsname,rsin.text, rsi2t.text, rsi2d2.text, rsi2d3, rsi2grade))
+	if not races:
+		url = f'{RACE_LIST_URL}?kaisai_date={now_datetime}'
+		# 新しいタブでnetkeibaを開く（JRAセッションを維持するため）
+		get_driver()
+		get_session().open_tab(url)
+		# 一覧はJavaScriptで読み込まれるため、表示されるまで待つ
+		try:
+			WebDriverWait(driver, 10).until(
+				EC.presence_of_element_located((By.CLASS_NAME, 'RaceList_DataItem'))
+			)
+		except Exception as e:
+			slog("WARNING", f"レース一覧の表示を確認できませんでした: {e}")
+		races = parse_race_list(driver.page_source, base_url=driver.current_url)
+
+	racelist = races # レースデータリスト
+	urllist = [race.url for race in races] # netkeibaのURLリスト
 	return racelist, urllist
 
 
@@ -213,33 +286,11 @@ def get_venue_name(race_id_or_url: str) -> str:
     return JRA_VENUE_CODES.get(venue_code, "不明な競馬場")
 
 
-def purchase(current_weekday):
-	slog("INFO", f"購入処理を実行します。")
-	sleep(1)
-
-	# レース情報一覧を引っ張ってくる。
-	racelist, urllist = get_race_list()
-
-	# 第10Rの競馬場の名前を取得する。
-	# ba_name = get_venue_name(urllist[9])   # 中山 10R
-	race_number = 9
-	betmoney = 100
-	select_race = urllist[9]
-	ba_name = get_venue_name(select_race)
-
-	coursebutton_text = f"{ba_name}（{current_weekday}）" # 中山（土）
-	print(coursebutton_text)
-
-	# 初期位置はボタンが押された状態から始まる。
-	if coursebutton_text == "中山":
-		on_button = "btn btn-default btn-lg btn-block on"
-	else:
-		on_button = "btn btn-default btn-lg btn-block"
-
+def close_netkeiba_window():
+	"""netkeibaのウィンドウを閉じてJRAのメインウィンドウに戻る"""
 	# 現在の状況をデバッグ
 	window_handles = driver.window_handles
 
-	# netkeibaのウィンドウを閉じてJRAのメインウィンドウに戻る
 	if len(window_handles) > 1:
 		# 現在のウィンドウ（netkeiba）を閉じる
 		driver.close()
@@ -248,186 +299,387 @@ def purchase(current_weekday):
 	else:
 		slog("INFO", "ウィンドウは1つのみです。")
 
-	sleep(2)
-
-	# try:
-	# 	driver.find_element(By.XPATH, "//a[@ui-sref='home']").click()
-	# 	sleep(2)
-	# except:
-	# 	slog("INFO", "ホームボタンが見つかりません。")
-
+def open_odds_screen(timer):
+	"""投票メニューからオッズ投票（人気順）の画面を開く"""
 	# オッズ投票ボタン
-	try:
-		driver.find_element(By.XPATH, "//button[@ui-sref='bet.odds.type']").click()
-	except Exception as e:
-		slog("ERROR", f"オッズボタンが見つかりません: {e}")
-		return False
-	sleep(2)
+	with timer.step("オッズ投票") as timeout:
+		click(driver, By.XPATH, ODDS_MENU_XPATH, timeout)
 	# オッズ投票（人気順）ボタン
-	driver.find_element(By.LINK_TEXT, 'オッズ投票（人気順）').click()
-	sleep(2)
-	# 場をクリック
-	driver.find_element(By.XPATH, f"//span[contains(text(), '{coursebutton_text}')]").click()
-	sleep(2)
-	# レース番号をクリック
+	with timer.step("人気順") as timeout:
+		click(driver, By.LINK_TEXT, 'オッズ投票（人気順）', timeout)
+
+def select_venue(timer, coursebutton_text):
+	"""場をクリックする（例: 中山（土））"""
+	with timer.step(f"場の選択 {coursebutton_text}") as timeout:
+		click(driver, By.XPATH, f"//span[contains(text(), '{coursebutton_text}')]", timeout)
+
+def select_race(timer, race_xpath, race_number):
+	"""
+	レース番号をクリックする
+
+	Returns:
+		bool: 選択できた場合True（ボタンが表示されない場合は締切後とみなしFalse）
+	"""
 	try:
-		driver.find_element(By.XPATH, "//button[contains(@class, 'btn btn-default btn-lg btn-block ng-scope')]//*[contains(., '" + str(race_number) + "')]/..").click()
+		with timer.step(f"レースの選択 {race_number}R", timeout=RACE_BUTTON_TIMEOUT) as timeout:
+			click(driver, By.XPATH, race_xpath, timeout)
+		return True
 	except Exception as e:
 		# 間に合わなかった場合
 		print("The race is over.")
-		# 投票メニューをクリック
-		driver.find_element(By.XPATH,"//a[@ui-sref='home']").click()
 		return False
 
-	sleep(2)
-
-	# 間に合わなかった場合
-	# 式別 複勝を選択
-	select_element = Select(driver.find_element(By.ID, 'bet-odds-populate-type'))
-	sleep(2)
-	select_element.select_by_visible_text('複勝')
-	sleep(2)
+def set_bet(timer, bet_type, odds_xpath, stake):
+	"""式別・馬・金額を選択してセットする"""
+	# 式別を選択
+	with timer.step(f"式別の選択 {bet_type}") as timeout:
+		select_element = Select(present(driver, By.ID, 'bet-odds-populate-type', timeout))
+		wait_for(driver, lambda d: any(option.text == bet_type for option in select_element.options), timeout, f"式別に{bet_type}がありません")
+		old_odds = driver.find_elements(By.XPATH, ODDS_BUTTON_XPATH)
+		select_element.select_by_visible_text(bet_type)
+		# 選択した式別のオッズに表示が切り替わるまで待つ
+		if old_odds:
+			try:
+				wait_for(driver, EC.staleness_of(old_odds[0]), ODDS_REFRESH_TIMEOUT)
+			except TimeoutException:
+				pass
 	# 馬を選択
 	# 'btn-odds'クラスを持つすべてのボタンをリストとして取得
 	# horse_buttons = driver.find_elements(By.CLASS_NAME, "btn-odds")
 	# horse_buttons[waku_num].click()
-	driver.find_element(By.XPATH, "//button[@class='btn-odds' and starts-with(@ng-click, 'vm.selectOdds(oOdds)')]").click() # 一番人気ボタン
+	with timer.step("馬の選択") as timeout:
+		click(driver, By.XPATH, odds_xpath, timeout)
 
-	sleep(2)
 	# 金額を入力
-	input_money = WebDriverWait(driver, 10).until(
-		EC.element_to_be_clickable((By.XPATH, "//*[@id='main']/ui-view/div[2]/ui-view/ui-view/main/div/div[3]/select-list/div/div/div[3]/div[1]/input"))
-	)
-	input_money.send_keys(betmoney // 100) # 100円
-	# <input type="text" maxlength="4" class="form-control text-right ng-pristine ng-valid ng-isolate-scope ng-empty ng-valid-maxlength ng-touched" ng-model="vm.nUnit" model-pattern="^\d{0,4}$" ng-disabled="vm.isRaceUnselected()" ng-blur="vm.checkAmount()" aria-labelledby="select-list-amount-unit" aria-invalid="false" style="">
-	# //*[@id="main"]/ui-view/div[2]/ui-view/ui-view/main/div/div[3]/select-list/div/div/div[3]/div[1]/input
-
-	sleep(1)
+	with timer.step("金額の入力") as timeout:
+		input_money = clickable(driver, By.XPATH, "//*[@id='main']/ui-view/div[2]/ui-view/ui-view/main/div/div[3]/select-list/div/div/div[3]/div[1]/input", timeout)
+		input_money.clear()
+		input_money.send_keys(stake // 100) # 100円単位
+		# <input type="text" maxlength="4" class="form-control text-right ng-pristine ng-valid ng-isolate-scope ng-empty ng-valid-maxlength ng-touched" ng-model="vm.nUnit" model-pattern="^\d{0,4}$" ng-disabled="vm.isRaceUnselected()" ng-blur="vm.checkAmount()" aria-labelledby="select-list-amount-unit" aria-invalid="false" style="">
+		# //*[@id="main"]/ui-view/div[2]/ui-view/ui-view/main/div/div[3]/select-list/div/div/div[3]/div[1]/input
+
 	# セットをクリック
-	driver.find_element(By.XPATH, "//button[@class='btn btn-lg btn-set btn-primary' and starts-with(@ng-click, 'vm.onSet()')]").click()
-	sleep(1)
+	with timer.step("セット") as timeout:
+		click(driver, By.XPATH, "//button[@class='btn btn-lg btn-set btn-primary' and starts-with(@ng-click, 'vm.onSet()')]", timeout)
+
+def submit_bet_list(timer, total):
+	"""
+	入力終了から購入までを行う（セットしたすべての馬券をまとめて購入する）
+
+	Args:
+		total: 合計金額（円）
+
+	Returns:
+		list: 購入した馬番（画面に表示された順）
+	"""
 	# 入力終了をクリック
-	driver.find_element(By.XPATH, "//button[@class='btn btn-lg btn-default' and starts-with(@ng-click, 'vm.onShowBetList()')]").click()
-	sleep(1)
-
-	# 合計金額を取得
-	money = driver.find_element(By.CSS_SELECTOR, ".number.ng-binding").text
-	# 合計金額を入力
-	driver.find_element(By.CSS_SELECTOR, "input[ng-model^='vm.cAmountTotal']").send_keys(100)
-	sleep(1)
+	with timer.step("入力終了") as timeout:
+		click(driver, By.XPATH, "//button[@class='btn btn-lg btn-default' and starts-with(@ng-click, 'vm.onShowBetList()')]", timeout)
+
+	with timer.step("合計金額の入力") as timeout:
+		# 合計金額を取得
+		money = visible(driver, By.CSS_SELECTOR, ".number.ng-binding", timeout).text
+		# 合計金額を入力
+		clickable(driver, By.CSS_SELECTOR, "input[ng-model^='vm.cAmountTotal']", timeout).send_keys(total)
 	# 購入するを入力
-	driver.find_element(By.XPATH, "//button[@class='btn btn-lg btn-primary' and starts-with(@ng-click, 'vm.clickPurchase()')]").click()
-	sleep(1)
+	with timer.step("購入") as timeout:
+		click(driver, By.XPATH, "//button[@class='btn btn-lg btn-primary' and starts-with(@ng-click, 'vm.clickPurchase()')]", timeout)
 	# 購入処理を完了させる(特殊ボタン)
-	element = WebDriverWait(driver, 10).until(
-		EC.visibility_of_element_located((By.CSS_SELECTOR, ".btn.btn-default.btn-lg.btn-ok.ng-binding"))
-	)
-	element.click()
-	sleep(2)
+	with timer.step("購入の確定") as timeout:
+		click(driver, By.CSS_SELECTOR, ".btn.btn-default.btn-lg.btn-ok.ng-binding", timeout)
 
 	# 実際に購入した馬番を取得する。
+	horses = []
 	try:
-		horse_number_element = driver.find_element(By.CSS_SELECTOR, ".set-heading.ng-binding")
-		purchased_horse_number = horse_number_element.text
-		# グローバル変数waku_numを更新
-		global waku_num
-		waku_num = int(purchased_horse_number)
+		with timer.step("馬番の取得") as timeout:
+			visible(driver, By.CSS_SELECTOR, ".set-heading.ng-binding", timeout)
+			for element in driver.find_elements(By.CSS_SELECTOR, ".set-heading.ng-binding"):
+				text = element.text.strip()
+				horses.append(int(text) if text.isdigit() else None)
 	except Exception as e:
 		slog("ERROR", f"馬番の取得に失敗しました: {e}")
-		slog("INFO", f"設定値の馬番{waku_num}を使用します。")
-
-	# 続けて購入するをクリック
-	element = WebDriverWait(driver, 10).until(
-		EC.element_to_be_clickable((By.XPATH, '//button[@ng-click="vm.clickContinue();"]'))
-	)
-	sleep(5)
-	# 投票メニューをクリックして戻る
-	driver.find_element(By.XPATH,"//a[@ui-sref='home']").click()
+
+	# 続けて購入するが表示されたら（投票の受付完了）投票メニューをクリックして戻る
+	with timer.step("投票メニューに戻る") as timeout:
+		clickable(driver, By.XPATH, '//button[@ng-click="vm.clickContinue();"]', timeout)
+		click(driver, By.XPATH, "//a[@ui-sref='home']", timeout)
 	# ウィンドウは閉じずにセッションを維持
+	return horses
+
+def purchase(current_weekday):
+	slog("INFO", f"購入処理を実行します。")
+
+	# レース情報一覧を引っ張ってくる。
+	racelist, urllist = get_race_list()
+
+	# 第10Rの競馬場の名前を取得する。
+	# ba_name = get_venue_name(urllist[9])   # 中山 10R
+	race_number = 9
+	betmoney = 100
+	race_url = urllist[9]
+	ba_name = get_venue_name(race_url)
+
+	coursebutton_text = f"{ba_name}（{current_weekday}）" # 中山（土）
+	print(coursebutton_text)
+
+	# 初期位置はボタンが押された状態から始まる。
+	if coursebutton_text == "中山":
+		on_button = "btn btn-default btn-lg btn-block on"
+	else:
+		on_button = "btn btn-default btn-lg btn-block"
+
+	close_netkeiba_window()
+
+	timer = StepTimer("購入処理", deadline=PURCHASE_DEADLINE)
+	try:
+		try:
+			open_odds_screen(timer)
+		except Exception as e:
+			slog("ERROR", f"オッズボタンが見つかりません: {e}")
+			return False
+
+		select_venue(timer, coursebutton_text)
+		if not select_race(timer, "//button[contains(@class, 'btn btn-default btn-lg btn-block ng-scope')]//*[contains(., '" + str(race_number) + "')]/..", race_number):
+			# 投票メニューをクリック
+			driver.find_element(By.XPATH,"//a[@ui-sref='home']").click()
+			return False
+
+		set_bet(timer, '複勝', ODDS_BUTTON_XPATH, betmoney) # 一番人気ボタン
+		horses = submit_bet_list(timer, betmoney)
+	finally:
+		timer.report()
+
+	# グローバル変数waku_numを更新
+	global waku_num
+	if horses and horses[0] is not None:
+		waku_num = horses[0]
+	else:
+		slog("ERROR", f"購入した馬番を画面から取得できませんでした。設定値の馬番{waku_num}で結果を確認します（実際の馬番と異なる場合は資金を手動で修正してください）。")
 
 	slog("INFO", f"{coursebutton_text}の第{race_number}Rで{waku_num}番の複勝を購入しました。")
-	slog("INFO", select_race)
+	slog("INFO", race_url)
+
+	return race_url
+
+class Bet(NamedTuple):
+	"""まとめて購入する馬券1点"""
+	venue: str          # 競馬場（例: 東京）
+	race: int           # レース番号
+	bet_type: str       # 式別（単勝・複勝）
+	horse: Optional[int] # 馬番（Noneの場合は一番人気）
+	stake: int          # 金額（円、100円単位）
+
+def get_bets_path():
+	"""まとめて購入する馬券のファイル（db/bets.json）のパスを返す"""
+	script_dir = os.path.dirname(os.path.abspath(__file__))
+	project_root = os.path.dirname(os.path.dirname(script_dir))
+	return os.path.join(project_root, 'db', 'bets.json')
+
+def load_bets(path=None):
+	"""
+	まとめて購入する馬券を読み込む
+
+	ファイルの形式:
+		[{"venue": "東京", "race": 11, "bet_type": "複勝", "horse": 6, "stake": 100}, ...]
+		（horse を省略した場合は一番人気）
+
+	Returns:
+		list: Betのリスト（ファイルがない場合は空のリスト）
+
+	Raises:
+		ValueError: 内容が不正な場合
+	"""
+	path = path or get_bets_path()
+	if not os.path.exists(path):
+		return []
+	with open(path, encoding='utf-8') as f:
+		entries = json.load(f)
+
+	bets = []
+	for entry in entries:
+		bet = Bet(
+			venue=entry['venue'],
+			race=int(entry['race']),
+			bet_type=entry.get('bet_type', '複勝'),
+			horse=int(entry['horse']) if entry.get('horse') is not None else None,
+			stake=int(entry.get('stake', 100)),
+		)
+		if bet.venue not in JRA_VENUE_CODES.values():
+			raise ValueError(f"競馬場が不正です: {entry}")
+		if not 1 <= bet.race <= 12:
+			raise ValueError(f"レース番号が不正です: {entry}")
+		if bet.bet_type not in BATCH_BET_TYPES:
+			raise ValueError(f"式別は{'・'.join(BATCH_BET_TYPES)}のみです: {entry}")
+		if bet.stake < 100 or bet.stake % 100:
+			raise ValueError(f"金額は100円単位で指定してください: {entry}")
+		bets.append(bet)
+	return bets
+
+def group_bets(bets):
+	"""
+	馬券を競馬場ごとにまとめる（競馬場は指定順、レースは番号順）
+
+	Returns:
+		dict: {競馬場: [Bet, ...]}
+	"""
+	groups = {}
+	for bet in bets:
+		groups.setdefault(bet.venue, []).append(bet)
+	return {venue: sorted(venue_bets, key=lambda bet: bet.race) for venue, venue_bets in groups.items()}
+
+def find_race_url(racelist, venue, race):
+	"""レース一覧から競馬場・レース番号の出馬表のURLを探す（見つからない場合はNone）"""
+	for entry in racelist:
+		if get_venue_name(entry.url) == venue and re.sub(r"\D", "", entry.race_num) == str(race):
+			return entry.url
+	return None
 
-	return select_race
+def purchase_batch(bets, current_weekday):
+	"""
+	複数の馬券を1回のログインでまとめて購入する
 
-def get_race_result(url):
-	global driver
+	競馬場ごとに場を1回だけ選択し、レース・式別・馬・金額をセットしていき、
+	最後に入力終了から購入までを1回だけ行う。
+
+	Args:
+		bets: Betのリスト
+		current_weekday: 曜日（"土" など）
+
+	Returns:
+		list: 購入した (Bet, 出馬表のURL) のリスト（購入できなかった場合は空のリスト）
+	"""
+	slog("INFO", f"まとめて購入します: {len(bets)}点")
 
-	# セッションが無効な場合は新しいドライバーを作成
+	racelist, urllist = get_race_list()
+	close_netkeiba_window()
+
+	timer = StepTimer("まとめて購入", deadline=PURCHASE_DEADLINE + BATCH_STEP_DEADLINE * len(bets))
+	placed = []
 	try:
-		driver.current_url  # セッションが有効かテスト
-	except:
-		slog("INFO", "Seleniumセッションが無効です。新しいドライバーを作成します。")
-		get_driver()
+		try:
+			open_odds_screen(timer)
+		except Exception as e:
+			slog("ERROR", f"オッズボタンが見つかりません: {e}")
+			return []
+
+		for venue, venue_bets in group_bets(bets).items():
+			try:
+				select_venue(timer, f"{venue}（{current_weekday}）")
+			except Exception as e:
+				slog("ERROR", f"{venue}が見つかりません。{len(venue_bets)}点を購入しません: {e}")
+				continue
+
+			for bet in venue_bets:
+				url = find_race_url(racelist, bet.venue, bet.race)
+				if url is None:
+					slog("ERROR", f"{bet.venue}{bet.race}Rがレース一覧にありません。購入しません。")
+					continue
+				if not select_race(timer, BATCH_RACE_BUTTON_XPATH.format(race=bet.race), bet.race):
+					slog("ERROR", f"{bet.venue}{bet.race}Rは締め切られています。購入しません。")
+					continue
+				odds_xpath = ODDS_BUTTON_XPATH if bet.horse is None else HORSE_ODDS_BUTTON_XPATH.format(horse=bet.horse)
+				try:
+					set_bet(timer, bet.bet_type, odds_xpath, bet.stake)
+				except Exception as e:
+					slog("ERROR", f"{bet.venue}{bet.race}R {bet.bet_type} {bet.horse or '一番人気'}をセットできませんでした: {e}")
+					continue
+				placed.append((bet, url))
+
+		if not placed:
+			slog("ERROR", "セットできた馬券がありません。")
+			driver.find_element(By.XPATH,"//a[@ui-sref='home']").click()
+			return []
+
+		horses = submit_bet_list(timer, sum(bet.stake for bet, url in placed))
+	finally:
+		timer.report()
+
+	# 一番人気を指定した馬券は、画面に表示された馬番に置き換える
+	if len(horses) == len(placed):
+		placed = [(bet._replace(horse=horse) if bet.horse is None else bet, url) for (bet, url), horse in zip(placed, horses)]
+	else:
+		slog("ERROR", f"画面に表示された馬番の数（{len(horses)}）が購入した馬券の数（{len(placed)}）と一致しません。一番人気の馬番を特定できません。")
+	unmapped = [bet for bet, url in placed if bet.horse is None]
+	if unmapped:
+		slog("ERROR", f"馬番を特定できない馬券が{len(unmapped)}点あります（購入金額は資金から差し引きますが、払戻は資金に含まれません）: "
+			+ ", ".join(f"{bet.venue}{bet.race}R {bet.bet_type} {bet.stake}円" for bet in unmapped))
+	for bet, url in placed:
+		slog("INFO", f"購入: {bet.venue}{bet.race}R {bet.bet_type} {bet.horse if bet.horse is not None else '一番人気（馬番不明）'} {bet.stake}円")
+
+	return placed
+
+def get_race_result(url):
+	"""
+	ブラウザで結果ページを開いて結果を読み取る（HTTPで取得できない場合の予備）
+
+	Returns:
+		RaceResult: 結果（払戻が公開されていない場合はNone）
+	"""
+	# セッションが無効な場合は起動し直したセッションを使う
+	get_driver()
 
 	try:
 		driver.get(url)
-		sleep(2)
-		data = pd.read_html(StringIO(driver.page_source))
-		result_table = data[0] # 結果
-		payment1 = data[1] # 払い戻し１
-		payment2 = data[2] # 払い戻し２
-		return result_table, pd.concat([payment1, payment2])
+		# 払戻表が表示されるまで待つ
+		wait_for(driver, lambda d: d.find_elements(By.XPATH, "//th[contains(., '複勝')]"))
+		return parse_race_result(driver.page_source)
 	except Exception as e:
 		slog("ERROR", f"レース結果の取得に失敗しました: {e}")
-		# 新しいドライバーで再試行
-		slog("INFO", "新しいドライバーで再試行します。")
-		get_driver()
-		driver.get(url)
-		sleep(2)
-		data = pd.read_html(StringIO(driver.page_source))
-		result_table = data[0] # 結果
-		payment1 = data[1] # 払い戻し１
-		payment2 = data[2] # 払い戻し２
-		return result_table, pd.concat([payment1, payment2])
-
-def result_check(url):
+		return None
+
+def result_check(url, wait=True):
+	"""
+	レース結果を確認して資金を更新する
+
+	Args:
+		url: 購入したレースの出馬表のURL
+		wait: Trueの場合は結果が公開されるまでHTTPで確認を続ける
+
+	Returns:
+		float: 100円あたりの配当金（外れは0、結果を確認できなかった場合はNone）
+
+	結果を確認できなかった場合も、購入済みの賭け金は資金から差し引く。
+	"""
 	slog("INFO", f"レース結果を取得します。")
 
-	result_url = url.replace("race/shutuba.html", "race/result.html").replace("&rf=race_list", "&rf=race_submenu")
-	result_table, payment = get_race_result(result_url) # 実行
-	slog("INFO", result_table)
-	slog("INFO", "\n")
-	# slog("INFO", payment)
-
-	is_waku_in_top3 = result_table[(result_table["着 順"].isin([1, 2, 3])) & (result_table["馬 番"] == waku_num)].shape[0] > 0
-	slog("INFO", is_waku_in_top3)
-
-	if is_waku_in_top3:
-		# 複勝の行を見つける
-		fukusho_row = payment.loc[payment[0] == "複勝"].iloc[0]
-
-		# 馬番の文字列を分割（例: "14 6 7" -> ["14", "6", "7"]）
-		horse_numbers_str = str(fukusho_row[1]).strip()
-		horse_numbers = horse_numbers_str.split()
-
-		# 配当金の文字列を分割（例: "480円 130円 130円" -> ["480円", "130円", "130円"]）
-		odds_str = str(fukusho_row[2]).strip()
-		odds_list = odds_str.split()
-
-		slog("INFO", f"複勝馬番: {horse_numbers}")
-		slog("INFO", f"複勝配当: {odds_list}")
-
-		# 対象馬番が複勝圏内にあるかチェック
-		if str(waku_num) in horse_numbers:
-			index_of_waku = horse_numbers.index(str(waku_num))
-			odds_amount_str = odds_list[index_of_waku]
-			odds_amount = float(odds_amount_str.replace("円", "").replace(",", ""))
-			slog("INFO", f"対象馬番{waku_num}の複勝配当: {odds_amount}円")
-			dividend = odds_amount # 100円賭けに対する配当金
-			slog("INFO", f"配当金: {dividend}円")
-		else:
-			slog("INFO", f"馬番{waku_num}は複勝圏外でした")
-			dividend = 0
+	if wait:
+		result = wait_for_result(url)
 	else:
-		dividend = 0
-
+		try:
+			result = fetch_race_result(result_url(url))
+		except Exception as e:
+			slog("WARNING", f"レース結果をHTTPで取得できませんでした: {e}")
+			result = None
+	if result is None:
+		result = get_race_result(result_url(url))
 	# 賭け金額（100円固定）
 	bet_amount = 100
 
+	if result is None:
+		slog("ERROR", f"レース結果を確認できませんでした。賭け金{bet_amount}円のみ資金から差し引きます（払戻があれば資金を手動で修正してください）。")
+		update_capital(-bet_amount)
+		return None
+
+	slog("INFO", f"着順: {[horse for rank, horse in result.finish if rank in (1, 2, 3)]}")
+	slog("INFO", f"複勝: {result.fukusho}")
+
+	# 対象馬番が複勝圏内にあるかチェック
+	if waku_num in result.fukusho:
+		dividend = float(result.fukusho[waku_num]) # 100円賭けに対する配当金
+		slog("INFO", f"対象馬番{waku_num}の複勝配当: {dividend}円")
+	else:
+		slog("INFO", f"馬番{waku_num}は複勝圏外でした")
+		dividend = 0
+
 	# 損益計算
 	profit_loss = dividend - bet_amount
+	update_capital(profit_loss)
+
+	# ドライバーは終了せず、次回の投票・結果確認で使い回す（プロセス終了時に閉じる）
+	return dividend
 
+def update_capital(profit_loss):
+	"""損益を capital.txt の資金に反映する"""
 	# 現在の資金を読み込み
 	capital_file_path = "../db/capital.txt"
 	try:
@@ -451,35 +703,39 @@ def result_check(url):
 	except Exception as e:
 		slog("ERROR", f"資金更新に失敗しました: {e}")
 
-	# 処理完了後、ドライバーを終了
-	try:
-		driver.quit()
-	except:
-		pass
-
-	return dividend
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+def result_check_batch(placed):
+	"""
+	まとめて購入した馬券の結果を確認して資金を更新する
+
+	すべてのレースの結果をまとめて確認し、公開されたレースの払戻を合計する。
+	購入した馬券の金額はすべて資金から差し引き、結果（または馬番）を
+	確認できなかった馬券は払戻0として扱う。
+
+	Args:
+		placed: purchase_batch が返した (Bet, 出馬表のURL) のリスト
+
+	Returns:
+		dict: {'stake': 購入した馬券の金額合計, 'return': 払戻合計, 'unsettled': 確認できなかった馬券の数}
+	"""
+	slog("INFO", f"レース結果をまとめて取得します: {len(placed)}点")
+
+	results = wait_for_results(list(dict.fromkeys(url for bet, url in placed)))
+	total_stake = 0
+	total_return = 0
+	unsettled = 0
+	for bet, url in placed:
+		total_stake += bet.stake
+		result = results.get(url) or get_race_result(result_url(url))
+		if result is None or bet.horse is None:
+			slog("ERROR", f"{bet.venue}{bet.race}R {bet.bet_type} {bet.horse}の結果を確認できませんでした。賭け金{bet.stake}円のみ資金から差し引きます（払戻があれば資金を手動で修正してください）。")
+			unsettled += 1
+			continue
+		payout = result.payout(bet.bet_type, bet.horse) * bet.stake // 100
+		total_return += payout
+		slog("INFO", f"{bet.venue}{bet.race}R {bet.bet_type} {bet.horse}番: {'★的中 ' + str(payout) + '円' if payout else '外れ'}")
+
+	slog("INFO", f"まとめて購入の結果: 購入 {total_stake}円 / 払戻 {total_return}円 / 未確認 {unsettled}点")
+	if total_stake:
+		update_capital(total_return - total_stake)
+
+	return {'stake': total_stake, 'return': total_return, 'unsettled': unsettled}
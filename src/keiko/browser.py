@@ -0,0 +1,161 @@
+import os
+import time
+import atexit
+import threading
+
+from selenium import webdriver
+
+from logger import slog
+
+# ヘッドレスで起動するかどうか
+HEADLESS = True
+# 画像・フォント・CSSの読み込みを止めるかどうか（画面の表示が崩れる場合はFalseにする）
+BLOCK_RESOURCES = True
+# 読み込みを止めるURLのパターン（Chrome DevTools ProtocolのNetwork.setBlockedURLs）
+BLOCKED_URL_PATTERNS = [
+	'*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico',
+	'*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+	'*.css',
+]
+# ページ読み込みのタイムアウト（秒）
+PAGE_LOAD_TIMEOUT = 30
+
+def get_profile_dir():
+	"""Chromeのプロファイル（db/chrome_profile）のパスを返す（Cookie・キャッシュを次回以降も使う）"""
+	script_dir = os.path.dirname(os.path.abspath(__file__))
+	project_root = os.path.dirname(os.path.dirname(script_dir))
+	return os.path.join(project_root, 'db', 'chrome_profile')
+
+class BrowserSession:
+	"""
+	使い回すChromeのセッション
+
+	ヘッドレスのChromeを1つだけ起動し、ログイン・入金・購入・結果確認で共有する。
+	get() のたびに応答を確認し、落ちていれば起動し直す。
+	"""
+
+	def __init__(self, headless=HEADLESS, block_resources=BLOCK_RESOURCES, profile_dir=None):
+		self.headless = headless
+		self.block_resources = block_resources
+		self.profile_dir = profile_dir or get_profile_dir()
+		self.driver = None
+		self.started_at = None
+		self._lock = threading.RLock()
+
+	def _options(self):
+		options = webdriver.ChromeOptions()
+		# Webドライバ－の警告を出さないようにする。
+		options.add_experimental_option('excludeSwitches', ['enable-logging'])
+		# DOM読み込みまで
+		options.set_capability('pageLoadStrategy', 'eager')
+		# User Agentを設定
+		options.add_argument("user-agent=Desired User Agent String")
+		# プロファイルを保存して次回以降も使う
+		os.makedirs(self.profile_dir, exist_ok=True)
+		options.add_argument(f"--user-data-dir={self.profile_dir}")
+		options.add_argument("--window-size=1280,1024")
+		options.add_argument("--no-first-run")
+		options.add_argument("--no-default-browser-check")
+		if self.headless:
+			options.add_argument('--headless=new')
+			options.add_argument('--disable-gpu')
+		if self.block_resources:
+			# 画像はすべてのタブで読み込まない
+			options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+		return options
+
+	def _block_resources(self):
+		"""現在のタブで画像・フォント・CSSの読み込みを止める"""
+		if not self.block_resources:
+			return
+		try:
+			self.driver.execute_cdp_cmd('Network.enable', {})
+			self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+		except Exception as e:
+			slog("WARNING", f"リソースの読み込み制限に失敗: {e}")
+
+	def start(self):
+		"""Chromeを起動する（起動済みの場合は何もしない）"""
+		with self._lock:
+			if self.driver is not None:
+				return self.driver
+			started = time.monotonic()
+			self.driver = webdriver.Chrome(self._options()) #Chrome起動
+			self.driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+			self._block_resources()
+			self.started_at = time.monotonic()
+			slog("INFO", f"Chromeを起動しました（{self.started_at - started:.1f}秒）")
+			return self.driver
+
+	def is_alive(self):
+		"""セッションが応答するかを確認する"""
+		if self.driver is None:
+			return False
+		try:
+			self.driver.execute_script("return 1")
+			return True
+		except Exception:
+			return False
+
+	def get(self):
+		"""
+		応答を確認したドライバーを返す（落ちている場合は起動し直す）
+
+		Returns:
+			WebDriver: Chromeのドライバー
+		"""
+		with self._lock:
+			if self.driver is not None and not self.is_alive():
+				slog("INFO", "Seleniumセッションが無効です。Chromeを起動し直します。")
+				self.quit()
+			return self.start()
+
+	def open_tab(self, url):
+		"""新しいタブでURLを開き、そのタブに切り替える（読み込み制限も適用する）"""
+		driver = self.get()
+		driver.switch_to.new_window('tab')
+		self._block_resources()
+		driver.get(url)
+		return driver
+
+	def quit(self):
+		"""Chromeを終了する"""
+		with self._lock:
+			if self.driver is None:
+				return
+			try:
+				self.driver.quit()
+			except Exception:
+				pass
+			self.driver = None
+			self.started_at = None
+
+# プロセス内で共有するセッション
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+	"""共有のBrowserSessionを返す（Chromeはまだ起動しない）"""
+	global _session
+	with _session_lock:
+		if _session is None:
+			_session = BrowserSession()
+			atexit.register(_session.quit)
+		return _session
+
+def prewarm_browser():
+	"""
+	バックグラウンドでChromeを起動しておく（投票時刻の前に呼び出す）
+
+	Returns:
+		threading.Thread: 起動処理のスレッド
+	"""
+	def run():
+		try:
+			get_session().get()
+		except Exception as e:
+			slog("ERROR", f"Chromeの事前起動に失敗しました: {e}")
+
+	thread = threading.Thread(target=run, name="browser-prewarm", daemon=True)
+	thread.start()
+	return thread
@@ -0,0 +1,298 @@
+import re
+import time
+import random
+from datetime import datetime
+from typing import NamedTuple
+from urllib.parse import urljoin, urlparse, parse_qs
+
+import requests
+from bs4 import BeautifulSoup
+
+from logger import slog
+from resilience import Deadline, retry_call
+
+# netkeibaのレース一覧（race_list.html が読み込む一覧部分）
+RACE_LIST_URL = 'https://race.netkeiba.com/top/race_list.html'
+RACE_LIST_SUB_URL = 'https://race.netkeiba.com/top/race_list_sub.html'
+# netkeibaのレース結果
+RESULT_URL = 'https://race.netkeiba.com/race/result.html'
+HEADERS = {
+	'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+# netkeiba用のサーキットブレーカー名
+NETKEIBA_BREAKER = 'netkeiba'
+
+# グレードアイコンのクラス番号
+GRADE_TYPES = {'1': 'G1', '2': 'G2', '3': 'G3', '5': 'OP', '15': 'L'}
+
+# 結果の確認間隔（秒、未公開の間は最大値まで伸ばす）
+RESULT_POLL_INITIAL = 15
+RESULT_POLL_MAX = 60
+RESULT_POLL_FACTOR = 1.5
+# 結果の公開を待つ上限（秒）
+RESULT_DEADLINE = 3 * 60 * 60
+
+class RaceEntry(NamedTuple):
+	"""レース一覧の1レース分"""
+	venue: str        # 開催（例: 3回 東京 8日目）
+	race_num: str     # レース番号（例: 10R）
+	title: str        # レース名
+	start_time: str   # 発走時刻（例: 15:25）
+	course: str       # コース（例: 芝1600m）
+	grade: str        # グレード（アイコンがない場合は未勝利）
+	url: str          # 出馬表のURL
+	race_id: str      # 12桁のレースID
+
+class RaceResult(NamedTuple):
+	"""レース結果（着順と単勝・複勝の払戻）"""
+	finish: list      # [(着順, 馬番), ...]（着順は取消・除外などの場合None）
+	fukusho: dict     # {馬番: 100円あたりの払戻金}
+	tansho: dict      # {馬番: 100円あたりの払戻金}
+
+	def payout(self, bet_type, horse):
+		"""式別・馬番の100円あたりの払戻金（外れは0）"""
+		payouts = {'単勝': self.tansho, '複勝': self.fukusho}[bet_type]
+		return payouts.get(horse, 0)
+
+def _parser():
+	"""使用するBeautifulSoupのパーサー（lxmlがあればlxml）"""
+	try:
+		import lxml
+		return 'lxml'
+	except ImportError:
+		return 'html.parser'
+
+def _text(element):
+	return element.get_text(strip=True) if element is not None else ''
+
+def _race_id(url):
+	qs = parse_qs(urlparse(url).query)
+	return qs['race_id'][0] if qs.get('race_id') else ''
+
+def parse_race_list(html, base_url=RACE_LIST_URL):
+	"""
+	netkeibaのレース一覧のHTMLを1回の走査でレースのリストに変換する
+
+	Args:
+		html: ページのHTML（page_sourceまたはHTTPで取得した内容）
+		base_url: 相対URLを解決する基準のURL
+
+	Returns:
+		list: RaceEntryのリスト（ページの表示順）
+	"""
+	soup = BeautifulSoup(html, _parser())
+	races = []
+	for data_list in soup.select('.RaceList_DataList'):
+		venue = _text(data_list.select_one('.RaceList_DataTitle'))
+		for item in data_list.select('.RaceList_DataItem'):
+			link = item.find('a', href=True)
+			if link is None:
+				continue
+			content = item.select_one('.RaceList_ItemContent')
+			race_data = content.select_one('.RaceData') if content is not None else None
+
+			grade = "未勝利"
+			grade_icon = content.select_one('.Icon_GradeType') if content is not None else None
+			if grade_icon is not None:
+				for cls in grade_icon.get('class', []):
+					match = re.fullmatch(r'Icon_GradeType(\d+)', cls)
+					if match:
+						grade = GRADE_TYPES.get(match.group(1), f"GradeType{match.group(1)}")
+
+			course = ''
+			if race_data is not None:
+				course_element = race_data.select_one('.RaceList_ItemLong')
+				if course_element is None:
+					spans = race_data.find_all('span')
+					course_element = spans[1] if len(spans) > 1 else None
+				course = _text(course_element)
+
+			url = urljoin(base_url, link['href'])
+			races.append(RaceEntry(
+				venue=venue,
+				race_num=_text(item.select_one('.Race_Num')),
+				title=_text(content.select_one('.ItemTitle')) if content is not None else '',
+				start_time=_text(race_data.select_one('.RaceList_Itemtime')) if race_data is not None else '',
+				course=course,
+				grade=grade,
+				url=url,
+				race_id=_race_id(url),
+			))
+	return races
+
+def fetch_race_list(date=None, timeout=10):
+	"""
+	当日（dateを指定した場合はその日）のレース一覧をHTTPで取得する（ブラウザを使わない）
+
+	Args:
+		date: 'YYYYMMDD' 形式の日付
+
+	Returns:
+		list: RaceEntryのリスト（取得できなかった場合は空のリスト）
+	"""
+	date = date or datetime.now().strftime("%Y%m%d")
+	started = time.monotonic()
+
+	def fetch():
+		response = requests.get(RACE_LIST_SUB_URL, params={'kaisai_date': date}, headers=HEADERS, timeout=timeout)
+		response.raise_for_status()
+		return response.content
+
+	try:
+		content = retry_call(
+			fetch,
+			retry_on=requests.exceptions.RequestException,
+			breaker=NETKEIBA_BREAKER,
+			name="netkeibaのレース一覧取得",
+		)
+	except Exception as e:
+		slog("WARNING", f"レース一覧をHTTPで取得できませんでした: {e}")
+		return []
+
+	races = parse_race_list(content, base_url=RACE_LIST_URL)
+	slog("INFO", f"レース一覧を取得しました: {len(races)}レース（{time.monotonic() - started:.2f}秒）")
+	return races
+
+def result_url(race_url):
+	"""出馬表のURL（またはレースID）から結果ページのURLを作る"""
+	race_id = _race_id(race_url) or race_url
+	race_id = "".join(re.findall(r"\d", race_id))[:12]
+	return f"{RESULT_URL}?race_id={race_id}&rf=race_submenu"
+
+def _normalize(text):
+	return re.sub(r'\s+', '', text)
+
+def _parse_finish(soup):
+	"""着順表（見出しに着順・馬番がある表）から (着順, 馬番) を読み取る"""
+	for table in soup.find_all('table'):
+		header = table.find('tr')
+		if header is None:
+			continue
+		columns = [_normalize(cell.get_text()) for cell in header.find_all(['th', 'td'])]
+		if '着順' not in columns or '馬番' not in columns:
+			continue
+		rank_col, horse_col = columns.index('着順'), columns.index('馬番')
+		finish = []
+		for row in header.find_next_siblings('tr') or table.find_all('tr')[1:]:
+			cells = row.find_all('td')
+			if len(cells) <= max(rank_col, horse_col):
+				continue
+			rank, horse = _text(cells[rank_col]), _text(cells[horse_col])
+			if not horse.isdigit():
+				continue
+			finish.append((int(rank) if rank.isdigit() else None, int(horse)))
+		return finish
+	return []
+
+def _parse_payouts(soup, bet_type):
+	"""払戻表の式別（単勝・複勝）の行から {馬番: 払戻金} を読み取る"""
+	for header in soup.find_all('th'):
+		if _normalize(header.get_text()) != bet_type:
+			continue
+		cells = header.find_parent('tr').find_all('td')
+		if len(cells) < 2:
+			continue
+		horses = re.findall(r'\d+', cells[0].get_text(' '))
+		payouts = [int(value.replace(',', '')) for value in re.findall(r'([\d,]+)円', cells[1].get_text(' '))]
+		return {int(horse): payout for horse, payout in zip(horses, payouts)}
+	return {}
+
+def parse_race_result(html):
+	"""
+	結果ページから着順表と単勝・複勝の払戻だけを読み取る
+
+	Args:
+		html: 結果ページのHTML
+
+	Returns:
+		RaceResult: 結果（払戻がまだ公開されていない場合はNone）
+	"""
+	soup = BeautifulSoup(html, _parser())
+	fukusho = _parse_payouts(soup, '複勝')
+	if not fukusho:
+		return None
+	return RaceResult(finish=_parse_finish(soup), fukusho=fukusho, tansho=_parse_payouts(soup, '単勝'))
+
+def fetch_race_result(url, session=None, timeout=10):
+	"""
+	結果ページをHTTPで1回取得して解析する
+
+	Returns:
+		RaceResult: 結果（払戻がまだ公開されていない場合はNone）
+	"""
+	client = session or requests
+
+	def fetch():
+		response = client.get(url, headers=HEADERS, timeout=timeout)
+		response.raise_for_status()
+		return response.content
+
+	content = retry_call(
+		fetch,
+		retry_on=requests.exceptions.RequestException,
+		breaker=NETKEIBA_BREAKER,
+		name="netkeibaのレース結果取得",
+	)
+	return parse_race_result(content)
+
+def wait_for_results(race_urls, deadline=RESULT_DEADLINE, stop_event=None):
+	"""
+	複数のレースの結果ページをHTTPで確認し、すべての払戻が公開されるまで待つ
+
+	公開されていないレースだけを確認し続ける。未公開の間は確認間隔を
+	RESULT_POLL_INITIAL 秒から RESULT_POLL_MAX 秒まで伸ばし、新しく公開された
+	レースがあれば元の間隔に戻す。取得に失敗した場合も同じ間隔で確認を続ける。
+
+	Args:
+		race_urls: 出馬表のURL（または結果ページのURL・レースID）のリスト
+		deadline: 待機の上限（秒）
+		stop_event: セットされたら待機を中断する threading.Event
+
+	Returns:
+		dict: {race_url: RaceResult}（期限までに公開されなかったレース・中断された場合はNone）
+	"""
+	results = {race_url: None for race_url in race_urls}
+	limit = Deadline(deadline)
+	started = time.monotonic()
+	interval = RESULT_POLL_INITIAL
+	polls = 0
+
+	with requests.Session() as session:
+		while True:
+			polls += 1
+			published = False
+			for race_url in [race_url for race_url, result in results.items() if result is None]:
+				try:
+					result = fetch_race_result(result_url(race_url), session=session)
+				except Exception as e:
+					slog("WARNING", f"レース結果の確認に失敗しました: {e}")
+					continue
+				if result is not None:
+					results[race_url] = result
+					published = True
+					slog("INFO", f"レース結果が公開されました: {_race_id(result_url(race_url))}（{time.monotonic() - started:.0f}秒、{polls}回目の確認）")
+
+			pending = [race_url for race_url, result in results.items() if result is None]
+			if not pending:
+				return results
+			if limit.expired():
+				slog("ERROR", f"レース結果が{deadline}秒以内に公開されませんでした: {pending}")
+				return results
+
+			interval = RESULT_POLL_INITIAL if published else interval
+			delay = min(interval * random.uniform(0.8, 1.2), limit.remaining())
+			if stop_event is not None:
+				if stop_event.wait(delay):
+					return results
+			else:
+				time.sleep(delay)
+			interval = min(interval * RESULT_POLL_FACTOR, RESULT_POLL_MAX)
+
+def wait_for_result(race_url, deadline=RESULT_DEADLINE, stop_event=None):
+	"""
+	結果ページをHTTPで確認し、払戻が公開されるまで待つ（wait_for_results の1レース版）
+
+	Returns:
+		RaceResult: 結果（期限までに公開されなかった場合・中断された場合はNone）
+	"""
+	return wait_for_results([race_url], deadline, stop_event)[race_url]
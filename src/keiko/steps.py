@@ -0,0 +1,134 @@
+import time
+from contextlib import contextmanager
+
+from selenium.common.exceptions import (
+	ElementClickInterceptedException,
+	ElementNotInteractableException,
+	NoSuchElementException,
+	StaleElementReferenceException,
+)
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+
+from logger import slog
+from resilience import Deadline, DeadlineExceeded
+
+# 1ステップの待機上限（秒）
+STEP_TIMEOUT = 10
+# 条件の確認間隔（秒）
+POLL_INTERVAL = 0.1
+
+# 表示の切り替え中に起きる（再試行すればよい）例外
+TRANSIENT_ERRORS = (
+	NoSuchElementException,
+	StaleElementReferenceException,
+	ElementClickInterceptedException,
+	ElementNotInteractableException,
+)
+
+class StepTimer:
+	"""
+	画面操作のステップごとの所要時間を記録する
+
+	step() の待機時間はステップごとの上限と、全体の期限の残りの短い方になる。
+	"""
+
+	def __init__(self, name, deadline=None):
+		"""
+		Args:
+			name: 処理名（ログ表示用）
+			deadline: 処理全体の期限（秒、省略時は期限なし）
+		"""
+		self.name = name
+		self.deadline = Deadline(deadline)
+		self.steps = []
+		self.started = time.monotonic()
+
+	@contextmanager
+	def step(self, name, timeout=STEP_TIMEOUT):
+		"""
+		1ステップを計測する
+
+		Yields:
+			float: このステップで待機してよい秒数
+
+		Raises:
+			DeadlineExceeded: 全体の期限を過ぎている場合
+		"""
+		remaining = self.deadline.remaining()
+		if remaining is not None:
+			if remaining <= 0:
+				raise DeadlineExceeded(f"{self.name}の期限を過ぎました（{name}）")
+			timeout = min(timeout, remaining)
+
+		started = time.monotonic()
+		ok = False
+		try:
+			yield timeout
+			ok = True
+		finally:
+			elapsed = time.monotonic() - started
+			self.steps.append((name, elapsed, ok))
+			if not ok:
+				slog("WARNING", f"{self.name}: {name} に失敗しました（{elapsed:.2f}秒）")
+
+	def report(self):
+		"""ステップごとの所要時間をログに出力し、合計秒数を返す"""
+		total = time.monotonic() - self.started
+		detail = " / ".join(f"{name} {elapsed:.2f}秒" + ("" if ok else "（失敗）") for name, elapsed, ok in self.steps)
+		slog("INFO", f"{self.name}の所要時間: {total:.2f}秒（{detail}）")
+		return total
+
+def wait_for(driver, condition, timeout=STEP_TIMEOUT, message=''):
+	"""
+	条件を満たすまで待つ（満たした時点ですぐに戻る）
+
+	Raises:
+		TimeoutException: timeout秒以内に条件を満たさなかった場合
+	"""
+	return WebDriverWait(driver, timeout, poll_frequency=POLL_INTERVAL, ignored_exceptions=TRANSIENT_ERRORS).until(condition, message)
+
+def present(driver, by, value, timeout=STEP_TIMEOUT):
+	"""要素がDOMに現れるまで待って返す"""
+	return wait_for(driver, EC.presence_of_element_located((by, value)), timeout, f"{value} が見つかりません")
+
+def visible(driver, by, value, timeout=STEP_TIMEOUT):
+	"""要素が表示されるまで待って返す"""
+	return wait_for(driver, EC.visibility_of_element_located((by, value)), timeout, f"{value} が表示されません")
+
+def clickable(driver, by, value, timeout=STEP_TIMEOUT):
+	"""要素がクリックできるようになるまで待って返す"""
+	return wait_for(driver, EC.element_to_be_clickable((by, value)), timeout, f"{value} がクリックできません")
+
+def click(driver, by, value, timeout=STEP_TIMEOUT):
+	"""
+	要素をクリックする（表示の切り替え中で押せない場合は押せるまで繰り返す）
+
+	Returns:
+		WebElement: クリックした要素
+	"""
+	def try_click(d):
+		element = d.find_element(by, value)
+		if not (element.is_displayed() and element.is_enabled()):
+			return False
+		element.click()
+		return element
+
+	return wait_for(driver, try_click, timeout, f"{value} をクリックできません")
+
+def new_window(driver, count, timeout=STEP_TIMEOUT):
+	"""ウィンドウがcount個以上になるまで待って、最後に開いたウィンドウに切り替える"""
+	wait_for(driver, lambda d: len(d.window_handles) >= count, timeout, "新しいウィンドウが開きません")
+	driver.switch_to.window(driver.window_handles[-1])
+
+def alert(driver, timeout=STEP_TIMEOUT):
+	"""アラートが表示されるまで待って返す"""
+	return wait_for(driver, EC.alert_is_present(), timeout, "アラートが表示されません")
+
+def text_changes(driver, by, value, before, timeout=STEP_TIMEOUT):
+	"""要素のテキストがbeforeから変わるまで待って、新しいテキストを返す"""
+	def changed(d):
+		text = d.find_element(by, value).text
+		return text if text and text != before else False
+
+	return wait_for(driver, changed, timeout, f"{value} の表示が変わりません")
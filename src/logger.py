@@ -1,31 +1,147 @@
 from datetime import datetime
 import os
+import sys
+import queue
+import atexit
+import threading
+import multiprocessing
+
+# ログ出力先（logs/YYYY-MM-DD.log）
+LOGS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs")
+
+# 書き込みスレッドの終了指示
+_STOP = object()
+
+_queue = queue.Queue()
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+# 子プロセスで直接書き込む場合の排他
+_direct_lock = threading.Lock()
 
 
 def slog(system_state, log_message):
     """
     ログを出力する関数
-    
+
     Args:
         system_state (str): システム状態（例：RUNNING, ERROR, INFO など）
         log_message (str): ログ出力内容
-    
+
     フォーマット: {日付} {時刻} {システム状態} {ログ出力}
+    呼び出し側はキューに積むだけで、標準出力・ファイルへの書き込みは
+    バックグラウンドの書き込みスレッドがまとめて行う。
+    ProcessPoolExecutor のワーカーなどの子プロセスは終了時にキューを書き出さないため、
+    子プロセスでは呼び出し時にその場で書き込む。
     """
     now = datetime.now()
     date_str = now.strftime("%Y-%m-%d")
     time_str = now.strftime("%H:%M:%S")
-    
+
     formatted_log = f"{date_str} {time_str} {system_state} {log_message}"
-    
-    print(formatted_log)
-    
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    project_root = os.path.dirname(script_dir)
-    logs_dir = os.path.join(project_root, "logs")
-    log_filename = os.path.join(logs_dir, f"{date_str}.log")
-    
-    os.makedirs(logs_dir, exist_ok=True)
-    
-    with open(log_filename, 'a', encoding='utf-8') as f:
-        f.write(formatted_log + '\n')
\ No newline at end of file
+
+    if multiprocessing.parent_process() is not None:
+        _write_direct(date_str, formatted_log)
+        return
+
+    _ensure_writer()
+    _queue.put((date_str, formatted_log))
+
+
+def _write_direct(date_str, formatted_log):
+    """1件のログを標準出力とログファイルにすぐ書き込む（子プロセス用）"""
+    with _direct_lock:
+        try:
+            print(formatted_log, flush=True)
+            os.makedirs(LOGS_DIR, exist_ok=True)
+            with open(os.path.join(LOGS_DIR, f"{date_str}.log"), 'a', encoding='utf-8') as f:
+                f.write(formatted_log + '\n')
+        except Exception as e:
+            print(f"ログの書き込みに失敗しました: {e}", file=sys.stderr)
+
+
+def _ensure_writer():
+    """書き込みスレッドが動いていなければ起動する（fork後の子プロセスでも起動し直す）"""
+    global _queue, _writer, _writer_pid
+
+    if _writer is not None and _writer_pid == os.getpid() and _writer.is_alive():
+        return
+
+    with _writer_lock:
+        if _writer is not None and _writer_pid == os.getpid() and _writer.is_alive():
+            return
+        if _writer_pid is not None and _writer_pid != os.getpid():
+            # fork元のキューとスレッドは引き継がない
+            _queue = queue.Queue()
+        _writer = threading.Thread(target=_write_loop, args=(_queue,), name="slog-writer", daemon=True)
+        _writer_pid = os.getpid()
+        _writer.start()
+
+
+def _write_loop(log_queue):
+    """キューに溜まったログをまとめて標準出力とログファイルに書き込む"""
+    current_date = None
+    log_file = None
+
+    try:
+        while True:
+            batch = [log_queue.get()]
+            # 溜まっている分をまとめて取り出す
+            while True:
+                try:
+                    batch.append(log_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = any(item is _STOP for item in batch)
+            try:
+                lines = []
+                for item in batch:
+                    if item is _STOP:
+                        continue
+                    date_str, formatted_log = item
+                    # 日付が変わったらファイルを切り替える
+                    if date_str != current_date:
+                        if lines:
+                            log_file.write('\n'.join(lines) + '\n')
+                            lines = []
+                        if log_file is not None:
+                            log_file.close()
+                            log_file = None
+                        current_date = None
+                        os.makedirs(LOGS_DIR, exist_ok=True)
+                        log_file = open(os.path.join(LOGS_DIR, f"{date_str}.log"), 'a', encoding='utf-8')
+                        current_date = date_str
+                    lines.append(formatted_log)
+                    print(formatted_log)
+
+                if lines:
+                    log_file.write('\n'.join(lines) + '\n')
+                if log_file is not None:
+                    log_file.flush()
+                sys.stdout.flush()
+            except Exception as e:
+                # 書き込みに失敗してもスレッドは止めない（flush() が待ち続けないようにする）
+                print(f"ログの書き込みに失敗しました: {e}", file=sys.stderr)
+            finally:
+                for _ in batch:
+                    log_queue.task_done()
+            if stop:
+                break
+    finally:
+        if log_file is not None:
+            log_file.close()
+
+
+def flush():
+    """キューに積まれたログがすべて書き込まれるまで待つ"""
+    if _writer is not None and _writer_pid == os.getpid() and _writer.is_alive():
+        _queue.join()
+
+
+@atexit.register
+def _shutdown():
+    """終了時に残りのログを書き込んで書き込みスレッドを止める"""
+    if _writer is not None and _writer_pid == os.getpid() and _writer.is_alive():
+        _queue.put(_STOP)
+        _writer.join(timeout=5)
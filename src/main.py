@@ -1,20 +1,36 @@
 #!/usr/bin/env python3
 
 import jpholiday
-import time
 import sys
+import argparse
 
 from logger import slog
 from datetime import datetime
-from keiko.bet import web_login,payment,purchase,result_check
-from taq.token_store import get_token
-from taq.trader import execute_trade
-from utils import is_target_time
+from resilience import retry_call
+from scheduler import Scheduler, now_jst, wait_until
 
-def is_holiday_today():
-	"""今日が祝日かどうかを判定する
+# トークン取得の期限（秒）と再試行の設定
+# kabuステーションの起動を待てるよう、試行回数は期限いっぱいまで再試行できる値にする
+TOKEN_DEADLINE = 300
+TOKEN_ATTEMPTS = 20
+TOKEN_BASE_DELAY = 5.0
+TOKEN_MAX_DELAY = 60.0
+
+# 常駐モードのジョブ実行時刻（JST）
+TOKEN_PREWARM_TIME = "08:45"
+STOCK_TRADE_TIME = "08:55"
+BROWSER_PREWARM_TIME = "14:15"
+RACE_TIME = "14:30"
+
+WEEKDAYS = ["月", "火", "水", "木", "金", "土", "日"]
+
+# 重い依存（株: pandas / TA-Lib / pandas_datareader、競馬: Selenium / pandas）は
+# 起動時ではなく各モードの処理の中で読み込む
+
+def is_holiday_today(today=None):
+	"""今日（todayを指定した場合はその日）が祝日かどうかを判定する
 	"""
-	today = datetime.now().date()
+	today = today or datetime.now().date()
 	
 	# jpholidayで祝日判定
 	if jpholiday.is_holiday(today):
@@ -28,11 +44,163 @@ def is_holiday_today():
 	
 	return False, ""
 
+def is_race_day(day):
+	"""競馬の日（土日・祝日）かどうか"""
+	return day.weekday() >= 5 or is_holiday_today(day)[0]
+
+def is_trading_day(day):
+	"""株の取引日（競馬の日以外）かどうか"""
+	return not is_race_day(day)
+
+def obtain_token():
+	"""有効なトークンを用意する（失敗した場合は例外を送出する）"""
+	from taq.token_store import ensure_token
+
+	if not ensure_token(use_test_api=True):
+		raise RuntimeError("有効なトークンを用意できませんでした。")
+	return True
+
+def prepare_token():
+	"""
+	トークンを用意する（保存済みのトークンが有効ならそのまま使い、無効なら再発行する）
+
+	Returns:
+		bool: 有効なトークンを用意できたかどうか
+	"""
+	slog("INFO", "トークン取得中...")
+	try:
+		# 失敗時は指数バックオフで再試行
+		retry_call(
+			obtain_token,
+			attempts=TOKEN_ATTEMPTS,
+			base_delay=TOKEN_BASE_DELAY,
+			max_delay=TOKEN_MAX_DELAY,
+			deadline=TOKEN_DEADLINE,
+			name="トークン取得",
+		)
+		slog("INFO", "トークン取得に成功しました。")
+		return True
+	except Exception as e:
+		slog("ERROR", f"トークン取得に失敗しました: {e}")
+		return False
+
+def run_race_day(current_weekday, wait=True):
+	"""
+	競馬自動投票を実行する
+
+	Args:
+		current_weekday: 曜日（"土" など）
+		wait: Trueの場合は14時30分まで待機してから実行する
+	"""
+	slog("INFO", "競馬自動投票ツールを実行します。")
+	from keiko.bet import web_login, payment, purchase, result_check, load_bets, purchase_batch, result_check_batch
+	from keiko.browser import prewarm_browser
+
+	# db/bets.json がある場合はまとめて購入する
+	try:
+		bets = load_bets()
+	except Exception as e:
+		slog("ERROR", f"bets.jsonを読み込めませんでした: {e}")
+		return False
+
+	if wait:
+		# 待機中にChromeを起動しておく
+		prewarm_browser()
+		slog("INFO", "14時30分まで待機します...")
+		wait_until(RACE_TIME)
+
+	# JRA WEBログイン
+	if not web_login():
+		return False
+
+	# 入金処理
+	if not payment(sum(bet.stake for bet in bets)):
+		return False
+
+	if bets:
+		# まとめて購入
+		placed = purchase_batch(bets, current_weekday)
+		if not placed:
+			return False
+
+		# 結果確認（すべてのレースの払戻が公開されるまでnetkeibaを確認する）
+		slog("INFO", "結果が公開されるまで待機します。")
+		summary = result_check_batch(placed)
+		if summary['return'] > summary['stake']:
+			slog("INFO", "★勝ち")
+		else:
+			slog("INFO", "負け")
+		return summary['unsettled'] == 0
+
+	# 購入処理
+	url = purchase(current_weekday)
+	if not url:
+		return False
+
+	# 結果確認（払戻が公開されるまでnetkeibaを確認する）
+	slog("INFO", "結果が公開されるまで待機します。")
+	dividend = result_check(url)
+	if dividend is None:
+		slog("ERROR", "結果を確認できませんでした。")
+		return False
+	if dividend:
+		slog("INFO", "★勝ち")
+	else:
+		slog("INFO", "負け")
+
+	return True
+
+def run_stock_job():
+	"""株自動売買を実行する（常駐モード用）"""
+	from taq.trader import execute_trade
+	from taq.position_store import close_connection
+
+	slog("INFO", "株自動売買ツールを実行します。")
+	if not prepare_token():
+		return False
+	try:
+		return execute_trade()
+	finally:
+		# 翌日のジョブまでポジションDBの接続を保持しない
+		close_connection()
+
+def warm_up_stock():
+	"""株のモジュールを読み込み、トークンを確認しておく（常駐モードで取引前に実行）"""
+	import taq.trader
+
+	return prepare_token()
+
+def warm_up_race():
+	"""競馬のモジュールを読み込み、Chromeを起動しておく（常駐モードで投票前に実行）"""
+	import keiko.bet
+	from keiko.browser import prewarm_browser
+
+	prewarm_browser().join()
+	return True
+
+def run_race_job():
+	"""競馬自動投票を実行する（常駐モード用）"""
+	return run_race_day(WEEKDAYS[now_jst().weekday()], wait=False)
+
+def run_daemon():
+	"""
+	常駐モード：登録したジョブを毎日指定時刻（JST）に実行する
+	読み込み済みのモジュール・接続・トークン・キャッシュは翌日以降も使い回す
+	"""
+	slog("START", "TAQIKOを常駐モードで起動します。")
+
+	scheduler = Scheduler()
+	scheduler.register("取引準備", TOKEN_PREWARM_TIME, warm_up_stock, when=is_trading_day)
+	scheduler.register("株自動売買", STOCK_TRADE_TIME, run_stock_job, when=is_trading_day)
+	scheduler.register("投票準備", BROWSER_PREWARM_TIME, warm_up_race, when=is_race_day)
+	scheduler.register("競馬自動投票", RACE_TIME, run_race_job, when=is_race_day)
+	scheduler.run_forever()
+	return True
+
 def main():
 	slog("START", "TAQIKOを起動します。")
 	
-	weekdays = ["月", "火", "水", "木", "金", "土", "日"]
-	current_weekday = weekdays[datetime.now().weekday()]
+	current_weekday = WEEKDAYS[datetime.now().weekday()]
 	
 	slog("INFO", f"今日は{current_weekday}曜日です。")
 	
@@ -43,64 +211,27 @@ def main():
 		if is_holiday:
 			slog("INFO", f"今日は祝日({holiday_name})です。")
 
-		slog("INFO", "競馬自動投票ツールを実行します。")
-
-		slog("INFO", "14時30分まで待機します...")
-		while not is_target_time("14:30"):
-			time.sleep(60)  # 1分ごとにチェック
-
-		# JRA WEBログイン
-		if not web_login():
-			return False
-
-		# 入金処理
-		if not payment():
-			return False
-
-		# 購入処理
-		url = purchase(current_weekday)
-		if not url:
-			return False
-
-		# 1時間待機
-		slog("INFO", "結果が反映されるまで30分待機します。")
-		time.sleep(1800) # 30分
-
-		# 結果確認
-		dividend = result_check(url)
-		if dividend:
-			slog("INFO", "★勝ち")
-		else:
-			slog("INFO", "負け")
-
-		return True
+		return run_race_day(current_weekday)
 	else:
 		slog("INFO", "株自動売買ツールを実行します。")
-		retry_interval = 60  # 1分
-		
-		for attempt in range(3):
-			slog("INFO", f"トークン取得中...({attempt + 1}/3)")
-			ret = get_token(use_test_api=True)
-			if ret:
-				slog("INFO", "トークン取得に成功しました。")
-				break
-			else:
-				slog("ERROR", f"トークン取得に失敗しました。({attempt + 1}/3)")
-				if attempt < 3 - 1:  # 最後の試行でない場合
-					slog("INFO", f"{retry_interval}秒後に再試行します。")
-					time.sleep(retry_interval)
-		else:
-			# 3回とも失敗した場合
-			slog("ERROR", "トークン取得に3回失敗しました。")
+		if not prepare_token():
 			slog("END", "TAQIKOを終了します。")
 			sys.exit(1)
 
 		# 株価取得 & 解析
+		from taq.trader import execute_trade
 		execute_trade()
 		
 	return True
 
 if __name__ == "__main__":    
-	main()
+	parser = argparse.ArgumentParser(description="TAQIKO")
+	parser.add_argument('--daemon', action='store_true', help="常駐して毎日指定時刻にジョブを実行する")
+	args = parser.parse_args()
+
+	if args.daemon:
+		run_daemon()
+	else:
+		main()
 	slog("END", "TAQIKOを終了します。\n")
 	sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,291 @@
+import time
+import random
+import threading
+from logger import slog
+
+# 既定の再試行設定（指数バックオフ + ジッター）
+DEFAULT_ATTEMPTS = 3
+DEFAULT_BASE_DELAY = 0.2
+DEFAULT_MAX_DELAY = 30.0
+
+
+class CircuitOpenError(Exception):
+    """サーキットブレーカーが開いている（接続先が停止中と判断している）場合の例外"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} は停止中と判断しています（{retry_after:.1f}秒後に再開）")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    """期限までに処理が完了しなかった場合の例外"""
+
+
+class Deadline:
+    """処理全体の期限（time.monotonic基準）"""
+
+    def __init__(self, seconds):
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+
+    def remaining(self):
+        """残り秒数（期限なしの場合はNone）"""
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def expired(self):
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+
+class CircuitBreaker:
+    """
+    接続先ごとのサーキットブレーカー
+
+    連続でfailure_threshold回失敗すると開き、reset_timeout秒の間は呼び出さずに
+    CircuitOpenErrorを送出する。経過後は1回だけ試し（半開）、成功すれば閉じる。
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return 'half_open'
+            return 'open'
+
+    def before_call(self):
+        """
+        呼び出し前に確認する
+
+        Raises:
+            CircuitOpenError: 開いている場合（半開で既に試行中の場合を含む）
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return
+            elapsed = time.monotonic() - self.opened_at
+            if elapsed < self.reset_timeout:
+                raise CircuitOpenError(self.name, self.reset_timeout - elapsed)
+            if self._trial:
+                raise CircuitOpenError(self.name, 0.0)
+            self._trial = True
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                slog("INFO", f"{self.name} が復旧しました。")
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    slog("WARNING", f"{self.name} が{self.failures}回連続で失敗したため、{self.reset_timeout:.0f}秒間呼び出しを停止します。")
+                self.opened_at = time.monotonic()
+
+    def call(self, func, *args, **kwargs):
+        """ブレーカーを通して関数を呼び出す"""
+        self.before_call()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+
+# 接続先名ごとの共有ブレーカー
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+class RateLimiter:
+    """
+    トークンバケットによる呼び出し回数の制限（スレッド間で共有する）
+
+    1秒あたりrate個のトークンが貯まり（最大burst個）、acquire()は
+    トークンが1個貯まるまで待ってから消費する。try_acquire()は待たずに結果を返す。
+    """
+
+    def __init__(self, rate, burst=None):
+        """
+        Args:
+            rate: 1秒あたりの呼び出し回数の上限（0またはNoneで無制限）
+            burst: 連続して呼び出せる回数（省略時はrate、最低1）
+        """
+        self.rate = rate
+        self.capacity = max(burst if burst is not None else (rate or 0), 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self):
+        """トークンを1個消費できれば0、足りなければ貯まるまでの秒数を返す"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def try_acquire(self):
+        """
+        トークンが残っていれば1個消費する（待たない）
+
+        Returns:
+            bool: 消費できたかどうか
+        """
+        return not self.rate or self._take() == 0.0
+
+    def acquire(self):
+        """
+        トークンを1個消費する（足りない場合は貯まるまで待つ）
+
+        Returns:
+            float: 待機した秒数
+        """
+        if not self.rate:
+            return 0.0
+        waited = 0.0
+        while True:
+            delay = self._take()
+            if delay == 0.0:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+
+def get_breaker(name, failure_threshold=5, reset_timeout=30.0):
+    """接続先名ごとの共有CircuitBreakerを返す（初回のみ設定を使用）"""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+            _breakers[name] = breaker
+        return breaker
+
+
+def backoff_delays(attempts=DEFAULT_ATTEMPTS, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY):
+    """
+    再試行前の待機秒数を返す（指数バックオフ + フルジッター）
+
+    Returns:
+        list: attempts - 1 個の待機秒数
+    """
+    return [random.uniform(0, min(max_delay, base_delay * 2 ** i)) for i in range(attempts - 1)]
+
+
+def _prepare(name, breaker, deadline):
+    if isinstance(breaker, str):
+        breaker = get_breaker(breaker)
+    if not isinstance(deadline, Deadline):
+        deadline = Deadline(deadline)
+    return name or (breaker.name if breaker else 'call'), breaker, deadline
+
+
+def _matches(error, condition):
+    if isinstance(condition, (type, tuple)):
+        return isinstance(error, condition)
+    return condition(error)
+
+
+def _on_failure(error, attempt, attempts, delays, retry_on, trips_breaker, breaker, deadline, name):
+    """
+    失敗を記録し、再試行する場合は待機秒数を返す（再試行しない場合は例外を送出する）
+
+    retry_onに該当しない例外（入力エラーなど）と、trips_breakerに該当しない例外
+    （実行回数エラーなど、接続先が応答しているもの）は接続先の障害とみなさない。
+    """
+    transient = _matches(error, retry_on)
+    if breaker is not None:
+        if transient and (trips_breaker is None or _matches(error, trips_breaker)):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+    if not transient or attempt >= attempts - 1:
+        raise error
+    delay = delays[attempt]
+    remaining = deadline.remaining()
+    if remaining is not None and remaining <= delay:
+        raise DeadlineExceeded(f"{name} の期限を超えました: {error}") from error
+    slog("WARNING", f"{name} に失敗: {error} - {delay:.2f}秒後に再試行します（{attempt + 1}/{attempts}）")
+    return delay
+
+
+def retry_call(func, *args, attempts=DEFAULT_ATTEMPTS, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY,
+               deadline=None, retry_on=(Exception,), trips_breaker=None, breaker=None, name=None, **kwargs):
+    """
+    関数を指数バックオフで再試行しながら呼び出す
+
+    Args:
+        func: 呼び出す関数
+        attempts: 最大試行回数
+        base_delay: 1回目の再試行前の待機秒数の上限（以降2倍ずつ、max_delayまで）
+        max_delay: 待機秒数の上限
+        deadline: 全体の期限（秒またはDeadline）。超えた場合は再試行しない
+        retry_on: 再試行する例外の型、または例外を受け取って再試行するかを返す関数
+        trips_breaker: 再試行する例外のうちブレーカーの失敗として数えるもの（型または関数、省略時はすべて）
+        breaker: CircuitBreakerまたは接続先名（get_breakerで取得）
+        name: ログに表示する名前
+
+    Returns:
+        funcの戻り値
+
+    Raises:
+        最後の試行で発生した例外、CircuitOpenError、DeadlineExceeded
+    """
+    name, breaker, deadline = _prepare(name, breaker, deadline)
+    delays = backoff_delays(attempts, base_delay, max_delay)
+
+    for attempt in range(attempts):
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            delay = _on_failure(e, attempt, attempts, delays, retry_on, trips_breaker, breaker, deadline, name)
+            time.sleep(delay)
+        else:
+            if breaker is not None:
+                breaker.record_success()
+            return result
+
+
+async def retry_async(func, *args, attempts=DEFAULT_ATTEMPTS, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY,
+                      deadline=None, retry_on=(Exception,), trips_breaker=None, breaker=None, name=None, **kwargs):
+    """retry_call のコルーチン版（funcはコルーチン関数）"""
+    import asyncio
+
+    name, breaker, deadline = _prepare(name, breaker, deadline)
+    delays = backoff_delays(attempts, base_delay, max_delay)
+
+    for attempt in range(attempts):
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception as e:
+            delay = _on_failure(e, attempt, attempts, delays, retry_on, trips_breaker, breaker, deadline, name)
+            await asyncio.sleep(delay)
+        else:
+            if breaker is not None:
+                breaker.record_success()
+            return result
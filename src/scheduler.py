@@ -0,0 +1,147 @@
+import time
+import signal
+import datetime
+import threading
+from logger import slog
+
+# 日本標準時
+JST = datetime.timezone(datetime.timedelta(hours=9))
+
+
+def now_jst():
+    return datetime.datetime.now(JST)
+
+
+def parse_time(text):
+    """'14:30' や '8:55:30' を datetime.time に変換する"""
+    parts = [int(part) for part in text.split(':')]
+    return datetime.time(*parts)
+
+
+def next_occurrence(at, now=None):
+    """
+    指定時刻（JST）が次に来る日時を返す（現在時刻を過ぎていれば翌日）
+
+    Args:
+        at: '14:30' 形式の文字列または datetime.time
+        now: 基準にする日時（省略時は現在時刻）
+    """
+    now = now or now_jst()
+    at = parse_time(at) if isinstance(at, str) else at
+    target = now.replace(hour=at.hour, minute=at.minute, second=at.second, microsecond=0)
+    if target <= now:
+        target += datetime.timedelta(days=1)
+    return target
+
+
+def wait_until(target, stop_event=None):
+    """
+    指定日時まで待機する（1分ごとの確認ではなく、時刻ちょうどに戻る）
+
+    長い待機は分割し、時計のずれ（スリープ復帰・NTP補正）を毎回計算し直す。
+
+    Args:
+        target: 待機する日時（タイムゾーン付き）、または '14:30' 形式の文字列（当日のJST時刻）
+        stop_event: セットされたら待機を中断する threading.Event
+
+    Returns:
+        bool: 指定日時に到達した場合True、中断された場合False
+    """
+    if isinstance(target, str):
+        at = parse_time(target)
+        target = now_jst().replace(hour=at.hour, minute=at.minute, second=at.second, microsecond=0)
+
+    while True:
+        remaining = (target - now_jst()).total_seconds()
+        if remaining <= 0:
+            return True
+        timeout = min(remaining, 60.0)
+        if stop_event is not None:
+            if stop_event.wait(timeout):
+                return False
+        else:
+            time.sleep(timeout)
+
+
+class Job:
+    """登録済みのジョブ（毎日指定時刻に、条件を満たす日だけ実行する）"""
+
+    def __init__(self, name, at, func, when=None):
+        self.name = name
+        self.at = parse_time(at)
+        self.func = func
+        self.when = when
+        self.next_run = None
+        self.last_result = None
+
+    def schedule(self, now=None):
+        """次の実行日時を計算する（実行しない日は飛ばす）"""
+        target = next_occurrence(self.at, now)
+        for _ in range(366):
+            if self.when is None or self.when(target.date()):
+                break
+            target += datetime.timedelta(days=1)
+        self.next_run = target
+        return target
+
+
+class Scheduler:
+    """
+    常駐して登録済みのジョブを指定時刻（JST）に実行するスケジューラー
+
+    プロセスを起動したままにするため、読み込み済みのモジュールや
+    接続プール・トークン・キャッシュを翌日以降も使い回せる。
+    ジョブは登録順に1つずつ実行し、実行中に過ぎた時刻のジョブは続けて実行する。
+    """
+
+    def __init__(self):
+        self.jobs = []
+        self.stop_event = threading.Event()
+
+    def register(self, name, at, func, when=None):
+        """
+        ジョブを登録する
+
+        Args:
+            name: ジョブ名（ログ表示用）
+            at: 実行時刻（JST、'14:30' 形式）
+            func: 実行する関数（引数なし）
+            when: 実行日を判定する関数（date → bool、省略時は毎日）
+        """
+        job = Job(name, at, func, when)
+        self.jobs.append(job)
+        return job
+
+    def stop(self, *args):
+        slog("INFO", "スケジューラーを停止します。")
+        self.stop_event.set()
+
+    def run_job(self, job):
+        started = time.monotonic()
+        slog("INFO", f"ジョブ開始: {job.name}（予定 {job.next_run:%Y-%m-%d %H:%M:%S}）")
+        try:
+            job.last_result = job.func()
+            slog("INFO", f"ジョブ終了: {job.name}（{time.monotonic() - started:.1f}秒）")
+        except Exception as e:
+            job.last_result = None
+            slog("ERROR", f"ジョブでエラーが発生: {job.name}: {e}")
+
+    def run_forever(self):
+        """停止されるまでジョブを実行し続ける（SIGINT / SIGTERMで停止）"""
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, self.stop)
+            signal.signal(signal.SIGTERM, self.stop)
+
+        now = now_jst()
+        for job in self.jobs:
+            job.schedule(now)
+            slog("INFO", f"ジョブ登録: {job.name} 次回 {job.next_run:%Y-%m-%d %H:%M:%S}")
+
+        while not self.stop_event.is_set() and self.jobs:
+            job = min(self.jobs, key=lambda j: j.next_run)
+            if not wait_until(job.next_run, self.stop_event):
+                break
+            self.run_job(job)
+            # 同じ時刻の実行を繰り返さないよう、予定時刻の直後を基準に次回を決める
+            job.schedule(max(now_jst(), job.next_run))
+            slog("INFO", f"次回: {job.name} {job.next_run:%Y-%m-%d %H:%M:%S}")
@@ -0,0 +1,305 @@
+import json
+import time
+import queue
+import select
+import threading
+import http.client
+import urllib.parse
+from resilience import retry_call, get_breaker, RateLimiter
+
+# 本番APIと検証用APIの接続先
+PRODUCTION_BASE_URL = 'http://localhost:18080'
+TEST_BASE_URL = 'http://localhost:18081'
+
+# 発注系API（秒間の実行回数に上限がある）
+ORDER_PATHS = ('/kabusapi/sendorder', '/kabusapi/cancelorder')
+# 発注系APIの秒間リクエスト上限（kabuステーションAPIの制限: 5件/秒）
+ORDER_RATE_LIMIT = 5.0
+# 実行回数エラー（429）が返された発注の最大試行回数
+ORDER_ATTEMPTS = 5
+# プールの接続を使い回す待機時間の上限（秒、サーバーのKeep-Aliveタイムアウトより短くする）
+KEEPALIVE_TIMEOUT = 5.0
+
+class ApiError(Exception):
+    """kabuステーションAPIが200以外を返した場合の例外"""
+
+    def __init__(self, status, reason, content):
+        super().__init__(f"{status} {reason}: {content}")
+        self.status = status
+        self.reason = reason
+        self.content = content
+
+def is_rate_limited(error):
+    """実行回数エラー（429）か（注文は受け付けられていないため再送してよい）"""
+    return isinstance(error, ApiError) and error.status == 429
+
+def is_transient_error(error):
+    """再試行で回復する見込みのある失敗か（通信エラー・5xx・429）"""
+    if isinstance(error, ApiError):
+        return error.status >= 500 or error.status == 429
+    return isinstance(error, (OSError, http.client.HTTPException))
+
+def is_outage_error(error):
+    """接続先の障害とみなす失敗か（429は接続先が応答しているためブレーカーの失敗に数えない）"""
+    return is_transient_error(error) and not is_rate_limited(error)
+
+class KabuApiClient:
+    """
+    kabuステーションAPIのクライアント
+
+    接続をプールしてKeep-Aliveで使い回し、認証ヘッダー（X-API-KEY）を
+    メモリ上に保持する。リクエスト・レスポンスはJSONで送受信する。
+    """
+
+    def __init__(self, base_url, pool_size=8, timeout=15, token_loader=None, attempts=3,
+                 order_rate_limit=ORDER_RATE_LIMIT, order_attempts=ORDER_ATTEMPTS, keepalive_timeout=KEEPALIVE_TIMEOUT):
+        """
+        Args:
+            base_url: 接続先（例: http://localhost:18081）
+            pool_size: プールに保持する接続数の上限
+            timeout: 1リクエストのタイムアウト（秒）
+            token_loader: トークンが未設定のときに呼び出してトークンを取得する関数
+            attempts: GETの最大試行回数（POSTは二重発注を避けるため再試行しない）
+            order_rate_limit: 発注系APIの秒間リクエスト上限（全スレッドで共有、0で無制限）
+            order_attempts: 発注系APIで429が返された場合の最大試行回数
+            keepalive_timeout: これより長く使われていない接続は使い回さずに閉じる（秒）
+        """
+        parsed = urllib.parse.urlparse(base_url)
+        self.base_url = base_url
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.timeout = timeout
+        self.attempts = attempts
+        self.order_attempts = order_attempts
+        self.order_limiter = RateLimiter(order_rate_limit)
+        self.keepalive_timeout = keepalive_timeout
+        self.token_loader = token_loader
+        # 401が返された場合に呼び出してトークンを再発行する関数（拒否されたトークンを受け取る）
+        self.on_unauthorized = None
+        self._token = None
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._token_lock = threading.Lock()
+
+    # -- 認証 --
+
+    def set_token(self, token):
+        """認証に使うトークンを設定する"""
+        with self._token_lock:
+            self._token = token
+
+    def get_token(self):
+        """認証に使うトークンを返す（未設定の場合はtoken_loaderから取得する）"""
+        if self._token is None and self.token_loader is not None:
+            # token_loaderは発行したトークンをset_token()で設定するため、ロックの外で呼び出す
+            token = self.token_loader()
+            with self._token_lock:
+                if self._token is None:
+                    self._token = token
+        return self._token
+
+    def _refresh_token(self, rejected_token):
+        """401が返されたトークンを再発行したトークンに差し替える"""
+        if self.on_unauthorized is None:
+            return None
+        token = self.on_unauthorized(rejected_token)
+        if token:
+            self.set_token(token)
+        return token
+
+    # -- 接続プール --
+
+    def _is_stale(self, conn, released_at):
+        """
+        プールの接続がサーバー側で閉じられている可能性があるか
+
+        Keep-Aliveタイムアウトに近いほど長く使われていない接続と、
+        サーバーから切断（またはデータ）が届いている接続は使い回さない。
+        """
+        if conn.sock is None or time.monotonic() - released_at > self.keepalive_timeout:
+            return True
+        try:
+            readable, _, _ = select.select([conn.sock], [], [], 0)
+        except (OSError, ValueError):
+            return True
+        return bool(readable)
+
+    def _acquire(self):
+        """プールから使い回せる接続を取り出す（ない場合は新規作成）"""
+        while True:
+            try:
+                conn, released_at = self._pool.get_nowait()
+            except queue.Empty:
+                return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout), False
+            if not self._is_stale(conn, released_at):
+                return conn, True
+            conn.close()
+
+    def _release(self, conn):
+        """接続をプールに戻す（上限を超える場合は閉じる）"""
+        try:
+            self._pool.put_nowait((conn, time.monotonic()))
+        except queue.Full:
+            conn.close()
+
+    def close(self):
+        """プール内の接続をすべて閉じる"""
+        while True:
+            try:
+                conn, _ = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+
+    # -- リクエスト --
+
+    def request(self, method, path, params=None, body=None, auth=True, retry_unauthorized=True):
+        """
+        APIにリクエストを送信し、JSONをデコードして返す
+
+        Args:
+            method: 'GET' / 'POST' / 'PUT'
+            path: パス（例: /kabusapi/orders）
+            params: クエリパラメータの辞書
+            body: リクエストボディ（JSONにエンコードする）
+            auth: Trueの場合はX-API-KEYヘッダーを付与する
+            retry_unauthorized: Trueの場合は401でトークンを再発行して1回だけ再送する
+
+        通信エラー・5xx・429の場合、GETは指数バックオフで再試行する。
+        発注系APIは秒間の上限を超えないよう送信間隔を空け、429の場合のみ再送する
+        （429は注文が受け付けられていないため二重発注にならない）。
+        エンドポイントごとのサーキットブレーカーが開いている間は送信せずに失敗する
+        （429はブレーカーの失敗に数えない）。
+
+        Returns:
+            デコードしたレスポンス（dictまたはlist）
+
+        Raises:
+            ApiError: ステータスが200以外の場合
+            OSError / http.client.HTTPException: 通信エラーの場合
+            CircuitOpenError: エンドポイントが停止中と判断されている場合
+        """
+        breaker = get_breaker(f"kabuステーションAPI {method} {path}")
+        limiter = self.order_limiter if path.startswith(ORDER_PATHS) else None
+        if method == 'GET':
+            attempts, retry_on = self.attempts, is_transient_error
+        elif limiter is not None:
+            attempts, retry_on = self.order_attempts, is_rate_limited
+        else:
+            attempts, retry_on = 1, is_transient_error
+        if params:
+            path = f"{path}?{urllib.parse.urlencode(params)}"
+
+        def send_once(token):
+            if limiter is not None:
+                limiter.acquire()
+            return self._send(method, path, body, token)
+
+        def send(token):
+            return retry_call(
+                send_once, token,
+                attempts=attempts,
+                retry_on=retry_on,
+                trips_breaker=is_outage_error,
+                breaker=breaker,
+            )
+
+        token = self.get_token() if auth else None
+        try:
+            return send(token)
+        except ApiError as e:
+            if not (auth and retry_unauthorized and e.status == 401):
+                raise
+            token = self._refresh_token(token)
+            if not token:
+                raise
+            return send(token)
+
+    def _send(self, method, path, body, token):
+        """1回分のリクエストをプールの接続で送信する"""
+        headers = {'Content-Type': 'application/json'}
+        if token is not None:
+            headers['X-API-KEY'] = token
+        payload = json.dumps(body).encode('utf-8') if body is not None else None
+
+        conn, reused = self._acquire()
+        try:
+            conn.request(method, path, body=payload, headers=headers)
+            res = conn.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            # 使い回した接続がサーバー側で閉じられていた場合のみ、GETは新しい接続で1回だけ再送する
+            # （POSTは二重発注を避けるため再送しない。閉じられていそうな接続は _acquire で使わない）
+            if not (reused and method == 'GET'):
+                raise
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            conn.request(method, path, body=payload, headers=headers)
+            res = conn.getresponse()
+        except Exception:
+            conn.close()
+            raise
+
+        try:
+            data = res.read()
+        except Exception:
+            conn.close()
+            raise
+
+        if res.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+
+        try:
+            content = json.loads(data) if data else None
+        except ValueError:
+            content = data.decode('utf-8', errors='replace')
+
+        if res.status != 200:
+            raise ApiError(res.status, res.reason, content)
+        return content
+
+    def get(self, path, params=None, auth=True):
+        return self.request('GET', path, params=params, auth=auth)
+
+    def post(self, path, body, auth=True):
+        return self.request('POST', path, body=body, auth=auth)
+
+    def put(self, path, body, auth=True):
+        return self.request('PUT', path, body=body, auth=auth)
+
+# 接続先ごとに1つだけ作成して使い回すクライアント
+_clients = {}
+_clients_lock = threading.Lock()
+
+def configure_base_urls(test_base_url=None, production_base_url=None):
+    """
+    接続先を差し替える（模擬サーバーでの計測用）
+    既存の共有クライアントは閉じて破棄する
+    """
+    global TEST_BASE_URL, PRODUCTION_BASE_URL
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+        if test_base_url:
+            TEST_BASE_URL = test_base_url
+        if production_base_url:
+            PRODUCTION_BASE_URL = production_base_url
+
+def get_client(use_test_api=True, token_loader=None):
+    """
+    接続先（本番 / 検証用）ごとの共有クライアントを返す
+
+    Args:
+        use_test_api: 検証用APIを使用するかどうか
+        token_loader: 初回作成時に設定するトークン取得関数
+    """
+    base_url = TEST_BASE_URL if use_test_api else PRODUCTION_BASE_URL
+    with _clients_lock:
+        client = _clients.get(base_url)
+        if client is None:
+            client = KabuApiClient(base_url, token_loader=token_loader)
+            _clients[base_url] = client
+        elif client.token_loader is None and token_loader is not None:
+            client.token_loader = token_loader
+        return client
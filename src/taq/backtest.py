@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+移動平均線クロス戦略のバックテスト
+
+日足キャッシュ（db/bars）の全銘柄を日付 × 銘柄の2次元配列に揃え、
+trader.analyze_stock_with_moving_averages と同じ売買ルールを一括で再現する。
+本番は寄付き前（main.STOCK_TRADE_TIME）に最新の足（前営業日）の1本前の足でクロスを
+判定する（df.iloc[-2]）ため、売買はクロス発生から2本後の足の始値になる（lag=2）。
+  - ゴールデンクロス → 2本後の足の始値で100株買い
+  - デッドクロス（保有中）→ 2本後の足の始値で100株売り
+手数料は portfolio.calculate_commission で計算する。
+資金の制約は考慮しない（現金が足りなくてもすべての買いシグナルで買う）ため、
+同時に多くの銘柄を保有する期間は本番より買いが多くなり、現金残高はマイナスになりうる。
+
+使い方:
+    python -m taq.backtest --start 2015-01-01 --short 5 --long 25
+"""
+
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from .bar_store import get_bars_dir, load_bars
+from .crossover import align_to_latest, sma_panel, detect_crosses, SHORT_WINDOW, LONG_WINDOW
+from .portfolio import calculate_commission
+
+# 売買単位
+LOT_SIZE = 100
+# 初期資金
+INITIAL_CAPITAL = 500000
+
+def list_cached_symbols():
+    """日足キャッシュがある銘柄コードのリストを返す"""
+    bars_dir = get_bars_dir()
+    if not os.path.exists(bars_dir):
+        return []
+    return sorted(f[:-len('.csv')] for f in os.listdir(bars_dir) if f.endswith('.csv'))
+
+def load_universe(symbols=None, start=None, end=None):
+    """
+    日足キャッシュから始値・終値を日付 × 銘柄の2次元配列に揃えて読み込む
+
+    Args:
+        symbols: 銘柄コードのリスト（省略時はキャッシュ済みの全銘柄）
+        start: 開始日（'YYYY-MM-DD'）
+        end: 終了日（'YYYY-MM-DD'）
+
+    Returns:
+        dict: {'dates': 日付の配列, 'codes': 銘柄コードのリスト,
+               'open': 始値の2次元配列, 'close': 終値の2次元配列}
+
+    Raises:
+        ValueError: 日足キャッシュが1銘柄もない場合
+    """
+    symbols = symbols if symbols is not None else list_cached_symbols()
+    opens = {}
+    closes = {}
+    for symbol in symbols:
+        df = load_bars(symbol)
+        if df is None:
+            continue
+        df = df.loc[start:end]
+        if df.empty:
+            continue
+        opens[symbol] = df['Open']
+        closes[symbol] = df['Close']
+
+    if not closes:
+        raise ValueError("バックテストに使える日足キャッシュがありません")
+    close_df = pd.concat(closes, axis=1).sort_index()
+    open_df = pd.concat(opens, axis=1).reindex(index=close_df.index, columns=close_df.columns)
+    return {
+        'dates': close_df.index.to_numpy(),
+        'codes': list(close_df.columns),
+        'open': open_df.to_numpy(dtype=float),
+        'close': close_df.to_numpy(dtype=float),
+    }
+
+def scatter_back(aligned_values, order, fill_value):
+    """align_to_latest で下詰めした配列を元の日付の行に戻す"""
+    result = np.full(aligned_values.shape, fill_value, dtype=aligned_values.dtype)
+    np.put_along_axis(result, order, aligned_values, axis=0)
+    return result
+
+def compute_positions(gc_flag, dc_flag, lag=2):
+    """
+    クロス発生からlag本後の足で売買した場合の保有状態を一括計算する（資金の制約は考慮しない）
+
+    Returns:
+        ndarray: 各足の終了時点で保有していればTrue
+    """
+    num_rows, num_cols = gc_flag.shape
+    # 直近のクロスの種類（+1: ゴールデンクロス, -1: デッドクロス, 0: なし）を前方に引き継ぐ
+    event = np.where(gc_flag, 1, np.where(dc_flag, -1, 0))
+    rows = np.where(event != 0, np.arange(num_rows)[:, None], -1)
+    last_rows = np.maximum.accumulate(rows, axis=0)
+    last_event = np.where(last_rows >= 0, np.take_along_axis(event, np.maximum(last_rows, 0), axis=0), 0)
+
+    holding = np.zeros((num_rows, num_cols), dtype=bool)
+    if num_rows > lag:
+        holding[lag:] = last_event[:-lag] == 1
+    return holding
+
+def apply_exit_rules(holding, exec_price, aligned_close, stop_loss=None, take_profit=None, max_holding_days=None):
+    """
+    損切り・利確・最大保有日数で保有状態を打ち切る（次のゴールデンクロスまで再エントリーしない）
+
+    終値で条件を満たした足の翌足の始値で売る。
+
+    Args:
+        holding: compute_positions の戻り値（書き換える）
+        exec_price: 約定価格の2次元配列
+        aligned_close: 終値の2次元配列
+        stop_loss: 損切りする下落率（例: 0.05）
+        take_profit: 利確する上昇率（例: 0.10）
+        max_holding_days: 最大保有日数
+
+    Returns:
+        ndarray: 打ち切り後の保有状態
+    """
+    if stop_loss is None and take_profit is None and max_holding_days is None:
+        return holding
+
+    num_rows = holding.shape[0]
+    prev_holding = np.zeros_like(holding)
+    prev_holding[1:] = holding[:-1]
+    for col in range(holding.shape[1]):
+        entries = np.flatnonzero(holding[:, col] & ~prev_holding[:, col])
+        exits = np.flatnonzero(~holding[:, col] & prev_holding[:, col])
+        for i, entry in enumerate(entries):
+            end = exits[i] if i < len(exits) else num_rows
+            with np.errstate(invalid='ignore'):
+                returns = aligned_close[entry:end, col] / exec_price[entry, col] - 1
+                hit = np.zeros(end - entry, dtype=bool)
+                if stop_loss is not None:
+                    hit |= returns <= -stop_loss
+                if take_profit is not None:
+                    hit |= returns >= take_profit
+            if max_holding_days is not None:
+                hit[max(max_holding_days - 1, 0):] = True
+            triggered = np.flatnonzero(hit)
+            if triggered.size:
+                holding[entry + triggered[0] + 1:end, col] = False
+    return holding
+
+def commission_of(amounts):
+    """約定金額の配列に対する手数料（portfolio.calculate_commission と同じ料金表）"""
+    amounts = np.asarray(amounts, dtype=float)
+    if amounts.size == 0:
+        return amounts
+    return np.vectorize(calculate_commission, otypes=[float])(amounts)
+
+def run_backtest(universe, short_window=SHORT_WINDOW, long_window=LONG_WINDOW, initial_capital=INITIAL_CAPITAL, lot_size=LOT_SIZE, lag=2,
+                 stop_loss=None, take_profit=None, max_holding_days=None):
+    """
+    移動平均線クロス戦略を全銘柄まとめてバックテストする
+
+    Args:
+        universe: load_universe の戻り値
+        short_window: 短期移動平均の期間
+        long_window: 長期移動平均の期間
+        initial_capital: 初期資金
+        lot_size: 1回の売買株数
+        lag: クロス発生から売買するまでの足の本数（2: 本番と同じ2本後の足の始値、1: 翌日の始値）
+        stop_loss: 損切りする下落率（省略時はデッドクロスのみで売却）
+        take_profit: 利確する上昇率
+        max_holding_days: 最大保有日数
+
+    Returns:
+        dict: {'equity': 資産推移のSeries, 'trades': 取引ごとのDataFrame, 'stats': 統計の辞書}
+    """
+    dates = universe['dates']
+    codes = universe['codes']
+
+    # 銘柄ごとの足に揃えて移動平均・クロスを計算（売買停止日は飛ばす）
+    aligned_close, order = align_to_latest(universe['close'])
+    aligned_open = np.take_along_axis(universe['open'], order, axis=0)
+    aligned_dates = dates[order]
+
+    ma_short = sma_panel(aligned_close, short_window)
+    ma_long = sma_panel(aligned_close, long_window)
+    gc_flag, dc_flag = detect_crosses(ma_short, ma_long)
+    # 長期移動平均が揃った最初の足はクロスとみなさない（本番は十分な本数の足で判定するため発生しない）
+    warmed_up = np.zeros_like(gc_flag)
+    warmed_up[1:] = ~np.isnan(ma_long[:-1])
+    gc_flag &= warmed_up
+    dc_flag &= warmed_up
+    holding = compute_positions(gc_flag, dc_flag, lag=lag)
+
+    # 始値がない足は終値で約定したものとする
+    exec_price = np.where(np.isnan(aligned_open), aligned_close, aligned_open)
+    holding = apply_exit_rules(holding, exec_price, aligned_close, stop_loss, take_profit, max_holding_days)
+
+    prev_holding = np.zeros_like(holding)
+    prev_holding[1:] = holding[:-1]
+    buys = holding & ~prev_holding
+    sells = ~holding & prev_holding
+
+    trade_amount = np.where(buys | sells, exec_price * lot_size, 0.0)
+    commissions = np.zeros_like(trade_amount)
+    traded = buys | sells
+    commissions[traded] = commission_of(trade_amount[traded])
+    cash_flow = np.where(sells, trade_amount, 0.0) - np.where(buys, trade_amount, 0.0) - commissions
+
+    # 日付の行に戻して全銘柄を合算
+    cash_by_date = scatter_back(cash_flow, order, 0.0).sum(axis=1)
+    shares_by_date = scatter_back(np.where(holding, lot_size, 0), order, 0)
+    close_ffill = pd.DataFrame(universe['close']).ffill().to_numpy()
+    market_value = np.nansum(shares_by_date * close_ffill, axis=1)
+    equity = pd.Series(initial_capital + np.cumsum(cash_by_date) + market_value, index=pd.DatetimeIndex(dates), name='equity')
+
+    trades = collect_trades(codes, buys, sells, exec_price, aligned_close, aligned_dates, commissions, lot_size)
+    return {'equity': equity, 'trades': trades, 'stats': summarize(equity, trades, initial_capital)}
+
+def collect_trades(codes, buys, sells, exec_price, aligned_close, aligned_dates, commissions, lot_size):
+    """売買の発生位置から取引（買い → 売り）の一覧を作成する（未決済の取引は最終値で評価）"""
+    records = []
+    last_row = buys.shape[0] - 1
+    for col, code in enumerate(codes):
+        entries = np.flatnonzero(buys[:, col])
+        exits = np.flatnonzero(sells[:, col])
+        for i, entry in enumerate(entries):
+            is_open = i >= len(exits)
+            exit_row = last_row if is_open else exits[i]
+            exit_price = aligned_close[exit_row, col] if is_open else exec_price[exit_row, col]
+            commission = commissions[entry, col] + (0.0 if is_open else commissions[exit_row, col])
+            pnl = (exit_price - exec_price[entry, col]) * lot_size - commission
+            records.append({
+                'symbol': code,
+                'entry_date': pd.Timestamp(aligned_dates[entry, col]),
+                'entry_price': exec_price[entry, col],
+                'exit_date': pd.Timestamp(aligned_dates[exit_row, col]),
+                'exit_price': exit_price,
+                'qty': lot_size,
+                'commission': commission,
+                'pnl': pnl,
+                'return': pnl / (exec_price[entry, col] * lot_size),
+                'holding_days': int(exit_row - entry),
+                'open': is_open,
+            })
+    return pd.DataFrame.from_records(records, columns=[
+        'symbol', 'entry_date', 'entry_price', 'exit_date', 'exit_price', 'qty',
+        'commission', 'pnl', 'return', 'holding_days', 'open',
+    ])
+
+def summarize(equity, trades, initial_capital):
+    """資産推移と取引一覧から統計を計算する"""
+    daily_returns = equity.pct_change().dropna()
+    drawdown = equity / equity.cummax() - 1
+    closed = trades[~trades['open']] if not trades.empty else trades
+    return {
+        'final_equity': float(equity.iloc[-1]) if not equity.empty else float(initial_capital),
+        'total_return': float(equity.iloc[-1] / initial_capital - 1) if not equity.empty else 0.0,
+        'max_drawdown': float(drawdown.min()) if not equity.empty else 0.0,
+        'sharpe': float(daily_returns.mean() / daily_returns.std() * np.sqrt(245)) if daily_returns.std() > 0 else 0.0,
+        'num_trades': int(len(trades)),
+        'win_rate': float((closed['pnl'] > 0).mean()) if not closed.empty else 0.0,
+        'avg_pnl': float(closed['pnl'].mean()) if not closed.empty else 0.0,
+        'total_commission': float(trades['commission'].sum()) if not trades.empty else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="移動平均線クロス戦略のバックテスト")
+    parser.add_argument('--start', default=None, help="開始日（YYYY-MM-DD）")
+    parser.add_argument('--end', default=None, help="終了日（YYYY-MM-DD）")
+    parser.add_argument('--short', type=int, default=SHORT_WINDOW, help="短期移動平均の期間")
+    parser.add_argument('--long', type=int, default=LONG_WINDOW, help="長期移動平均の期間")
+    parser.add_argument('--stop-loss', type=float, default=None, help="損切りする下落率（例: 0.05）")
+    parser.add_argument('--take-profit', type=float, default=None, help="利確する上昇率（例: 0.10）")
+    parser.add_argument('--max-holding-days', type=int, default=None, help="最大保有日数")
+    parser.add_argument('--capital', type=float, default=INITIAL_CAPITAL, help="初期資金")
+    parser.add_argument('--trades', default=None, help="取引一覧を書き出すCSVファイル")
+    args = parser.parse_args()
+
+    universe = load_universe(start=args.start, end=args.end)
+    result = run_backtest(universe, args.short, args.long, initial_capital=args.capital,
+                          stop_loss=args.stop_loss, take_profit=args.take_profit, max_holding_days=args.max_holding_days)
+
+    print(f"銘柄数: {len(universe['codes'])}  期間: {result['equity'].index[0].date()} 〜 {result['equity'].index[-1].date()}")
+    for key, value in result['stats'].items():
+        print(f"{key}: {value:,.4f}" if isinstance(value, float) else f"{key}: {value:,}")
+    if args.trades:
+        result['trades'].to_csv(args.trades, index=False)
+        print(f"取引一覧を出力しました: {args.trades}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+from logger import slog
+import os
+import io
+import datetime
+import pandas as pd
+import pandas_datareader.data as pdr
+from resilience import retry_call
+
+# 保存する列（stooqの列構成に合わせる）
+BAR_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+# stooq用のサーキットブレーカー名
+STOOQ_BREAKER = 'stooq'
+
+def get_bars_dir():
+    """日足キャッシュの保存先ディレクトリ（db/bars）を返す"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(os.path.dirname(script_dir))
+    return os.path.join(project_root, 'db', 'bars')
+
+def get_bar_file(symbol):
+    """銘柄ごとのキャッシュファイルパス（db/bars/{銘柄コード}.csv）を返す"""
+    return os.path.join(get_bars_dir(), f'{symbol}.csv')
+
+def _read_tail_lines(file_path, num_lines, chunk_size=8192):
+    """
+    ファイル末尾から指定行数だけを読み込む（ファイル全体は読まない）
+
+    Returns:
+        list: 末尾の行（bytes）のリスト
+    """
+    with open(file_path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        buffer = b''
+        # 改行数が必要行数を超えるまで後ろからチャンク単位で読む
+        while position > 0 and buffer.count(b'\n') <= num_lines:
+            read_size = min(chunk_size, position)
+            position -= read_size
+            f.seek(position)
+            buffer = f.read(read_size) + buffer
+    lines = buffer.splitlines()
+    if position > 0:
+        # 先頭の行は途中から読んでいる可能性があるため捨てる
+        lines = lines[1:]
+    return lines[-num_lines:]
+
+def _parse_bars(csv_text):
+    """CSVテキストを日付昇順のDataFrameに変換する"""
+    df = pd.read_csv(io.StringIO(csv_text), index_col='Date', parse_dates=True)
+    return df[BAR_COLUMNS].sort_index()
+
+def load_bars(symbol, lookback=None):
+    """
+    キャッシュ済みの日足を読み込む
+
+    Args:
+        symbol: 銘柄コード（文字列）
+        lookback: 末尾から読み込む本数（Noneの場合は全期間）
+
+    Returns:
+        DataFrame: 日付昇順の日足、キャッシュがない場合はNone
+    """
+    bar_file = get_bar_file(symbol)
+    if not os.path.exists(bar_file):
+        return None
+
+    if lookback is None:
+        with open(bar_file, 'r', encoding='utf-8') as f:
+            csv_text = f.read()
+    else:
+        with open(bar_file, 'r', encoding='utf-8') as f:
+            header = f.readline().rstrip('\n')
+        tail_lines = _read_tail_lines(bar_file, lookback)
+        # ヘッダー行しかない場合に重複させない
+        body = [line.decode('utf-8') for line in tail_lines if line.decode('utf-8') != header]
+        csv_text = '\n'.join([header] + body) + '\n'
+
+    df = _parse_bars(csv_text)
+    if df.empty:
+        return None
+    return df
+
+def load_last_date(symbol):
+    """キャッシュの最終日付を返す（キャッシュがない場合はNone）"""
+    df = load_bars(symbol, lookback=1)
+    if df is None:
+        return None
+    return df.index[-1].date()
+
+def save_bars(symbol, df):
+    """日足を全件書き込む（一時ファイル経由で置き換える）"""
+    os.makedirs(get_bars_dir(), exist_ok=True)
+    bar_file = get_bar_file(symbol)
+    tmp_file = f'{bar_file}.tmp'
+    df[BAR_COLUMNS].sort_index().to_csv(tmp_file, index_label='Date')
+    os.replace(tmp_file, bar_file)
+
+def append_bars(symbol, df):
+    """最終日付より新しい日足だけをキャッシュ末尾に追記する"""
+    bar_file = get_bar_file(symbol)
+    last_date = load_last_date(symbol)
+    if last_date is None:
+        save_bars(symbol, df)
+        return len(df)
+
+    new_df = df[df.index.date > last_date].sort_index()
+    if new_df.empty:
+        return 0
+
+    with open(bar_file, 'a', encoding='utf-8') as f:
+        new_df[BAR_COLUMNS].to_csv(f, header=False)
+    return len(new_df)
+
+def fetch_bars(symbol, start=None, end=None):
+    """
+    stooqから日足を取得する（startを指定した場合はその日以降のみ）
+    通信エラーは指数バックオフで再試行し、stooqが停止中と判断した場合は即座に失敗する
+    """
+    df = retry_call(
+        pdr.DataReader, "{}.JP".format(symbol), "stooq", start=start, end=end,
+        retry_on=OSError,
+        breaker=STOOQ_BREAKER,
+        name=f"stooqからの日足取得（{symbol}）",
+    )
+    return df.sort_index()
+
+def update_bars(symbol):
+    """
+    キャッシュの最終日付より後の日足だけをstooqから取得して追記する
+
+    Returns:
+        int: 追記した本数
+    """
+    last_date = load_last_date(symbol)
+    today = datetime.date.today()
+
+    if last_date is None:
+        df = fetch_bars(symbol)
+        if df.empty:
+            slog("WARNING", f"日足データが取得できません: {symbol}")
+            return 0
+        save_bars(symbol, df)
+        slog("INFO", f"日足キャッシュを新規作成: {symbol} {len(df)}本")
+        return len(df)
+
+    start = last_date + datetime.timedelta(days=1)
+    if start > today:
+        return 0
+
+    df = fetch_bars(symbol, start=start, end=today)
+    if df.empty:
+        return 0
+    appended = append_bars(symbol, df)
+    if appended:
+        slog("INFO", f"日足キャッシュに追記: {symbol} {appended}本")
+    return appended
+
+def get_bars(symbol, lookback=None, refresh=True):
+    """
+    日足キャッシュを最新化してから読み込む
+
+    Args:
+        symbol: 銘柄コード（文字列）
+        lookback: 末尾から読み込む本数（Noneの場合は全期間）
+        refresh: Trueの場合は読み込み前に差分を取得する
+
+    Returns:
+        DataFrame: 日付昇順の日足
+    """
+    if refresh:
+        try:
+            update_bars(symbol)
+        except Exception as e:
+            # 取得に失敗してもキャッシュがあればそれを使う
+            slog("WARNING", f"日足の差分取得に失敗: {symbol} - {e}")
+
+    df = load_bars(symbol, lookback=lookback)
+    if df is None:
+        raise ValueError(f"日足データがありません: {symbol}")
+    return df
@@ -1,26 +1,43 @@
 from logger import slog
 from .portfolio import get_stock_price_from_liquidity_data
-import json
-import os
-import urllib.request
-import urllib.error
+from .api_client import get_client, ApiError
+from .token_store import get_token_manager
+from .execution_tracker import ExecutionTracker, ORDER_STATE_DONE
+from .paper_broker import PaperBroker
 import datetime
 import hashlib
-import time
+import threading
 
-def get_api_token():
-    """tokenディレクトリからAPIトークンを取得"""
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    token_dir = os.path.join(script_dir, 'token')
-    
-    if not os.path.exists(token_dir):
-        raise FileNotFoundError("tokenディレクトリが存在しません")
-    
-    token_files = [f for f in os.listdir(token_dir) if os.path.isfile(os.path.join(token_dir, f))]
-    if not token_files:
-        raise FileNotFoundError("トークンファイルが見つかりません")
-    
-    return token_files[0]  # 最初のファイル名をトークンとして返す
+# 接続先ごとの共有ExecutionTracker
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+# 模擬約定エンジン（Noneの場合はkabuステーションAPIに発注する）
+_paper_broker = None
+
+def use_paper_broker(enabled=True, **config):
+    """
+    発注先を模擬約定エンジン（PaperBroker）に切り替える
+
+    Args:
+        enabled: Falseの場合はkabuステーションAPIに戻す
+        config: PaperBrokerの設定（スリッページ、出来高上限割合など）
+
+    Returns:
+        PaperBroker: 有効にした模擬約定エンジン（無効にした場合はNone）
+    """
+    global _paper_broker
+    _paper_broker = PaperBroker(**config) if enabled else None
+    return _paper_broker
+
+def get_api_token(use_test_api=True):
+    """メモリ上のAPIトークンを取得（未取得の場合は保存済みファイルから読み込む）"""
+    return get_token_manager(use_test_api).get()
+
+def get_api_client(use_test_api=True):
+    """接続先ごとの共有APIクライアントを返す（トークンはTokenManagerが管理する）"""
+    get_token_manager(use_test_api)
+    return get_client(use_test_api)
 
 
 def buy_stock_cash(symbol, qty=100, price=0, use_test_api=True):
@@ -36,10 +53,9 @@ def buy_stock_cash(symbol, qty=100, price=0, use_test_api=True):
     Returns:
         dict: 注文結果のレスポンス、エラーの場合はNone
     """
-    # 検証用APIと本番APIのURL
-    base_url = 'http://localhost:18081' if use_test_api else 'http://localhost:18080'
-    url = f'{base_url}/kabusapi/sendorder'
-    
+    if _paper_broker is not None:
+        return _paper_broker.send_order(symbol, 'buy', qty, price)
+
     # 注文オブジェクトを作成
     order_obj = {
         'Symbol': symbol,
@@ -60,29 +76,14 @@ def buy_stock_cash(symbol, qty=100, price=0, use_test_api=True):
     if price == 0:
         order_obj['Price'] = 0
     
-    json_data = json.dumps(order_obj).encode('utf-8')
-    
     try:
-        req = urllib.request.Request(url, json_data, method='POST')
-        req.add_header('Content-Type', 'application/json')
-        req.add_header('X-API-KEY', get_api_token())
-        
-        with urllib.request.urlopen(req) as res:
-            if res.status == 200:
-                content = json.loads(res.read())
-                slog("INFO", f"注文送信成功: {symbol} {qty}株 {'成行' if price == 0 else f'{price}円'}")
-                slog("INFO", f"注文結果: {content}")
-                return content
-            else:
-                slog("ERROR", f"注文送信失敗: Status {res.status}")
-                return None
-                
-    except urllib.error.HTTPError as e:
-        try:
-            error_content = json.loads(e.read())
-            slog("ERROR", f"注文エラー: {symbol} - {error_content}")
-        except:
-            slog("ERROR", f"注文エラー: {symbol} - {e}")
+        content = get_api_client(use_test_api).post('/kabusapi/sendorder', order_obj)
+        slog("INFO", f"注文送信成功: {symbol} {qty}株 {'成行' if price == 0 else f'{price}円'}")
+        slog("INFO", f"注文結果: {content}")
+        return content
+
+    except ApiError as e:
+        slog("ERROR", f"注文エラー: {symbol} - {e.content}")
         return None
     except Exception as e:
         slog("ERROR", f"注文送信でエラーが発生: {symbol} - {e}")
@@ -101,10 +102,9 @@ def sell_stock_cash(symbol, qty=100, price=0, use_test_api=True):
     Returns:
         dict: 注文結果のレスポンス、エラーの場合はNone
     """
-    # 検証用APIと本番APIのURL
-    base_url = 'http://localhost:18081' if use_test_api else 'http://localhost:18080'
-    url = f'{base_url}/kabusapi/sendorder'
-    
+    if _paper_broker is not None:
+        return _paper_broker.send_order(symbol, 'sell', qty, price)
+
     # 注文オブジェクトを作成
     order_obj = {
         'Symbol': symbol,
@@ -125,34 +125,37 @@ def sell_stock_cash(symbol, qty=100, price=0, use_test_api=True):
     if price == 0:
         order_obj['Price'] = 0
     
-    json_data = json.dumps(order_obj).encode('utf-8')
-    
     try:
-        req = urllib.request.Request(url, json_data, method='POST')
-        req.add_header('Content-Type', 'application/json')
-        req.add_header('X-API-KEY', get_api_token())
-        
-        with urllib.request.urlopen(req) as res:
-            if res.status == 200:
-                content = json.loads(res.read())
-                slog("INFO", f"売り注文送信成功: {symbol} {qty}株 {'成行' if price == 0 else f'{price}円'}")
-                slog("INFO", f"注文結果: {content}")
-                return content
-            else:
-                slog("ERROR", f"売り注文送信失敗: Status {res.status}")
-                return None
-                
-    except urllib.error.HTTPError as e:
-        try:
-            error_content = json.loads(e.read())
-            slog("ERROR", f"売り注文エラー: {symbol} - {error_content}")
-        except:
-            slog("ERROR", f"売り注文エラー: {symbol} - {e}")
+        content = get_api_client(use_test_api).post('/kabusapi/sendorder', order_obj)
+        slog("INFO", f"売り注文送信成功: {symbol} {qty}株 {'成行' if price == 0 else f'{price}円'}")
+        slog("INFO", f"注文結果: {content}")
+        return content
+
+    except ApiError as e:
+        slog("ERROR", f"売り注文エラー: {symbol} - {e.content}")
         return None
     except Exception as e:
         slog("ERROR", f"売り注文送信でエラーが発生: {symbol} - {e}")
         return None
 
+def cancel_order(order_id, use_test_api=True):
+    """
+    注文の残りを取り消す
+
+    Args:
+        order_id: 注文ID
+        use_test_api: 検証用APIを使用するかどうか
+
+    Returns:
+        dict: 取消結果のレスポンス
+
+    Raises:
+        ApiError: 取消が受け付けられなかった場合
+    """
+    content = get_api_client(use_test_api).put('/kabusapi/cancelorder', {'OrderId': order_id})
+    slog("INFO", f"注文取消送信: 注文ID={order_id} {content}")
+    return content
+
 def get_order_status(order_id=None, symbol=None, use_test_api=True):
     """
     注文状況を取得
@@ -165,10 +168,6 @@ def get_order_status(order_id=None, symbol=None, use_test_api=True):
     Returns:
         list: 注文情報のリスト、エラーの場合はNone
     """
-    # 検証用APIと本番APIのURL
-    base_url = 'http://localhost:18081' if use_test_api else 'http://localhost:18080'
-    url = f'{base_url}/kabusapi/orders'
-    
     # パラメータ設定
     params = {'product': 0}  # 0:すべて、1:現物、2:信用、3:先物、4:OP
     
@@ -178,98 +177,57 @@ def get_order_status(order_id=None, symbol=None, use_test_api=True):
         params['symbol'] = symbol
     
     try:
-        # URLにパラメータを追加
-        import urllib.parse
-        url_with_params = f"{url}?{urllib.parse.urlencode(params)}"
-        
-        req = urllib.request.Request(url_with_params, method='GET')
-        req.add_header('Content-Type', 'application/json')
-        req.add_header('X-API-KEY', get_api_token())
-        
-        with urllib.request.urlopen(req) as res:
-            if res.status == 200:
-                content = json.loads(res.read())
-                slog("INFO", f"注文状況取得成功: {len(content) if isinstance(content, list) else 1}件")
-                return content
-            else:
-                slog("ERROR", f"注文状況取得失敗: Status {res.status}")
-                return None
-                
-    except urllib.error.HTTPError as e:
-        try:
-            error_content = json.loads(e.read())
-            slog("ERROR", f"注文状況取得エラー: {error_content}")
-        except:
-            slog("ERROR", f"注文状況取得エラー: {e}")
-        return None
-    except Exception as e:
-        slog("ERROR", f"注文状況取得でエラーが発生: {e}")
-        return None
-
+        content = get_api_client(use_test_api).get('/kabusapi/orders', params=params)
+        slog("DEBUG", f"注文状況取得成功: {len(content) if isinstance(content, list) else 1}件")
+        return content
 
-def get_execution_price_from_order(order_id, use_test_api=True):
-    """
-    注文IDから約定価格を取得
-    
-    Args:
-        order_id: 注文ID
-        use_test_api: 検証用APIを使用するかどうか
-    
-    Returns:
-        float: 約定価格、約定していない場合やエラーの場合はNone
-    """
-    orders = get_order_status(order_id=order_id, use_test_api=use_test_api)
-    
-    if not orders:
+    except ApiError as e:
+        slog("ERROR", f"注文状況取得エラー: {e.content}")
         return None
-    
-    # 注文情報から約定価格を取得
-    if isinstance(orders, list) and len(orders) > 0:
-        order = orders[0]
-    else:
-        order = orders
-    
-    try:
-        # State=5（終了）かつ全約定の場合のみ約定価格を返す
-        if order.get('State') == 5:  # 終了状態
-            execution_qty = order.get('CumQty', 0)  # 約定数量
-            if execution_qty > 0:
-                execution_price = order.get('Price', 0)  # 約定価格
-                if execution_price > 0:
-                    slog("INFO", f"約定価格取得: {order_id} → {execution_price}円 ({execution_qty}株)")
-                    return execution_price
-        
-        slog("INFO", f"未約定または約定価格なし: {order_id}")
-        return None
-        
     except Exception as e:
-        slog("ERROR", f"約定価格取得でエラー: {order_id} - {e}")
+        slog("ERROR", f"注文状況取得でエラーが発生: {e}")
         return None
 
+def get_execution_tracker(use_test_api=True):
+    """接続先ごとの共有ExecutionTrackerを返す（全注文の状況を1回のリクエストでまとめて監視する）"""
+    key = 'test' if use_test_api else 'production'
+    with _trackers_lock:
+        tracker = _trackers.get(key)
+        if tracker is None:
+            tracker = ExecutionTracker(
+                lambda: get_order_status(use_test_api=use_test_api),
+                cancel_order=lambda order_id: cancel_order(order_id, use_test_api=use_test_api),
+            )
+            _trackers[key] = tracker
+        return tracker
 
-
-def wait_for_execution_and_get_price(order_result, symbol, max_wait_seconds=30, use_test_api=True):
+def wait_for_execution(order_result, symbol, qty=None, max_wait_seconds=30, use_test_api=True):
     """
-    注文の約定を待機し、約定価格を取得
+    注文の約定を待機し、約定結果を取得
     
     Args:
         order_result: 注文送信結果（注文IDを含む）
         symbol: 銘柄コード
+        qty: 注文数量（検証用APIの仮約定に使用）
         max_wait_seconds: 最大待機時間（秒）
         use_test_api: 検証用APIを使用するかどうか
     
     Returns:
-        float: 約定価格、約定しなかった場合やエラーの場合はNone
+        dict: {'order_id', 'symbol', 'status', 'cum_qty', 'price', 'state'}
+            status: 'filled' / 'partial' / 'cancelled' / 'timeout'、エラーの場合はNone
     """
     if not order_result:
         return None
     
+    # 模擬約定エンジンの場合はその約定結果を返す
+    if _paper_broker is not None:
+        return _paper_broker.wait(order_result, symbol, timeout=max_wait_seconds)
+    
     # 検証用APIの場合は仮のIDとテスト価格を使用
     if use_test_api:
         order_id = order_result.get('OrderId')
         if not order_id:
             # 検証用APIでは注文IDが返らないため、仮のIDを生成
-            import datetime
             timestamp = datetime.datetime.now().strftime('%Y%m%dA02N%H%M%S%f')[:-2]  # マイクロ秒の下2桁を削除
             order_id = timestamp
             slog("INFO", f"検証用API: 仮の注文ID={order_id}を生成 {symbol}")
@@ -279,36 +237,54 @@ def wait_for_execution_and_get_price(order_result, symbol, max_wait_seconds=30,
 
         if test_price is None:
             # liquidity_data.txtに見つからない場合はハッシュベースの価格を生成
-            import hashlib
             hash_val = int(hashlib.md5(symbol.encode()).hexdigest()[:8], 16)
             test_price = 500 + (hash_val % 1500)  # 500-2000円の範囲でテスト価格を生成
             slog("INFO", f"検証用API: ハッシュベース価格を使用 {symbol} = {test_price}円")
         
         slog("INFO", f"検証用API: テスト約定価格={test_price}円 {symbol} (注文ID={order_id})")
-        return float(test_price)
-    
-    # 本番API用の処理
-    order_id = order_result.get('Result')
+        return {
+            'order_id': order_id,
+            'symbol': symbol,
+            'status': 'filled',
+            'cum_qty': qty,
+            'price': float(test_price),
+            'state': ORDER_STATE_DONE,
+        }
+    
+    # 本番API用の処理（Resultは結果コード、注文IDはOrderId）
+    order_id = order_result.get('OrderId')
     if not order_id:
         slog("ERROR", f"注文結果に注文IDがありません: {symbol}")
         return None
     
-    import time
-    
     slog("INFO", f"約定待機開始: {symbol} 注文ID={order_id}")
     
-    for i in range(max_wait_seconds):
-        execution_price = get_execution_price_from_order(order_id, use_test_api)
-        
-        if execution_price is not None:
-            slog("INFO", f"約定確認: {symbol} 約定価格={execution_price}円")
-            return execution_price
-        
-        if i < max_wait_seconds - 1:  # 最後の試行でない場合のみ待機
-            time.sleep(1)
+    execution = get_execution_tracker(use_test_api).track(order_id, symbol, timeout=max_wait_seconds).result()
     
-    slog("WARNING", f"約定待機タイムアウト: {symbol} 注文ID={order_id}")
-    return None
-
-
+    if execution['status'] == 'filled':
+        slog("INFO", f"約定確認: {symbol} 約定価格={execution['price']}円 ({execution['cum_qty']}株)")
+    elif execution['status'] == 'partial':
+        slog("WARNING", f"一部約定: {symbol} 注文ID={order_id} {execution['cum_qty']}株 約定価格={execution['price']}円")
+    elif execution['status'] == 'cancelled':
+        slog("WARNING", f"約定なしで注文終了: {symbol} 注文ID={order_id}")
+    else:
+        slog("WARNING", f"約定待機タイムアウト: {symbol} 注文ID={order_id}")
+    return execution
 
+def wait_for_execution_and_get_price(order_result, symbol, max_wait_seconds=30, use_test_api=True):
+    """
+    注文の約定を待機し、約定価格を取得
+    
+    Args:
+        order_result: 注文送信結果（注文IDを含む）
+        symbol: 銘柄コード
+        max_wait_seconds: 最大待機時間（秒）
+        use_test_api: 検証用APIを使用するかどうか
+    
+    Returns:
+        float: 約定価格、全約定しなかった場合やエラーの場合はNone
+    """
+    execution = wait_for_execution(order_result, symbol, max_wait_seconds=max_wait_seconds, use_test_api=use_test_api)
+    if execution is None or execution['status'] != 'filled':
+        return None
+    return execution['price']
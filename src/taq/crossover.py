@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+
+# trader.analyze_stock_with_moving_averages と同じ移動平均線の期間
+SHORT_WINDOW = 5
+LONG_WINDOW = 25
+
+def build_close_panel(frames):
+    """
+    複数銘柄の終値を日付 × 銘柄の2次元配列に揃える
+
+    Args:
+        frames: {銘柄コード: 日足DataFrame} の辞書
+
+    Returns:
+        tuple: (dates, codes, closes)
+            dates: 日付の1次元配列（昇順）
+            codes: 銘柄コードのリスト（closesの列順）
+            closes: 終値の2次元配列（値がない日はNaN）
+    """
+    close_df = pd.concat({code: df['Close'] for code, df in frames.items()}, axis=1).sort_index()
+    return close_df.index.to_numpy(), list(close_df.columns), close_df.to_numpy(dtype=float)
+
+def align_to_latest(values):
+    """
+    各列の有効値を下詰めにする（欠損日を詰めて、最新の足を最終行に揃える）
+
+    銘柄ごとの日足に対してTA-Libで計算する場合と同じく、
+    売買停止などで欠けた日を飛ばして移動平均を計算するために使う。
+
+    Returns:
+        tuple: (aligned, order)
+            aligned: 下詰めした2次元配列
+            order: 元の行番号（datesを同じ順に並べ替えるのに使う）
+    """
+    # 欠損（False）を上に、有効値（True）を元の順序のまま下に並べる
+    order = np.argsort(~np.isnan(values), axis=0, kind='stable')
+    return np.take_along_axis(values, order, axis=0), order
+
+def sma_panel(values, window):
+    """
+    全銘柄の単純移動平均を累積和で一括計算する
+
+    Args:
+        values: 終値の2次元配列（日付 × 銘柄）
+        window: 移動平均の期間
+
+    Returns:
+        ndarray: valuesと同じ形の配列（期間分の値が揃わない位置はNaN）
+    """
+    num_rows, num_cols = values.shape
+    result = np.full((num_rows, num_cols), np.nan)
+    if num_rows < window:
+        return result
+
+    valid = ~np.isnan(values)
+    zeros = np.zeros((1, num_cols))
+    sums = np.concatenate([zeros, np.cumsum(np.where(valid, values, 0.0), axis=0)])
+    counts = np.concatenate([zeros, np.cumsum(valid, axis=0)])
+
+    window_sums = sums[window:] - sums[:-window]
+    window_counts = counts[window:] - counts[:-window]
+    result[window - 1:] = np.where(window_counts == window, window_sums / window, np.nan)
+    return result
+
+def detect_crosses(ma_short, ma_long):
+    """
+    ゴールデンクロス・デッドクロスの発生位置を一括判定する
+    判定条件は trader.analyze_stock_with_moving_averages と同じ
+
+    Returns:
+        tuple: (gc_flag, dc_flag) ブール値の2次元配列
+    """
+    # 短期 > 長期ならTrue（NaNとの比較はFalse）
+    with np.errstate(invalid='ignore'):
+        cross = ma_short > ma_long
+    prev_cross = np.zeros_like(cross)
+    prev_cross[1:] = cross[:-1]
+
+    # ゴールデンクロス：FalseからTrue、デッドクロス：TrueからFalse
+    gc_flag = cross & ~prev_cross & ~np.isnan(ma_short)
+    dc_flag = ~cross & prev_cross & ~np.isnan(ma_long)
+    return gc_flag, dc_flag
+
+def latest_event_rows(flags):
+    """各列で最後にTrueとなった行番号を返す（一度もない列は-1）"""
+    num_rows = flags.shape[0]
+    last_from_end = np.argmax(flags[::-1], axis=0)
+    return np.where(flags.any(axis=0), num_rows - 1 - last_from_end, -1)
+
+def analyze_crossover_panel(frames, names=None, short_window=SHORT_WINDOW, long_window=LONG_WINDOW):
+    """
+    全銘柄の移動平均線・クロスを1回の配列演算で計算し、売買リストを作成する
+
+    Args:
+        frames: {銘柄コード: 日足DataFrame} の辞書
+        names: {銘柄コード: 銘柄名} の辞書（省略時は銘柄コードを使用）
+        short_window: 短期移動平均の期間
+        long_window: 長期移動平均の期間
+
+    Returns:
+        dict: {
+            'buy_list': [(銘柄コード, 銘柄名), ...] 前日にゴールデンクロスが発生した銘柄,
+            'sell_list': [(銘柄コード, 銘柄名), ...] 前日にデッドクロスが発生した銘柄,
+            'latest_gc': {銘柄コード: (日付, 5日線の値)},
+            'latest_dc': {銘柄コード: (日付, 25日線の値)},
+        }
+    """
+    names = names or {}
+    result = {'buy_list': [], 'sell_list': [], 'latest_gc': {}, 'latest_dc': {}}
+    if not frames:
+        return result
+
+    dates, codes, closes = build_close_panel(frames)
+    aligned, order = align_to_latest(closes)
+    aligned_dates = dates[order]
+
+    ma_short = sma_panel(aligned, short_window)
+    ma_long = sma_panel(aligned, long_window)
+    gc_flag, dc_flag = detect_crosses(ma_short, ma_long)
+
+    # 前日（最新から2番目の足）の判定
+    if aligned.shape[0] >= 2:
+        for col in np.flatnonzero(gc_flag[-2]):
+            result['buy_list'].append((codes[col], names.get(codes[col], codes[col])))
+        for col in np.flatnonzero(dc_flag[-2]):
+            result['sell_list'].append((codes[col], names.get(codes[col], codes[col])))
+
+    # 最新のクロス発生日と値
+    for col, row in enumerate(latest_event_rows(gc_flag)):
+        if row >= 0:
+            result['latest_gc'][codes[col]] = (pd.Timestamp(aligned_dates[row, col]), ma_short[row, col])
+    for col, row in enumerate(latest_event_rows(dc_flag)):
+        if row >= 0:
+            result['latest_dc'][codes[col]] = (pd.Timestamp(aligned_dates[row, col]), ma_long[row, col])
+
+    return result
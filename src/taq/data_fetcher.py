@@ -1,121 +1,232 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+import os
+import json
 import time
+import asyncio
+import threading
 from logger import slog
+from resilience import retry_async
+from .ranking_parser import parse_ranking_page, response_encoding
+
+RANKING_URL = "https://finance.yahoo.co.jp/stocks/ranking/tradingValueHigh"
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# 市場区分とランキングページのmarketパラメータ
+MARKETS = {
+    'prime': 'tokyo1',      # 東証プライム
+    'standard': 'tokyo2',   # 東証スタンダード
+    'growth': 'tokyoM',     # 東証グロース
+}
+MARKET_NAMES = {'prime': '東証プライム', 'standard': '東証スタンダード', 'growth': '東証グロース'}
+
+# 1市場あたりに取得するページ数（1ページ50銘柄）
+RANKING_PAGES = 2
+# 同時に取得するページ数
+FETCH_CONCURRENCY = 6
+# ランキングページ用のサーキットブレーカー名
+RANKING_BREAKER = 'Yahoo!ファイナンス'
+
+
+# -------
+# 複数市場・複数ページの一括取得
+
+def get_ranking_cache_file():
+    """条件付きリクエスト用のキャッシュ（db/ranking_cache.json）のパスを返す"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(os.path.dirname(script_dir))
+    return os.path.join(project_root, 'db', 'ranking_cache.json')
+
+class RankingFetcher:
+    """
+    ランキングページを1つのセッション（接続プール）で取得する
 
-
-def fetch_yahoo_finance_data(retries: int = 3) -> list:
+    ページごとにETag / Last-Modifiedと解析済みの行データを保持し、
+    2回目以降は条件付きリクエストを送って304なら保持している行データを使う。
     """
-    東証グロースの出来高上位銘柄データをスクレイピングする
 
-    Args:
-        retries: リトライ回数
+    def __init__(self, pool_size=FETCH_CONCURRENCY, timeout=15, cache_file=None):
+        self.timeout = timeout
+        self.cache_file = cache_file or get_ranking_cache_file()
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._cache = self._load_cache()
+        self._lock = threading.Lock()
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            slog("WARNING", f"ランキングキャッシュの読み込みに失敗: {e}")
+            return {}
 
-    Returns:
-        list: 銘柄データのリスト（順位、銘柄コード、銘柄名、現在値、前日比、出来高など）
+    def save_cache(self):
+        """キャッシュを一時ファイル経由で保存する"""
+        with self._lock:
+            cache = dict(self._cache)
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp_file = f'{self.cache_file}.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(cache, f, ensure_ascii=False)
+            os.replace(tmp_file, self.cache_file)
+        except Exception as e:
+            slog("WARNING", f"ランキングキャッシュの保存に失敗: {e}")
+
+    def fetch_page(self, market, page):
+        """
+        1ページ分の行データを取得する（ブロッキング）
+
+        Returns:
+            tuple: (行データのリスト, 304で変更がなかったかどうか)
+
+        Raises:
+            requests.exceptions.RequestException: 通信エラーの場合
+        """
+        url = f"{RANKING_URL}?market={MARKETS[market]}&term=daily&page={page}"
+        with self._lock:
+            cached = self._cache.get(url)
+
+        headers = {}
+        if cached:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and cached:
+            return cached['rows'], True
+        response.raise_for_status()
+
+        rows = parse_ranking_page(response.content, encoding=response_encoding(response))
+        if rows and (response.headers.get('ETag') or response.headers.get('Last-Modified')):
+            with self._lock:
+                self._cache[url] = {
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'rows': rows,
+                }
+        return rows, False
+
+    async def fetch_page_async(self, market, page, semaphore, retries=3):
+        """
+        1ページ分の行データを取得する（失敗時は指数バックオフで再試行）
+
+        Returns:
+            list: 行データのリスト（取得できなかった場合は空のリスト）
+        """
+        async def fetch():
+            async with semaphore:
+                return await asyncio.to_thread(self.fetch_page, market, page)
+
+        try:
+            rows, not_modified = await retry_async(
+                fetch,
+                attempts=retries,
+                retry_on=requests.exceptions.RequestException,
+                breaker=RANKING_BREAKER,
+                name=f"{MARKET_NAMES[market]} {page}ページ目の取得",
+            )
+        except Exception as e:
+            slog("WARNING", f"{MARKET_NAMES[market]} {page}ページ目の取得に失敗: {e}")
+            return []
+
+        status = "変更なし" if not_modified else "取得"
+        slog("INFO", f"{MARKET_NAMES[market]} {page}ページ目: {len(rows)}銘柄（{status}）")
+        return rows
+
+    async def fetch_all_async(self, markets, pages, retries=3):
+        """
+        市場 × ページをすべて並行に取得する
+
+        Returns:
+            dict: {市場: 行データのリスト（ページ順に連結）}
+        """
+        semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+        keys = [(market, page) for market in markets for page in range(1, pages + 1)]
+        results = await asyncio.gather(*(self.fetch_page_async(market, page, semaphore, retries) for market, page in keys))
+
+        by_market = {market: [] for market in markets}
+        for (market, _page), rows in zip(keys, results):
+            by_market[market].extend(rows)
+        return by_market
+
+    def close(self):
+        self.session.close()
+
+def merge_rankings(by_market):
     """
+    市場ごとのランキングを1つの銘柄リストにまとめる
 
-    url = "https://finance.yahoo.co.jp/stocks/ranking/tradingValueHigh?market=tokyoM&term=daily"  # 東証グロース
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
+    銘柄コードで重複を除き（ページ取得中に順位が入れ替わった場合など）、
+    売買代金の降順で順位を振り直す。ページの売買代金の列を使い、
+    列がない行（古いキャッシュなど）は現在値 × 出来高で代用する。
 
-    for attempt in range(retries):
+    Returns:
+        list: 銘柄データのリスト（'market' と 'market_rank' を追加）
+    """
+    merged = {}
+    for market, rows in by_market.items():
+        for row in rows:
+            symbol = row['symbol']
+            if symbol == '不明' or symbol in merged:
+                continue
+            merged[symbol] = dict(row, market=market, market_rank=row['rank'])
+
+    def trading_value(row):
         try:
-            slog("INFO", f"東証グロース出来高上位データを取得中... - 試行 {attempt + 1}/{retries}")
-
-            response = requests.get(url, headers=headers, timeout=15)
-            response.raise_for_status()
-
-            soup = BeautifulSoup(response.content, 'html.parser')
-
-            # ランキングテーブルを取得
-            ranking_data = []
-
-            # RankingTable__row__1Gwpクラスの行を取得
-            rows = soup.find_all('tr', class_='RankingTable__row__1Gwp')
-
-            for i, row in enumerate(rows[:50]):  # 上位50位まで取得
-                try:
-                    # 順位を取得
-                    rank_cell = row.find('th', class_='RankingTable__rank__2fAZ')
-                    rank = int(rank_cell.text.strip()) if rank_cell else i + 1
-
-                    # 銘柄情報を取得
-                    detail_cell = row.find('td', class_='RankingTable__detail__P452')
-                    if not detail_cell:
-                        continue
-
-                    # 銘柄名
-                    name_link = detail_cell.find('a')
-                    company_name = name_link.text.strip() if name_link else '不明'
-
-                    # 銘柄コード
-                    symbol_code = '不明'
-                    supplements = detail_cell.find_all('li', class_='RankingTable__supplement__vv_m')
-                    if supplements and len(supplements) > 0:
-                        symbol_code = supplements[0].text.strip()
-
-                    # 現在値を取得
-                    price_elements = row.find_all('td', class_='RankingTable__detail--value__i9gr')
-
-                    current_price = '0'
-                    change = '0'
-                    change_rate = '0%'
-                    volume = '0'
-
-                    if len(price_elements) >= 3:
-                        # 現在値（1番目の要素）
-                        price_span = price_elements[0].find('span', class_='StyledNumber__value__3rXW')
-                        if price_span:
-                            current_price = price_span.text.strip().replace(',', '')
-
-                        # 前日比と前日比率（2番目の要素）
-                        change_element = price_elements[1]
-                        change_spans = change_element.find_all('span', class_='StyledNumber__value__3rXW')
-                        if len(change_spans) >= 2:
-                            change = change_spans[0].text.strip()
-                            change_rate = change_spans[1].text.strip()
-                            # %記号を取得
-                            suffix_span = change_element.find('span', class_='StyledNumber__suffix__2SD5')
-                            if suffix_span:
-                                change_rate += suffix_span.text.strip()
-
-                        # 出来高（3番目の要素）
-                        volume_span = price_elements[2].find('span', class_='StyledNumber__value__3rXW')
-                        if volume_span:
-                            volume = volume_span.text.strip().replace(',', '')
-
-                    stock_data = {
-                        'rank': rank,
-                        'symbol': symbol_code,
-                        'name': company_name,
-                        'current_price': current_price,
-                        'change': change,
-                        'change_rate': change_rate,
-                        'volume': volume
-                    }
-
-                    ranking_data.append(stock_data)
-
-                except Exception as e:
-                    slog("WARNING", f"行データの解析に失敗: {e}")
-                    continue
-
-            if ranking_data:
-                slog("INFO", f"東証グロース出来高上位データ取得成功: {len(ranking_data)}銘柄")
-                return ranking_data
-            else:
-                slog("WARNING", "出来高上位データが見つかりませんでした。ページ構造が変更された可能性があります。")
-
-        except requests.exceptions.RequestException as e:
-            slog("ERROR", f"リクエストエラー: {e}")
-        except Exception as e:
-            slog("ERROR", f"予期しないエラー: {e}")
+            if row.get('trading_value') is not None:
+                return float(row['trading_value']) * 1000
+            return float(row['current_price']) * float(row['volume'])
+        except ValueError:
+            return 0.0
+
+    universe = sorted(merged.values(), key=trading_value, reverse=True)
+    for rank, row in enumerate(universe, start=1):
+        row['rank'] = rank
+    return universe
+
+# 実行中に使い回すフェッチャー（条件付きリクエストの検証子を保持する）
+_fetcher = None
+
+def get_ranking_fetcher():
+    """共有のRankingFetcherを返す"""
+    global _fetcher
+    if _fetcher is None:
+        _fetcher = RankingFetcher()
+    return _fetcher
+
+def fetch_ranking_universe(markets=tuple(MARKETS), pages=RANKING_PAGES, retries=3):
+    """
+    東証プライム・スタンダード・グロースの売買代金上位を並行に取得し、
+    重複を除いた1つの銘柄リストにまとめる
 
-        if attempt < retries - 1:
-            slog("INFO", f"5秒後に再試行します...")
-            time.sleep(5)
+    Args:
+        markets: 取得する市場（'prime' / 'standard' / 'growth'）
+        pages: 市場ごとのページ数
+        retries: ページごとのリトライ回数
 
-    slog("ERROR", "東証グロース出来高上位データの取得に失敗しました。")
-    return []
+    Returns:
+        list: 銘柄データのリスト（parse_ranking_page と同じ形式 + 'market', 'market_rank'）
+    """
+    fetcher = get_ranking_fetcher()
+    start = time.monotonic()
+    by_market = asyncio.run(fetcher.fetch_all_async(markets, pages, retries))
+    fetcher.save_cache()
+
+    universe = merge_rankings(by_market)
+    counts = ", ".join(f"{MARKET_NAMES[market]}{len(rows)}行" for market, rows in by_market.items())
+    if universe:
+        slog("INFO", f"売買代金上位データ取得成功: {len(universe)}銘柄（{counts}）{time.monotonic() - start:.2f}秒")
+    else:
+        slog("ERROR", "売買代金上位データの取得に失敗しました。")
+    return universe
@@ -0,0 +1,186 @@
+from logger import slog
+import time
+import threading
+from concurrent.futures import Future
+
+# 注文状態（kabuステーションAPIのState）
+ORDER_STATE_DONE = 5  # 終了
+# 明細種別（Details.RecType）
+REC_TYPE_EXECUTION = 8  # 約定
+
+def summarize_order(order):
+    """
+    注文情報から約定数量と約定価格（約定明細の加重平均）を求める
+
+    Returns:
+        tuple: (約定数量, 約定価格) 約定がない場合の約定価格はNone
+    """
+    cum_qty = order.get('CumQty', 0) or 0
+    executions = [d for d in order.get('Details') or [] if d.get('RecType') == REC_TYPE_EXECUTION and d.get('Qty')]
+    if executions:
+        total_qty = sum(d['Qty'] for d in executions)
+        price = sum(d['Price'] * d['Qty'] for d in executions) / total_qty
+    else:
+        price = order.get('Price') or None
+    if cum_qty <= 0:
+        return 0, None
+    return cum_qty, price
+
+class ExecutionTracker:
+    """
+    未約定の注文をまとめて監視する
+
+    1回のポーリングで注文一覧（/kabusapi/orders）を1度だけ取得し、
+    監視中の全注文の状態を更新して、約定・タイムアウトした注文の待機者に結果を返す。
+    変化がない間はポーリング間隔を伸ばし、変化があれば最短間隔に戻す。
+    """
+
+    def __init__(self, fetch_orders, cancel_order=None, min_interval=0.5, max_interval=3.0, backoff=1.5, cancel_grace=5.0):
+        """
+        Args:
+            fetch_orders: 注文一覧を返す関数（例: get_order_status）
+            cancel_order: 注文IDを受け取って取消を送信する関数（Noneの場合は取り消さない）
+            min_interval: 最短ポーリング間隔（秒）
+            max_interval: 最長ポーリング間隔（秒）
+            backoff: 変化がなかった場合に間隔に掛ける倍率
+            cancel_grace: 期限で取消を送信してから注文の終了を待つ秒数
+        """
+        self.fetch_orders = fetch_orders
+        self.cancel_order = cancel_order
+        self.cancel_grace = cancel_grace
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def track(self, order_id, symbol, timeout=30):
+        """
+        注文を監視対象に追加する
+
+        期限までに終了しなかった注文は残りを取り消し、取消が反映される（注文が終了する）まで
+        cancel_grace 秒だけ監視を続ける。一覧から注文が見つからない場合は最後に確認できた
+        約定数量・約定価格を返す。
+
+        Returns:
+            Future: 約定またはタイムアウト時に
+                {'order_id', 'symbol', 'status', 'cum_qty', 'price', 'state'} を返す
+                status: 'filled'（全約定） / 'partial'（一部約定のまま終了・タイムアウト） /
+                        'cancelled'（約定なしで終了） / 'timeout'
+        """
+        future = Future()
+        with self._lock:
+            self._pending[order_id] = {
+                'symbol': symbol,
+                'deadline': time.monotonic() + timeout,
+                'cum_qty': 0,
+                'price': None,
+                'state': None,
+                'cancel_requested': False,
+                'future': future,
+            }
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._poll_loop, name="execution-tracker", daemon=True)
+                self._thread.start()
+        # 新しい注文が入ったらすぐにポーリングする
+        self._wakeup.set()
+        return future
+
+    def _resolve(self, order_id, entry, status, cum_qty, price, state):
+        entry['future'].set_result({
+            'order_id': order_id,
+            'symbol': entry['symbol'],
+            'status': status,
+            'cum_qty': cum_qty,
+            'price': price,
+            'state': state,
+        })
+
+    def _poll_once(self):
+        """
+        注文一覧を1回取得して監視中の注文に反映する
+
+        Returns:
+            bool: 状態に変化があったかどうか
+        """
+        orders = self.fetch_orders()
+        by_id = {order.get('ID'): order for order in orders or [] if isinstance(order, dict)}
+        changed = False
+        now = time.monotonic()
+        to_cancel = []
+
+        with self._lock:
+            for order_id, entry in list(self._pending.items()):
+                order = by_id.get(order_id)
+                if order is not None:
+                    cum_qty, price = summarize_order(order)
+                    state = order.get('State')
+
+                    if cum_qty != entry['cum_qty']:
+                        changed = True
+                        entry['cum_qty'] = cum_qty
+                        slog("INFO", f"約定数量更新: {entry['symbol']} 注文ID={order_id} {cum_qty}/{order.get('OrderQty', '?')}株")
+                    if price is not None:
+                        entry['price'] = price
+                    entry['state'] = state
+
+                    if state == ORDER_STATE_DONE:
+                        order_qty = order.get('OrderQty', cum_qty)
+                        if cum_qty <= 0:
+                            status = 'cancelled'
+                        elif cum_qty < order_qty:
+                            status = 'partial'
+                        else:
+                            status = 'filled'
+                        del self._pending[order_id]
+                        self._resolve(order_id, entry, status, cum_qty, entry['price'], state)
+                        changed = True
+                        continue
+
+                if now < entry['deadline']:
+                    continue
+                if self.cancel_order is not None and not entry['cancel_requested']:
+                    # 期限を過ぎた注文は残りを取り消し、終了が確認できるまで少しだけ監視を続ける
+                    entry['cancel_requested'] = True
+                    entry['deadline'] = now + self.cancel_grace
+                    to_cancel.append((order_id, entry['symbol']))
+                    continue
+                # 一覧にない場合も最後に確認できた約定数量・約定価格を返す
+                del self._pending[order_id]
+                status = 'partial' if entry['cum_qty'] > 0 else 'timeout'
+                self._resolve(order_id, entry, status, entry['cum_qty'], entry['price'], entry['state'])
+
+        for order_id, symbol in to_cancel:
+            slog("WARNING", f"約定待機の期限を過ぎたため残りを取り消します: {symbol} 注文ID={order_id}")
+            try:
+                self.cancel_order(order_id)
+            except Exception as e:
+                slog("ERROR", f"注文の取消に失敗: {symbol} 注文ID={order_id} - {e}")
+        return changed or bool(to_cancel)
+
+    def _poll_loop(self):
+        interval = self.min_interval
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._thread = None
+                    return
+
+            self._wakeup.clear()
+            try:
+                changed = self._poll_once()
+            except Exception as e:
+                slog("ERROR", f"注文状況の一括取得でエラー: {e}")
+                changed = False
+
+            interval = self.min_interval if changed else min(interval * self.backoff, self.max_interval)
+
+            # 最も近い期限を過ぎて待たない
+            with self._lock:
+                deadlines = [entry['deadline'] for entry in self._pending.values()]
+            if deadlines:
+                interval_until_deadline = max(min(deadlines) - time.monotonic(), 0)
+                if self._wakeup.wait(min(interval, interval_until_deadline)):
+                    interval = self.min_interval
@@ -0,0 +1,161 @@
+from logger import slog
+import os
+import re
+import json
+
+# 1回の実行中に使い回す銘柄インデックス {銘柄コード: レコード}
+_liquidity_index = None
+
+def get_db_dir():
+    """dbディレクトリのパスを返す"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(os.path.dirname(script_dir))
+    return os.path.join(project_root, 'db')
+
+def get_snapshot_file():
+    """出来高上位データのスナップショット（db/liquidity_data.json）のパスを返す"""
+    return os.path.join(get_db_dir(), 'liquidity_data.json')
+
+def get_text_file():
+    """人が読むための出来高上位データ（db/liquidity_data.txt）のパスを返す"""
+    return os.path.join(get_db_dir(), 'liquidity_data.txt')
+
+def _to_number(value, number_type):
+    """'1,234' や '1234円' のような文字列を数値に変換する（変換できない場合は0）"""
+    try:
+        return number_type(str(value).replace(',', '').replace('円', '').strip())
+    except ValueError:
+        return number_type(0)
+
+def to_record(stock):
+    """
+    fetch_ranking_universe の行データを型付きのレコードに変換する
+
+    Returns:
+        dict: {'rank': int, 'symbol': str, 'name': str, 'current_price': float,
+               'change': str, 'change_rate': str, 'volume': int, 'market': str}
+    """
+    return {
+        'rank': int(stock['rank']),
+        'symbol': str(stock['symbol']),
+        'name': stock['name'],
+        'current_price': _to_number(stock['current_price'], float),
+        'change': stock['change'],
+        'change_rate': stock['change_rate'],
+        'volume': _to_number(stock['volume'], int),
+        'market': stock.get('market', 'growth'),
+    }
+
+def to_records(stock_data):
+    """行データのリストをレコードのリストに変換する（順位などが不正な行はスキップする）"""
+    records = []
+    for stock in stock_data:
+        try:
+            records.append(to_record(stock))
+        except (KeyError, TypeError, ValueError) as e:
+            slog("WARNING", f"出来高上位データの行を変換できないためスキップします: {stock} - {e}")
+    return records
+
+def write_liquidity_data(stock_data):
+    """
+    出来高上位データをliquidity_data.json（プログラム用）と
+    liquidity_data.txt（確認用）に書き込み、インデックスを差し替える
+
+    Returns:
+        bool: 書き込み成功かどうか
+    """
+    global _liquidity_index
+
+    records = to_records(stock_data)
+    snapshot_file = get_snapshot_file()
+    tmp_file = f'{snapshot_file}.tmp'
+
+    try:
+        os.makedirs(get_db_dir(), exist_ok=True)
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_file, snapshot_file)
+
+        with open(get_text_file(), 'w', encoding='utf-8') as f:
+            f.write("売買代金上位データ\n")
+            f.write("=" * 50 + "\n")
+            for stock in stock_data:
+                f.write(f"順位: {stock['rank']}\n")
+                f.write(f"銘柄名: {stock['name']}\n")
+                f.write(f"銘柄コード: {stock['symbol']}\n")
+                f.write(f"市場: {stock.get('market', 'growth')}\n")
+                f.write(f"現在値: {stock['current_price']}円\n")
+                f.write(f"前日比: {stock['change']}\n")
+                f.write(f"前日比率: {stock['change_rate']}\n")
+                f.write(f"出来高: {stock['volume']}\n")
+                f.write("-" * 30 + "\n")
+    except Exception as e:
+        slog("ERROR", f"出来高上位データの書き込みに失敗: {e}")
+        return False
+
+    _liquidity_index = build_index(records)
+    return True
+
+def parse_liquidity_text(content):
+    """
+    旧形式のliquidity_data.txtの内容をレコードのリストに変換する
+    （liquidity_data.jsonがまだない環境向け）
+    """
+    rows = []
+    for block in content.split("-" * 30):
+        fields = dict(re.findall(r'^(順位|銘柄名|銘柄コード|現在値|前日比|前日比率|出来高): (.*)$', block, re.MULTILINE))
+        if '銘柄コード' not in fields:
+            continue
+        rows.append({
+            'rank': fields.get('順位', len(rows) + 1),
+            'symbol': fields['銘柄コード'],
+            'name': fields.get('銘柄名', ''),
+            'current_price': fields.get('現在値', '0'),
+            'change': fields.get('前日比', '0'),
+            'change_rate': fields.get('前日比率', '0%'),
+            'volume': fields.get('出来高', '0'),
+        })
+    return to_records(rows)
+
+def build_index(records):
+    """レコードのリストから銘柄コードをキーにした辞書を作成する（順位順を維持）"""
+    return {record['symbol']: record for record in sorted(records, key=lambda r: r['rank'])}
+
+def load_liquidity_index(reload=False):
+    """
+    出来高上位データのインデックスを返す（初回のみファイルから読み込む）
+
+    Args:
+        reload: Trueの場合はファイルから読み直す
+
+    Returns:
+        dict: {銘柄コード: レコード}、データがない場合は空の辞書
+    """
+    global _liquidity_index
+
+    if _liquidity_index is not None and not reload:
+        return _liquidity_index
+
+    snapshot_file = get_snapshot_file()
+    text_file = get_text_file()
+
+    try:
+        if os.path.exists(snapshot_file):
+            with open(snapshot_file, 'r', encoding='utf-8') as f:
+                records = json.load(f)
+        elif os.path.exists(text_file):
+            with open(text_file, 'r', encoding='utf-8') as f:
+                records = parse_liquidity_text(f.read())
+        else:
+            slog("WARNING", f"出来高上位データが見つかりません: {snapshot_file}")
+            records = []
+    except Exception as e:
+        slog("ERROR", f"出来高上位データの読み込みエラー: {e}")
+        records = []
+
+    _liquidity_index = build_index(records)
+    return _liquidity_index
+
+def get_liquidity_record(symbol):
+    """指定銘柄のレコードを返す（見つからない場合はNone）"""
+    return load_liquidity_index().get(symbol)
@@ -0,0 +1,149 @@
+from logger import slog
+import math
+import time
+import random
+import hashlib
+import datetime
+import itertools
+import threading
+from .bar_store import load_bars
+from .liquidity import get_liquidity_record
+from .execution_tracker import ORDER_STATE_DONE
+
+# 売買単位
+LOT_SIZE = 100
+
+DEFAULT_CONFIG = {
+    'spread_bps': 10.0,           # 片道のスプレッドコスト（bps）
+    'impact_coefficient': 0.1,    # マーケットインパクト係数（√(注文数量 / 出来高) に掛ける）
+    'max_participation': 0.01,    # 1注文で約定できる出来高の上限割合（超過分は一部約定）
+    'latency_ms': 0.0,            # 約定までの遅延（ミリ秒）
+    'seed': None,                 # 乱数シード（遅延のゆらぎに使用）
+}
+
+class PaperBroker:
+    """
+    プロセス内で完結する模擬約定エンジン
+
+    日足キャッシュ（db/bars）の直近終値と出来高、出来高上位データの現在値を
+    基準に、スプレッドとマーケットインパクト（√モデル）を加味した価格で約定させる。
+    出来高に対して大きすぎる注文は max_participation の範囲で一部約定とする。
+    """
+
+    def __init__(self, **config):
+        self.config = dict(DEFAULT_CONFIG, **config)
+        self.random = random.Random(self.config['seed'])
+        self.orders = {}
+        self.sequence = itertools.count(1)
+        self._reference_cache = {}
+        self._lock = threading.Lock()
+
+    def reference(self, symbol):
+        """
+        銘柄の基準価格と1日の出来高を返す（銘柄ごとに1回だけ読み込む）
+
+        Returns:
+            tuple: (基準価格, 出来高) 出来高が不明な場合はNone
+        """
+        cached = self._reference_cache.get(symbol)
+        if cached is not None:
+            return cached
+
+        price = None
+        volume = None
+        try:
+            bars = load_bars(symbol, lookback=1)
+        except Exception:
+            bars = None
+        if bars is not None and not bars.empty:
+            price = float(bars['Close'].iloc[-1])
+            volume = float(bars['Volume'].iloc[-1]) or None
+
+        record = get_liquidity_record(symbol)
+        if record is not None:
+            if record['current_price'] > 0:
+                price = record['current_price']
+            if volume is None and record['volume'] > 0:
+                volume = float(record['volume'])
+
+        if price is None:
+            # 価格が見つからない場合は検証用APIと同じハッシュベースの価格
+            hash_val = int(hashlib.md5(symbol.encode()).hexdigest()[:8], 16)
+            price = float(500 + (hash_val % 1500))
+
+        self._reference_cache[symbol] = (price, volume)
+        return price, volume
+
+    def fill(self, symbol, side, qty):
+        """
+        約定数量と約定価格を計算する
+
+        Returns:
+            tuple: (約定数量, 約定価格)
+        """
+        price, volume = self.reference(symbol)
+        fill_qty = qty
+        impact = 0.0
+
+        if volume:
+            max_qty = int(volume * self.config['max_participation']) // LOT_SIZE * LOT_SIZE
+            fill_qty = min(qty, max_qty)
+            impact = self.config['impact_coefficient'] * math.sqrt(max(fill_qty, 0) / volume)
+
+        slippage = self.config['spread_bps'] / 10000 + impact
+        direction = 1 if side == 'buy' else -1
+        fill_price = round(price * (1 + direction * slippage), 1)
+        return fill_qty, fill_price
+
+    def send_order(self, symbol, side, qty, price=0):
+        """
+        注文を受け付けて即座に約定計算する（kabuステーションAPIの発注結果と同じ形式を返す）
+
+        Returns:
+            dict: {'Result': 0, 'OrderId': 注文ID}
+        """
+        fill_qty, fill_price = self.fill(symbol, side, qty)
+        order_id = datetime.datetime.now().strftime('%Y%m%dA02P') + f"{next(self.sequence):08d}"
+        with self._lock:
+            self.orders[order_id] = {
+                'symbol': symbol,
+                'side': side,
+                'qty': qty,
+                'cum_qty': fill_qty,
+                'price': fill_price if fill_qty > 0 else None,
+            }
+        return {'Result': 0, 'OrderId': order_id}
+
+    def wait(self, order_result, symbol, timeout=30):
+        """
+        注文の約定結果を返す（broker.wait_for_execution と同じ形式）
+
+        Returns:
+            dict: {'order_id', 'symbol', 'status', 'cum_qty', 'price', 'state'}
+        """
+        order_id = order_result.get('OrderId')
+        with self._lock:
+            order = self.orders.get(order_id)
+        if order is None:
+            slog("ERROR", f"模擬約定: 注文が見つかりません {symbol} 注文ID={order_id}")
+            return None
+
+        latency_ms = self.config['latency_ms']
+        if latency_ms:
+            time.sleep(min(self.random.uniform(0.5, 1.5) * latency_ms / 1000, timeout))
+
+        if order['cum_qty'] <= 0:
+            status = 'cancelled'
+        elif order['cum_qty'] < order['qty']:
+            status = 'partial'
+        else:
+            status = 'filled'
+
+        return {
+            'order_id': order_id,
+            'symbol': symbol,
+            'status': status,
+            'cum_qty': order['cum_qty'],
+            'price': order['price'],
+            'state': ORDER_STATE_DONE,
+        }
@@ -0,0 +1,232 @@
+from logger import slog
+import os
+import sqlite3
+import atexit
+import datetime
+import threading
+
+# スレッドごとに使い回すSQLite接続
+_local = threading.local()
+# 作成した接続（終了時にまとめて閉じる）
+_connections = set()
+_connections_lock = threading.Lock()
+
+# 旧形式のポジションファイルの取り込みを済ませたDBのバージョン（PRAGMA user_version）
+LEGACY_IMPORTED_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS positions (
+    symbol TEXT PRIMARY KEY,
+    qty INTEGER NOT NULL,
+    avg_cost REAL NOT NULL,
+    last_update TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fills (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    symbol TEXT NOT NULL,
+    side TEXT NOT NULL,
+    qty INTEGER NOT NULL,
+    price REAL NOT NULL,
+    realized_pnl REAL,
+    executed_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS fills_symbol ON fills (symbol);
+"""
+
+def get_db_dir():
+    """dbディレクトリのパスを返す"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(os.path.dirname(script_dir))
+    return os.path.join(project_root, 'db')
+
+def get_store_file():
+    """ポジションDB（db/positions.db）のパスを返す"""
+    return os.path.join(get_db_dir(), 'positions.db')
+
+def get_connection():
+    """
+    ポジションDBへの接続を返す（スレッドごとに1つ作成して使い回す）
+    初回作成時は旧形式のdb/positions/*.posファイルを取り込む（DBごとに1回のみ）
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        with _connections_lock:
+            if conn in _connections:
+                return conn
+
+    os.makedirs(get_db_dir(), exist_ok=True)
+    # 終了時に別スレッドから閉じるため check_same_thread=False（使用は作成したスレッドのみ）
+    conn = sqlite3.connect(get_store_file(), timeout=30, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    with conn:
+        conn.executescript(SCHEMA)
+        import_legacy_position_files(conn)
+    _local.conn = conn
+    with _connections_lock:
+        _connections.add(conn)
+    return conn
+
+def close_connection():
+    """現在のスレッドの接続を閉じる（ワーカースレッドの終了前に呼び出す）"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        return
+    _local.conn = None
+    with _connections_lock:
+        _connections.discard(conn)
+    conn.close()
+
+@atexit.register
+def close_all_connections():
+    """作成したすべての接続を閉じる（プロセス終了時に呼び出される）"""
+    with _connections_lock:
+        connections = list(_connections)
+        _connections.clear()
+    for conn in connections:
+        try:
+            conn.close()
+        except Exception as e:
+            slog("WARNING", f"ポジションDBの接続を閉じられませんでした: {e}")
+
+def import_legacy_position_files(conn):
+    """
+    旧形式のdb/positions/{銘柄コード}.posファイルをpositionsテーブルに取り込む
+
+    取り込みはDBごとに1回だけ行い、PRAGMA user_version に記録する。
+    記録前のDBでも、ポジションか約定履歴があれば取り込み済みとみなす
+    （全銘柄を売却した後に売却済みのポジションが復活しないようにする）。
+    """
+    if conn.execute('PRAGMA user_version').fetchone()[0] >= LEGACY_IMPORTED_VERSION:
+        return 0
+    imported = (conn.execute('SELECT COUNT(*) FROM positions').fetchone()[0] > 0
+                or conn.execute('SELECT COUNT(*) FROM fills').fetchone()[0] > 0)
+    conn.execute(f'PRAGMA user_version = {LEGACY_IMPORTED_VERSION}')
+    if imported:
+        return 0
+
+    positions_dir = os.path.join(get_db_dir(), 'positions')
+    if not os.path.exists(positions_dir):
+        return 0
+
+    rows = []
+    for filename in os.listdir(positions_dir):
+        if not filename.endswith('.pos'):
+            continue
+        data = {}
+        try:
+            with open(os.path.join(positions_dir, filename), 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if '=' in line:
+                        key, value = line.split('=', 1)
+                        data[key] = value
+            qty = int(data.get('qty', 0))
+            if qty > 0:
+                rows.append((filename[:-len('.pos')], qty, float(data.get('avg_cost', 0)), data.get('last_update', '')))
+        except Exception as e:
+            slog("ERROR", f"ポジションファイル読み込みエラー: {filename} - {e}")
+
+    conn.executemany('INSERT OR REPLACE INTO positions (symbol, qty, avg_cost, last_update) VALUES (?, ?, ?, ?)', rows)
+    if rows:
+        slog("INFO", f"旧ポジションファイルを取り込みました: {len(rows)}銘柄")
+    return len(rows)
+
+def _apply_execution(conn, symbol, qty, execution_price, transaction_type, current_time):
+    """
+    1件の約定をpositionsとfillsに反映する（トランザクション内で呼び出す）
+
+    Returns:
+        bool: 反映したかどうか（売却対象のポジションがない場合はFalse）
+    """
+    row = conn.execute('SELECT qty, avg_cost FROM positions WHERE symbol = ?', (symbol,)).fetchone()
+    realized_pnl = None
+
+    if row is not None:
+        current_qty, current_avg_cost = row
+
+        if transaction_type == 'buy':
+            # 買い注文の場合：数量加算、平均単価を再計算
+            new_qty = current_qty + qty
+            new_avg_cost = ((current_qty * current_avg_cost) + (qty * execution_price)) / new_qty
+            slog("INFO", f"既存ポジション更新: {symbol} {current_qty}株 → {new_qty}株, 平均単価: {current_avg_cost:.2f}円 → {new_avg_cost:.2f}円")
+        else:
+            # 売り注文の場合：数量減算、損益計算、平均単価は維持
+            if current_qty >= qty:
+                new_qty = current_qty - qty
+                new_avg_cost = current_avg_cost if new_qty > 0 else 0
+
+                # 売却損益を計算（売却価格 - 平均取得価格）× 売却数量
+                realized_pnl = (execution_price - current_avg_cost) * qty
+
+                slog("INFO", f"既存ポジション売却: {symbol} {current_qty}株 → {new_qty}株")
+                slog("INFO", f"売却損益: ({execution_price:.2f} - {current_avg_cost:.2f}) × {qty}株 = {realized_pnl:+,.0f}円")
+            else:
+                # 保有数量より多く売却しようとした場合
+                over_sell_qty = qty - current_qty
+                new_qty = 0
+                new_avg_cost = 0
+
+                # 保有分の売却損益
+                realized_pnl = (execution_price - current_avg_cost) * current_qty
+                slog("WARNING", f"保有数量超過売却: {symbol} 保有{current_qty}株に対し{qty}株売却")
+                slog("INFO", f"保有分売却損益: ({execution_price:.2f} - {current_avg_cost:.2f}) × {current_qty}株 = {realized_pnl:+,.0f}円")
+                slog("WARNING", f"超過分{over_sell_qty}株は空売り扱い")
+    else:
+        # ポジションが存在しない場合
+        if transaction_type == 'buy':
+            new_qty = qty
+            new_avg_cost = execution_price
+            slog("INFO", f"新規ポジション作成: {symbol} {new_qty}株, 平均単価: {new_avg_cost:.2f}円")
+        else:
+            # 売り注文で既存ポジションがない場合はエラー
+            slog("ERROR", f"売却対象のポジションが存在しません: {symbol}")
+            return False
+
+    conn.execute(
+        'INSERT INTO fills (symbol, side, qty, price, realized_pnl, executed_at) VALUES (?, ?, ?, ?, ?, ?)',
+        (symbol, transaction_type, qty, execution_price, realized_pnl, current_time)
+    )
+
+    # 数量が0になった場合はポジションを削除
+    if new_qty == 0:
+        conn.execute('DELETE FROM positions WHERE symbol = ?', (symbol,))
+        slog("INFO", f"ポジション完売により削除: {symbol}")
+    else:
+        conn.execute(
+            'INSERT OR REPLACE INTO positions (symbol, qty, avg_cost, last_update) VALUES (?, ?, ?, ?)',
+            (symbol, new_qty, round(new_avg_cost, 2), current_time)
+        )
+    return True
+
+def save_executions(executions):
+    """
+    複数の約定を1つのトランザクションでポジションDBに記録する
+
+    Args:
+        executions: [(銘柄コード, 約定数量, 約定価格, 'buy' または 'sell'), ...] のリスト
+
+    Returns:
+        list: 各約定を記録できたかどうか（executionsと同じ順序）
+    """
+    current_time = datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%S%z')
+    try:
+        conn = get_connection()
+        with conn:
+            return [
+                _apply_execution(conn, symbol, qty, execution_price, transaction_type, current_time)
+                for symbol, qty, execution_price, transaction_type in executions
+            ]
+    except Exception as e:
+        slog("ERROR", f"ポジションDB更新でエラー: {e}")
+        return [False] * len(executions)
+
+def get_open_positions():
+    """
+    保有中の全ポジションを1回のクエリで取得する
+
+    Returns:
+        list: [(銘柄コード, 数量, 平均単価), ...] のリスト（銘柄コード順）
+    """
+    conn = get_connection()
+    return conn.execute('SELECT symbol, qty, avg_cost FROM positions WHERE qty > 0 ORDER BY symbol').fetchall()
@@ -0,0 +1,244 @@
+from logger import slog
+from bs4 import BeautifulSoup, UnicodeDammit
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+# ランキングページのクラス名（ページ構造が変わった場合はここを修正する）
+ROW_CLASS = 'RankingTable__row__1Gwp'
+RANK_CLASS = 'RankingTable__rank__2fAZ'
+DETAIL_CLASS = 'RankingTable__detail__P452'
+SUPPLEMENT_CLASS = 'RankingTable__supplement__vv_m'
+VALUE_CELL_CLASS = 'RankingTable__detail--value__i9gr'
+NUMBER_CLASS = 'StyledNumber__value__3rXW'
+SUFFIX_CLASS = 'StyledNumber__suffix__2SD5'
+
+# 使用するバックエンド（Noneの場合はlxmlがあればlxml、なければbs4）
+PARSER_BACKEND = None
+
+def response_encoding(response):
+    """レスポンスヘッダー（Content-Type）で宣言された文字コードを返す（宣言がない場合はNone）"""
+    if 'charset=' not in response.headers.get('Content-Type', '').lower():
+        return None
+    return response.encoding
+
+def decode_content(content, encoding=None):
+    """
+    ページのHTMLを文字列に変換する（strの場合はそのまま返す）
+
+    encoding（レスポンスヘッダーの文字コード）を優先し、指定がなければ
+    meta charset、それもなければ内容から判定する。
+    lxmlはmeta charsetのないbytesをlatin-1として読むため、解析前に必ず変換する。
+    """
+    if isinstance(content, str):
+        return content
+    return UnicodeDammit(content, [encoding] if encoding else [], is_html=True).unicode_markup
+
+def parse_with_bs4(content, limit=None, encoding=None):
+    """BeautifulSoup（html.parser）で行データを取り出す（互換用の標準バックエンド）"""
+    soup = BeautifulSoup(decode_content(content, encoding), 'html.parser')
+
+    # ランキングテーブルを取得
+    ranking_data = []
+
+    # ランキングの行（ROW_CLASS）を取得
+    rows = soup.find_all('tr', class_=ROW_CLASS)
+
+    for i, row in enumerate(rows[:limit]):
+        try:
+            # 順位を取得
+            rank_cell = row.find('th', class_=RANK_CLASS)
+            rank = int(rank_cell.text.strip()) if rank_cell else i + 1
+
+            # 銘柄情報を取得
+            detail_cell = row.find('td', class_=DETAIL_CLASS)
+            if not detail_cell:
+                continue
+
+            # 銘柄名
+            name_link = detail_cell.find('a')
+            company_name = name_link.text.strip() if name_link else '不明'
+
+            # 銘柄コード
+            symbol_code = '不明'
+            supplements = detail_cell.find_all('li', class_=SUPPLEMENT_CLASS)
+            if supplements and len(supplements) > 0:
+                symbol_code = supplements[0].text.strip()
+
+            # 現在値を取得
+            price_elements = row.find_all('td', class_=VALUE_CELL_CLASS)
+
+            current_price = '0'
+            change = '0'
+            change_rate = '0%'
+            volume = '0'
+            trading_value = None
+
+            if len(price_elements) >= 3:
+                # 現在値（1番目の要素）
+                price_span = price_elements[0].find('span', class_=NUMBER_CLASS)
+                if price_span:
+                    current_price = price_span.text.strip().replace(',', '')
+
+                # 前日比と前日比率（2番目の要素）
+                change_element = price_elements[1]
+                change_spans = change_element.find_all('span', class_=NUMBER_CLASS)
+                if len(change_spans) >= 2:
+                    change = change_spans[0].text.strip()
+                    change_rate = change_spans[1].text.strip()
+                    # %記号を取得
+                    suffix_span = change_element.find('span', class_=SUFFIX_CLASS)
+                    if suffix_span:
+                        change_rate += suffix_span.text.strip()
+
+                # 出来高（3番目の要素）
+                volume_span = price_elements[2].find('span', class_=NUMBER_CLASS)
+                if volume_span:
+                    volume = volume_span.text.strip().replace(',', '')
+
+            # 売買代金（千円、4番目の要素がある場合のみ）
+            if len(price_elements) >= 4:
+                value_span = price_elements[3].find('span', class_=NUMBER_CLASS)
+                if value_span:
+                    trading_value = value_span.text.strip().replace(',', '')
+
+            stock_data = {
+                'rank': rank,
+                'symbol': symbol_code,
+                'name': company_name,
+                'current_price': current_price,
+                'change': change,
+                'change_rate': change_rate,
+                'volume': volume,
+                'trading_value': trading_value
+            }
+
+            ranking_data.append(stock_data)
+
+        except Exception as e:
+            slog("WARNING", f"行データの解析に失敗: {e}")
+            continue
+
+    return ranking_data
+
+
+def _has_class(name):
+    """class属性に指定のクラスを含む要素を選ぶXPathの条件"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+def _text(element):
+    return element.text_content().strip()
+
+def parse_with_lxml(content, limit=None, encoding=None):
+    """lxmlで行データを取り出す（parse_with_bs4 と同じ行データを返す高速バックエンド）"""
+    if not content:
+        return []
+    tree = lxml.html.fromstring(decode_content(content, encoding))
+
+    ranking_data = []
+    rows = tree.xpath(f"//tr[{_has_class(ROW_CLASS)}]")
+
+    for i, row in enumerate(rows[:limit]):
+        try:
+            # 順位を取得
+            rank_cells = row.xpath(f".//th[{_has_class(RANK_CLASS)}]")
+            rank = int(_text(rank_cells[0])) if rank_cells else i + 1
+
+            # 銘柄情報を取得
+            detail_cells = row.xpath(f".//td[{_has_class(DETAIL_CLASS)}]")
+            if not detail_cells:
+                continue
+            detail_cell = detail_cells[0]
+
+            # 銘柄名
+            name_links = detail_cell.xpath(".//a")
+            company_name = _text(name_links[0]) if name_links else '不明'
+
+            # 銘柄コード
+            supplements = detail_cell.xpath(f".//li[{_has_class(SUPPLEMENT_CLASS)}]")
+            symbol_code = _text(supplements[0]) if supplements else '不明'
+
+            current_price = '0'
+            change = '0'
+            change_rate = '0%'
+            volume = '0'
+            trading_value = None
+
+            price_elements = row.xpath(f".//td[{_has_class(VALUE_CELL_CLASS)}]")
+            if len(price_elements) >= 3:
+                number = f".//span[{_has_class(NUMBER_CLASS)}]"
+
+                price_spans = price_elements[0].xpath(number)
+                if price_spans:
+                    current_price = _text(price_spans[0]).replace(',', '')
+
+                change_spans = price_elements[1].xpath(number)
+                if len(change_spans) >= 2:
+                    change = _text(change_spans[0])
+                    change_rate = _text(change_spans[1])
+                    suffix_spans = price_elements[1].xpath(f".//span[{_has_class(SUFFIX_CLASS)}]")
+                    if suffix_spans:
+                        change_rate += _text(suffix_spans[0])
+
+                volume_spans = price_elements[2].xpath(number)
+                if volume_spans:
+                    volume = _text(volume_spans[0]).replace(',', '')
+
+            if len(price_elements) >= 4:
+                value_spans = price_elements[3].xpath(f".//span[{_has_class(NUMBER_CLASS)}]")
+                if value_spans:
+                    trading_value = _text(value_spans[0]).replace(',', '')
+
+            ranking_data.append({
+                'rank': rank,
+                'symbol': symbol_code,
+                'name': company_name,
+                'current_price': current_price,
+                'change': change,
+                'change_rate': change_rate,
+                'volume': volume,
+                'trading_value': trading_value
+            })
+
+        except Exception as e:
+            slog("WARNING", f"行データの解析に失敗: {e}")
+            continue
+
+    return ranking_data
+
+# バックエンド名と解析関数
+PARSERS = {'bs4': parse_with_bs4}
+if lxml is not None:
+    PARSERS['lxml'] = parse_with_lxml
+
+def get_parser(backend=None):
+    """
+    解析関数を返す
+
+    Args:
+        backend: 'lxml' / 'bs4'（Noneの場合はPARSER_BACKEND、未設定ならlxmlを優先）
+
+    Raises:
+        ValueError: 使用できないバックエンドが指定された場合
+    """
+    backend = backend or PARSER_BACKEND or ('lxml' if 'lxml' in PARSERS else 'bs4')
+    if backend not in PARSERS:
+        raise ValueError(f"使用できないパーサーです: {backend}（使用可能: {', '.join(PARSERS)}）")
+    return PARSERS[backend]
+
+def parse_ranking_page(content, limit=None, backend=None, encoding=None):
+    """
+    ランキングページのHTMLから行データを取り出す
+
+    Args:
+        content: ページのHTML（bytesまたはstr）
+        limit: 取り出す行数の上限（Noneの場合はすべて）
+        backend: 使用するバックエンド（get_parser を参照）
+        encoding: contentがbytesの場合の文字コード（Noneの場合はmeta charsetまたは内容から判定）
+
+    Returns:
+        list: 銘柄データのリスト（順位、銘柄コード、銘柄名、現在値、前日比、出来高、売買代金（千円、列がない場合はNone）など）
+    """
+    return get_parser(backend)(content, limit, encoding)
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+kabuステーションAPIのローカル模擬サーバー
+
+kabuステーション（デスクトップアプリ）なしで broker.py / analyze_stock_data の
+負荷・レイテンシを計測するための模擬サーバー。
+/kabusapi/token, /kabusapi/sendorder, /kabusapi/orders, /kabusapi/wallet/cash を実装し、
+注文は 待機(1) → 処理中(2) → 処理済(3) → 終了(5) と遷移して、一部約定を経て全約定する。
+
+使い方:
+    python -m taq.simulator --port 18081 --latency-ms 20 --error-rate 0.01 --order-rate-limit 5
+"""
+
+import json
+import time
+import random
+import hashlib
+import argparse
+import datetime
+import itertools
+import threading
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from resilience import RateLimiter
+
+# 注文状態（kabuステーションAPIのState）
+STATE_WAITING = 1
+STATE_PROCESSING = 2
+STATE_PROCESSED = 3
+STATE_DONE = 5
+
+DEFAULT_CONFIG = {
+    'latency_ms': 5.0,           # 応答遅延の基準値（ミリ秒）
+    'latency_tail_ms': 0.0,      # 指数分布で上乗せする遅延の平均（ミリ秒、テール遅延の再現用）
+    'error_rate': 0.0,           # 500エラーを返す確率
+    'order_rate_limit': 5.0,     # 発注系APIの秒間リクエスト上限（0で無制限）
+    'info_rate_limit': 10.0,     # 情報系APIの秒間リクエスト上限（0で無制限）
+    'accept_delay': 0.2,         # 受付から処理済になるまでの秒数
+    'fill_delay': 1.0,           # 受付から全約定するまでの秒数
+    'partial_fills': 2,          # 全約定までの約定明細の数
+    'reject_rate': 0.0,          # 約定せずに終了（失効）する確率
+    'price_lookup': None,        # 銘柄コードから約定価格を返す関数（省略時はハッシュベース）
+}
+
+def default_price(symbol):
+    """broker.py の検証用APIと同じハッシュベースの価格（500-2000円）"""
+    hash_val = int(hashlib.md5(symbol.encode()).hexdigest()[:8], 16)
+    return float(500 + (hash_val % 1500))
+
+class KabuSimulator:
+    """模擬サーバーの状態（発行済みトークンと注文）"""
+
+    def __init__(self, **config):
+        self.config = dict(DEFAULT_CONFIG, **config)
+        self.tokens = set()
+        self.orders = {}
+        self.lock = threading.Lock()
+        self.sequence = itertools.count(1)
+        self.order_limiter = RateLimiter(self.config['order_rate_limit'])
+        self.info_limiter = RateLimiter(self.config['info_rate_limit'])
+        self.random = random.Random()
+        self.stats = {'requests': 0, 'errors': 0, 'rate_limited': 0, 'unauthorized': 0}
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def issue_token(self):
+        token = hashlib.sha1(f"{time.time()}-{next(self.sequence)}".encode()).hexdigest()
+        with self.lock:
+            self.tokens.add(token)
+        return token
+
+    def is_authorized(self, token):
+        with self.lock:
+            return token in self.tokens
+
+    def send_order(self, body):
+        now = time.monotonic()
+        order_id = datetime.datetime.now().strftime('%Y%m%dA02N') + f"{next(self.sequence):08d}"
+        price = (self.config['price_lookup'] or default_price)(str(body.get('Symbol')))
+        order = {
+            'ID': order_id,
+            'Symbol': str(body.get('Symbol')),
+            'Side': str(body.get('Side')),
+            'OrderQty': int(body.get('Qty', 0)),
+            'Price': float(body.get('Price') or 0),
+            'RecvTime': datetime.datetime.now().isoformat(),
+            '_created': now,
+            '_fill_price': price,
+            '_rejected': self.random.random() < self.config['reject_rate'],
+        }
+        with self.lock:
+            self.orders[order_id] = order
+        return {'Result': 0, 'OrderId': order_id}
+
+    def cancel_order(self, body):
+        """注文の残りを取り消す（取消時点までの約定は残す）"""
+        order_id = body.get('OrderId')
+        with self.lock:
+            order = self.orders.get(order_id)
+            if order is None:
+                return None
+            order.setdefault('_cancelled', time.monotonic())
+        return {'Result': 0, 'OrderId': order_id}
+
+    def order_view(self, order, now):
+        """経過時間に応じた注文状態を返す"""
+        cancelled = order.get('_cancelled')
+        if cancelled is not None:
+            now = min(now, cancelled)
+        elapsed = now - order['_created']
+        accept_delay = self.config['accept_delay']
+        fill_delay = max(self.config['fill_delay'], accept_delay)
+        parts = max(int(self.config['partial_fills']), 1)
+        qty = order['OrderQty']
+
+        if elapsed < accept_delay / 2:
+            state, filled_parts = STATE_WAITING, 0
+        elif elapsed < accept_delay:
+            state, filled_parts = STATE_PROCESSING, 0
+        elif order['_rejected']:
+            state, filled_parts = STATE_DONE, 0
+        elif elapsed >= fill_delay:
+            state, filled_parts = STATE_DONE, parts
+        else:
+            # 受付から全約定までの間に約定明細を均等に発生させる
+            progress = (elapsed - accept_delay) / (fill_delay - accept_delay)
+            state, filled_parts = STATE_PROCESSED, min(int(progress * parts), parts - 1)
+
+        details = []
+        cum_qty = 0
+        for i in range(filled_parts):
+            part_qty = qty // parts + (1 if i < qty % parts else 0)
+            cum_qty += part_qty
+            details.append({'RecType': 8, 'Price': order['_fill_price'], 'Qty': part_qty})
+
+        if cancelled is not None:
+            state = STATE_DONE
+
+        view = {k: v for k, v in order.items() if not k.startswith('_')}
+        view.update({'State': state, 'OrderState': state, 'CumQty': cum_qty, 'Details': details})
+        return view
+
+    def list_orders(self, params):
+        now = time.monotonic()
+        with self.lock:
+            orders = list(self.orders.values())
+        order_id = params.get('id')
+        symbol = params.get('symbol')
+        return [
+            self.order_view(order, now) for order in orders
+            if (not order_id or order['ID'] == order_id) and (not symbol or order['Symbol'] == symbol)
+        ]
+
+class SimulatorHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    simulator = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, obj):
+        payload = json.dumps(obj).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _delay(self):
+        config = self.simulator.config
+        delay = config['latency_ms']
+        if config['latency_tail_ms']:
+            delay += self.simulator.random.expovariate(1 / config['latency_tail_ms'])
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def _precheck(self, limiter, auth=True):
+        """遅延・レート制限・認証・エラー注入を適用する（応答済みならFalse）"""
+        simulator = self.simulator
+        simulator.count('requests')
+        self._delay()
+        if not limiter.try_acquire():
+            simulator.count('rate_limited')
+            self._reply(429, {'Code': 4001006, 'Message': 'API実行回数エラー'})
+            return False
+        if auth and not simulator.is_authorized(self.headers.get('X-API-KEY')):
+            simulator.count('unauthorized')
+            self._reply(401, {'Code': 4001009, 'Message': 'APIキー不一致'})
+            return False
+        if simulator.random.random() < simulator.config['error_rate']:
+            simulator.count('errors')
+            self._reply(500, {'Code': 5, 'Message': '内部エラー'})
+            return False
+        return True
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length)) if length else {}
+
+    def do_POST(self):
+        path = urllib.parse.urlparse(self.path).path
+        body = self._read_body()
+        if path == '/kabusapi/token':
+            if self._precheck(self.simulator.info_limiter, auth=False):
+                self._reply(200, {'ResultCode': 0, 'Token': self.simulator.issue_token()})
+        elif path == '/kabusapi/sendorder':
+            if self._precheck(self.simulator.order_limiter):
+                self._reply(200, self.simulator.send_order(body))
+        else:
+            self._reply(404, {'Code': 404, 'Message': 'Not Found'})
+
+    def do_PUT(self):
+        path = urllib.parse.urlparse(self.path).path
+        body = self._read_body()
+        if path == '/kabusapi/cancelorder':
+            if self._precheck(self.simulator.order_limiter):
+                result = self.simulator.cancel_order(body)
+                if result is None:
+                    self._reply(400, {'Code': 4002001, 'Message': '注文番号が存在しません'})
+                else:
+                    self._reply(200, result)
+        else:
+            self._reply(404, {'Code': 404, 'Message': 'Not Found'})
+
+    def do_GET(self):
+        parsed = urllib.parse.urlparse(self.path)
+        params = dict(urllib.parse.parse_qsl(parsed.query))
+        if parsed.path == '/kabusapi/orders':
+            if self._precheck(self.simulator.info_limiter):
+                self._reply(200, self.simulator.list_orders(params))
+        elif parsed.path == '/kabusapi/wallet/cash':
+            if self._precheck(self.simulator.info_limiter):
+                self._reply(200, {'StockAccountWallet': 10_000_000})
+        else:
+            self._reply(404, {'Code': 404, 'Message': 'Not Found'})
+
+def start_simulator(port=18081, host='127.0.0.1', **config):
+    """
+    模擬サーバーをバックグラウンドスレッドで起動する
+
+    Returns:
+        tuple: (server, simulator) 停止するには server.shutdown() を呼ぶ
+    """
+    simulator = KabuSimulator(**config)
+    handler = type('BoundSimulatorHandler', (SimulatorHandler,), {'simulator': simulator})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="kabu-simulator", daemon=True).start()
+    return server, simulator
+
+def main():
+    parser = argparse.ArgumentParser(description="kabuステーションAPIの模擬サーバー")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=18081)
+    parser.add_argument('--latency-ms', type=float, default=DEFAULT_CONFIG['latency_ms'])
+    parser.add_argument('--latency-tail-ms', type=float, default=DEFAULT_CONFIG['latency_tail_ms'])
+    parser.add_argument('--error-rate', type=float, default=DEFAULT_CONFIG['error_rate'])
+    parser.add_argument('--order-rate-limit', type=float, default=DEFAULT_CONFIG['order_rate_limit'])
+    parser.add_argument('--info-rate-limit', type=float, default=DEFAULT_CONFIG['info_rate_limit'])
+    parser.add_argument('--accept-delay', type=float, default=DEFAULT_CONFIG['accept_delay'])
+    parser.add_argument('--fill-delay', type=float, default=DEFAULT_CONFIG['fill_delay'])
+    parser.add_argument('--partial-fills', type=int, default=DEFAULT_CONFIG['partial_fills'])
+    parser.add_argument('--reject-rate', type=float, default=DEFAULT_CONFIG['reject_rate'])
+    args = parser.parse_args()
+
+    config = {key: value for key, value in vars(args).items() if key not in ('host', 'port')}
+    server, simulator = start_simulator(args.port, args.host, **config)
+    print(f"kabuステーションAPI模擬サーバーを起動しました: http://{args.host}:{args.port}")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"統計: {simulator.stats}")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
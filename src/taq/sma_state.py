@@ -0,0 +1,189 @@
+from logger import slog
+import os
+import json
+import math
+import datetime
+from .crossover import SHORT_WINDOW, LONG_WINDOW
+
+# 移動平均の合計をリングバッファから計算し直す間隔（足の本数、浮動小数点の誤差の蓄積を防ぐ）
+RECOMPUTE_INTERVAL = 250
+
+def get_state_file():
+    """移動平均線の状態ファイル（db/sma_state.json）のパスを返す"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(os.path.dirname(script_dir))
+    return os.path.join(project_root, 'db', 'sma_state.json')
+
+def load_states():
+    """
+    全銘柄の移動平均線の状態を読み込む
+
+    Returns:
+        dict: {銘柄コード: 状態の辞書}、ファイルがない場合は空の辞書
+    """
+    state_file = get_state_file()
+    if not os.path.exists(state_file):
+        return {}
+    try:
+        with open(state_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        slog("ERROR", f"sma_state.jsonの読み込みでエラーが発生: {e}")
+        return {}
+
+def save_states(states):
+    """全銘柄の移動平均線の状態を書き込む（一時ファイル経由で置き換える）"""
+    state_file = get_state_file()
+    os.makedirs(os.path.dirname(state_file), exist_ok=True)
+    tmp_file = f'{state_file}.tmp'
+    try:
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(states, f, ensure_ascii=False)
+        os.replace(tmp_file, state_file)
+        return True
+    except Exception as e:
+        slog("ERROR", f"sma_state.jsonの書き込みでエラーが発生: {e}")
+        return False
+
+def new_state(short_window=SHORT_WINDOW, long_window=LONG_WINDOW):
+    """
+    空の状態を作成する
+
+    closesは直近long_window本の終値のリングバッファで、headは次に書き込む位置。
+    last_event / prev_event は最新の足と、その1本前の足のクロス判定結果。
+    since_recomputeは合計を最後に計算し直してから反映した足の本数。
+    """
+    return {
+        'short_window': short_window,
+        'long_window': long_window,
+        'closes': [0.0] * long_window,
+        'head': 0,
+        'count': 0,
+        'sum_short': 0.0,
+        'sum_long': 0.0,
+        'since_recompute': 0,
+        'cross': False,
+        'last_date': None,
+        'last_event': None,
+        'prev_event': None,
+    }
+
+def recompute_sums(state):
+    """短期・長期の合計をリングバッファの終値から計算し直す"""
+    closes = state['closes']
+    long_window = state['long_window']
+    head = state['head']
+    count = state['count']
+    recent = [closes[(head - i) % long_window] for i in range(1, count + 1)]
+    state['sum_short'] = math.fsum(recent[:state['short_window']])
+    state['sum_long'] = math.fsum(recent)
+    state['since_recompute'] = 0
+
+def is_valid_state(state):
+    """状態の終値・合計がすべて有限の値か（NaNなどを含む状態は初期化し直す）"""
+    values = state['closes'] + [state['sum_short'], state['sum_long']]
+    return all(isinstance(value, (int, float)) and math.isfinite(value) for value in values)
+
+def update_state(state, date, close):
+    """
+    新しい足1本で状態をO(1)で更新する
+    判定条件は trader.analyze_stock_with_moving_averages と同じ
+
+    Args:
+        state: new_state() で作成した状態（更新される）
+        date: 足の日付（'YYYY-MM-DD'）
+        close: 終値
+
+    Returns:
+        dict: この足のクロス判定結果 {'date', 'gc', 'dc', 'ma_short', 'ma_long'}
+
+    Raises:
+        ValueError: 終値がNaNや無限大の場合（合計が壊れるため反映しない）
+    """
+    if not math.isfinite(close):
+        raise ValueError(f"終値が不正です: {date} {close}")
+
+    short_window = state['short_window']
+    long_window = state['long_window']
+    closes = state['closes']
+    head = state['head']
+
+    # 短期線から外れる値（short_window本前）と長期線から外れる値（long_window本前）
+    if state['count'] >= short_window:
+        state['sum_short'] -= closes[(head - short_window) % long_window]
+    if state['count'] >= long_window:
+        state['sum_long'] -= closes[head]
+
+    closes[head] = close
+    state['head'] = (head + 1) % long_window
+    state['count'] = min(state['count'] + 1, long_window)
+    state['sum_short'] += close
+    state['sum_long'] += close
+    state['since_recompute'] = state.get('since_recompute', 0) + 1
+    if state['since_recompute'] >= RECOMPUTE_INTERVAL:
+        recompute_sums(state)
+
+    ma_short = state['sum_short'] / short_window if state['count'] >= short_window else None
+    ma_long = state['sum_long'] / long_window if state['count'] >= long_window else None
+
+    # 短期 > 長期ならTrue（どちらかが未確定ならFalse）
+    cross = ma_short is not None and ma_long is not None and ma_short > ma_long
+    prev_cross = state['cross']
+
+    event = {
+        'date': date,
+        'gc': cross and not prev_cross and ma_short is not None,
+        'dc': not cross and prev_cross and ma_long is not None,
+        'ma_short': ma_short,
+        'ma_long': ma_long,
+    }
+
+    state['cross'] = cross
+    state['last_date'] = date
+    state['prev_event'] = state['last_event']
+    state['last_event'] = event
+    return event
+
+def apply_bars(state, df):
+    """
+    状態の最終日付より新しい足だけを順に反映する（終値がNaNなどの足は飛ばす）
+
+    Returns:
+        int: 反映した本数
+    """
+    applied = 0
+    for date, close in df['Close'].items():
+        date_str = date.strftime('%Y-%m-%d')
+        if state['last_date'] is not None and date_str <= state['last_date']:
+            continue
+        try:
+            update_state(state, date_str, float(close))
+        except ValueError as e:
+            slog("WARNING", f"移動平均線の状態に反映しません: {e}")
+            continue
+        applied += 1
+    return applied
+
+def get_yesterday_signal(state):
+    """
+    前日（最新から2番目の足）のクロス発生有無を返す
+
+    Returns:
+        tuple: (yesterday_gc, yesterday_dc)
+    """
+    event = state.get('prev_event')
+    if not event:
+        return False, False
+    return event['gc'], event['dc']
+
+def bars_needed(state, today=None):
+    """
+    状態を最新にするために読み込む必要がある足の本数（上限の目安）を返す
+    状態がない・壊れている場合はNone（呼び出し側が trader.INDICATOR_LOOKBACK 本の足で初期化する）
+    """
+    if state is None or state.get('last_date') is None or not is_valid_state(state):
+        return None
+    today = today or datetime.date.today()
+    last_date = datetime.date.fromisoformat(state['last_date'])
+    # 経過日数を超える本数の足は存在しない
+    return max((today - last_date).days, 1)
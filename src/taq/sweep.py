@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+移動平均線の期間・手仕舞いルールのパラメータスイープ
+
+日足キャッシュの始値・終値を共有メモリに1度だけ置き、各プロセスは
+コピーせずに参照して backtest.run_backtest を実行する。結果は指標の順に並べて返す。
+
+使い方:
+    python -m taq.sweep --short 3,5,10 --long 20,25,50 --stop-loss none,0.05 --output db/sweep_results.csv
+"""
+
+import os
+import argparse
+import itertools
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from .backtest import load_universe, run_backtest
+
+# 並列数（省略時はCPUコア数）
+SWEEP_WORKERS = os.cpu_count()
+# 共有メモリに置く配列
+SHARED_ARRAYS = ('dates', 'open', 'close')
+
+# ワーカープロセス側で共有メモリを参照する銘柄データ
+_worker_universe = None
+_worker_blocks = []
+
+def build_grid(short_windows, long_windows, stop_losses=(None,), take_profits=(None,), max_holding_days=(None,)):
+    """
+    パラメータの組み合わせを作成する（短期 >= 長期の組み合わせは除く）
+
+    Returns:
+        list: run_backtest に渡すキーワード引数の辞書のリスト
+    """
+    grid = []
+    for short, long, stop, take, hold in itertools.product(short_windows, long_windows, stop_losses, take_profits, max_holding_days):
+        if short >= long:
+            continue
+        grid.append({
+            'short_window': short,
+            'long_window': long,
+            'stop_loss': stop,
+            'take_profit': take,
+            'max_holding_days': hold,
+        })
+    return grid
+
+def share_universe(universe):
+    """
+    銘柄データの配列を共有メモリにコピーする
+
+    Returns:
+        tuple: (blocks, spec)
+            blocks: SharedMemoryのリスト（使い終わったら close / unlink する）
+            spec: ワーカーで attach_universe に渡す情報
+    """
+    blocks = []
+    spec = {'codes': universe['codes'], 'arrays': {}}
+    for key in SHARED_ARRAYS:
+        array = np.ascontiguousarray(universe[key])
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        spec['arrays'][key] = (block.name, array.shape, array.dtype.str)
+    return blocks, spec
+
+def attach_universe(spec):
+    """
+    共有メモリ上の配列を参照する銘柄データを作成する（コピーしない）
+
+    Returns:
+        tuple: (universe, blocks) blocksは参照している間保持しておくこと
+    """
+    universe = {'codes': spec['codes']}
+    blocks = []
+    for key, (name, shape, dtype) in spec['arrays'].items():
+        block = shared_memory.SharedMemory(name=name)
+        array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        array.flags.writeable = False
+        universe[key] = array
+        blocks.append(block)
+    return universe, blocks
+
+def _init_worker(spec):
+    global _worker_universe, _worker_blocks
+    _worker_universe, _worker_blocks = attach_universe(spec)
+
+def evaluate(universe, params):
+    """1組のパラメータをバックテストする（失敗した場合はerror列に内容を入れる）"""
+    try:
+        stats = run_backtest(universe, **params)['stats']
+    except Exception as e:
+        stats = {'error': f"{type(e).__name__}: {e}"}
+    return dict(params, **stats)
+
+def _evaluate(params):
+    """ワーカープロセスで1組のパラメータをバックテストする"""
+    return evaluate(_worker_universe, params)
+
+def run_sweep(universe, grid, max_workers=SWEEP_WORKERS, rank_by='sharpe'):
+    """
+    パラメータの組み合わせを並列にバックテストして順位表を作成する
+
+    Args:
+        universe: backtest.load_universe の戻り値
+        grid: build_grid の戻り値
+        max_workers: 並列数（1以下の場合は逐次実行）
+        rank_by: 順位付けに使う指標（降順）
+
+    Returns:
+        DataFrame: rank列を先頭に、パラメータと統計を並べた表
+    """
+    if max_workers is None or max_workers <= 1:
+        rows = [evaluate(universe, params) for params in grid]
+    else:
+        blocks, spec = share_universe(universe)
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(spec,)) as executor:
+                chunksize = max(1, len(grid) // (max_workers * 4))
+                rows = list(executor.map(_evaluate, grid, chunksize=chunksize))
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+    table = pd.DataFrame(rows)
+    if rank_by in table.columns:
+        table = table.sort_values(rank_by, ascending=False, na_position='last')
+    table = table.reset_index(drop=True)
+    table.insert(0, 'rank', range(1, len(table) + 1))
+    return table
+
+def parse_list(text, cast):
+    """'3,5,10' や 'none,0.05' を値のリストに変換する（noneはNone）"""
+    return [None if item.strip().lower() == 'none' else cast(item) for item in text.split(',')]
+
+def main():
+    parser = argparse.ArgumentParser(description="移動平均線クロス戦略のパラメータスイープ")
+    parser.add_argument('--start', default=None, help="開始日（YYYY-MM-DD）")
+    parser.add_argument('--end', default=None, help="終了日（YYYY-MM-DD）")
+    parser.add_argument('--short', default='3,5,8,10', help="短期移動平均の期間（カンマ区切り）")
+    parser.add_argument('--long', default='20,25,50,75', help="長期移動平均の期間（カンマ区切り）")
+    parser.add_argument('--stop-loss', default='none', help="損切りする下落率（カンマ区切り、noneで無効）")
+    parser.add_argument('--take-profit', default='none', help="利確する上昇率（カンマ区切り、noneで無効）")
+    parser.add_argument('--max-holding-days', default='none', help="最大保有日数（カンマ区切り、noneで無効）")
+    parser.add_argument('--workers', type=int, default=SWEEP_WORKERS, help="並列数")
+    parser.add_argument('--rank-by', default='sharpe', help="順位付けに使う指標")
+    parser.add_argument('--top', type=int, default=20, help="表示する件数")
+    parser.add_argument('--output', default=None, help="結果を書き出すCSVファイル")
+    args = parser.parse_args()
+
+    grid = build_grid(
+        parse_list(args.short, int),
+        parse_list(args.long, int),
+        parse_list(args.stop_loss, float),
+        parse_list(args.take_profit, float),
+        parse_list(args.max_holding_days, int),
+    )
+    universe = load_universe(start=args.start, end=args.end)
+    print(f"銘柄数: {len(universe['codes'])}  組み合わせ: {len(grid)}  並列数: {args.workers}")
+
+    table = run_sweep(universe, grid, max_workers=args.workers, rank_by=args.rank_by)
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(table.head(args.top).to_string(index=False))
+    if args.output:
+        table.to_csv(args.output, index=False)
+        print(f"結果を出力しました: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,75 +1,197 @@
-import urllib.request
-import json
-import pprint
 import os
+import json
+import datetime
+import threading
 from utils import get_env_value
 from logger import slog
+from .api_client import get_client, ApiError
 
-def get_token(use_test_api):
+# トークンの有効性確認に使う軽量なAPI（現物余力）
+VALIDATE_PATH = '/kabusapi/wallet/cash'
+
+def mask_token(token):
+    """ログ表示用にトークンの末尾4文字以外を伏せる"""
+    if not token:
+        return str(token)
+    return f"****{str(token)[-4:]}"
+
+def get_token_dir():
+    """トークンの保存先ディレクトリ（taq/token）を返す"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(script_dir, 'token')
+
+class TokenManager:
     """
-    トークンを取得し、tokenディレクトリに保存する
-    
-    Args:
-        use_test_api: 検証用APIを使用するかどうか
+    APIトークンをメモリ上で管理する
+
+    トークンはtoken/{test|production}.jsonに一時ファイル経由で保存し、
+    プロセス起動時に1度だけ読み込む。401が返された場合はrefresh()で再発行する。
     """
-    if use_test_api:
-        api_password = get_env_value('APIPASS_KSHO')
-        if api_password is None:
-            slog("ERROR", "APIPASS_KSHOが取得できませんでした。")
-            return False
-        url = 'http://localhost:18081/kabusapi/token'
-    else:
-        api_password = get_env_value('APIPASS')
+
+    def __init__(self, use_test_api):
+        self.use_test_api = use_test_api
+        self.token_file = os.path.join(get_token_dir(), 'test.json' if use_test_api else 'production.json')
+        self._token = None
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    def _client(self):
+        return get_client(self.use_test_api)
+
+    def load(self):
+        """保存済みのトークンを読み込む（読み込みは1回のみ）"""
+        with self._lock:
+            if self._loaded:
+                return self._token
+            self._loaded = True
+            try:
+                with open(self.token_file, 'r', encoding='utf-8') as f:
+                    self._token = json.load(f).get('Token')
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                slog("WARNING", f"トークンファイルの読み込みに失敗: {e}")
+            return self._token
+
+    def save(self, token):
+        """トークンを一時ファイル経由で保存する"""
+        os.makedirs(get_token_dir(), exist_ok=True)
+        tmp_file = f'{self.token_file}.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'Token': token, 'IssuedAt': datetime.datetime.now().isoformat()}, f)
+        os.replace(tmp_file, self.token_file)
+
+    def set(self, token, persist=True):
+        """発行済みのトークンを設定する（persist=Falseの場合はファイルに保存しない）"""
+        with self._lock:
+            self._token = token
+            self._loaded = True
+            if persist:
+                self.save(token)
+        self._client().set_token(token)
+
+    def issue(self):
+        """
+        トークンを新しく発行して保存する
+
+        Returns:
+            str: 発行したトークン、失敗した場合はNone
+        """
+        key = 'APIPASS_KSHO' if self.use_test_api else 'APIPASS'
+        api_password = get_env_value(key)
         if api_password is None:
-            slog("ERROR", "APIPASSが取得できませんでした。")
-            return False
-        url = 'http://localhost:18080/kabusapi/token'
-
-    obj = { 'APIPassword': api_password }
-    json_data = json.dumps(obj).encode('utf8')
-    req = urllib.request.Request(url, json_data, method='POST')
-    req.add_header('Content-Type', 'application/json')
-
-    try:
-        with urllib.request.urlopen(req) as res:
-            slog("INFO", f"{res.status} {res.reason}")
-            for header in res.getheaders():
-                slog("INFO", str(header))
-            slog("INFO","")
-            content = json.loads(res.read())
-            pprint.pprint(content)
-            
-            # トークン発行成功時にファイルを保存
-            if res.status == 200 and 'Token' in content:
-                token = content['Token']
-                # tokenディレクトリを作成
-                script_dir = os.path.dirname(os.path.abspath(__file__))
-                token_dir = os.path.join(script_dir, 'token')
-                if not os.path.exists(token_dir):
-                    os.makedirs(token_dir)
-                
-                # 古いtokenファイルを削除
-                for old_token_file in os.listdir(token_dir):
-                    old_file_path = os.path.join(token_dir, old_token_file)
-                    if os.path.isfile(old_file_path):
-                        os.remove(old_file_path)
-                
-                # トークンファイルを作成
-                token_file_path = os.path.join(token_dir, token)
-                with open(token_file_path, 'w', encoding='utf-8') as token_file:
-                    pass
-                slog("INFO", f"トークン : {token}")
-                return True
+            slog("ERROR", f"{key}が取得できませんでした。")
+            return None
+
+        obj = { 'APIPassword': api_password }
+
+        try:
+            content = self._client().post('/kabusapi/token', obj, auth=False)
+        except ApiError as e:
+            slog("ERROR", str(e))
+            return None
+        except Exception as e:
+            slog("ERROR", str(e))
+            return None
+
+        if not content or 'Token' not in content:
+            slog("ERROR", f"トークン発行の応答にトークンがありません: {content}")
+            return None
+
+        token = content['Token']
+        self.set(token)
+        slog("INFO", f"トークン : {mask_token(token)}")
+        return token
+
+    def get(self):
+        """
+        トークンを返す（メモリ → 保存済みファイル → 新規発行の順）
+
+        Raises:
+            RuntimeError: トークンを発行できなかった場合
+        """
+        token = self._token or self.load()
+        if token:
+            return token
+        with self._lock:
+            token = self._token or self.issue()
+        if not token:
+            raise RuntimeError("APIトークンを取得できません")
+        return token
+
+    def refresh(self, rejected_token=None):
+        """
+        トークンを再発行する（401が返された場合に呼び出す）
+        他のスレッドが既に再発行していれば、その新しいトークンを返す
+
+        Returns:
+            str: 新しいトークン、失敗した場合はNone
+        """
+        with self._lock:
+            if rejected_token is not None and self._token and self._token != rejected_token:
+                return self._token
+            if rejected_token is None:
+                slog("INFO", "保存済みのトークンがないため発行します。")
             else:
+                slog("INFO", "トークンが無効なため再発行します。")
+            return self.issue()
+
+    def validate(self):
+        """
+        保存済みのトークンが使えるかを確認し、使えなければ再発行する
+
+        Returns:
+            bool: 有効なトークンを用意できたかどうか
+        """
+        token = self._token or self.load()
+        if token:
+            try:
+                self._client().request('GET', VALIDATE_PATH, auth=True, retry_unauthorized=False)
+                slog("INFO", "保存済みのトークンは有効です。")
+                return True
+            except ApiError as e:
+                # 401以外（5xxなど）は有効かどうか判断できないため失敗とする
+                if e.status != 401:
+                    slog("WARNING", f"トークンの確認に失敗: {e}")
+                    return False
+            except Exception as e:
+                slog("ERROR", f"トークンの確認でエラーが発生: {e}")
                 return False
-    except urllib.error.HTTPError as e:
-        slog("ERROR", str(e))
-        try:
-            content = json.loads(e.read())
-            pprint.pprint(content)
-        except:
-            pass
-        return False
-    except Exception as e:
-        slog("ERROR", str(e))
-        return False
+        return self.refresh(rejected_token=token) is not None
+
+# 接続先ごとのTokenManager
+_managers = {}
+_managers_lock = threading.Lock()
+
+def get_token_manager(use_test_api=True):
+    """接続先ごとの共有TokenManagerを返し、共有APIクライアントに登録する"""
+    with _managers_lock:
+        manager = _managers.get(use_test_api)
+        if manager is None:
+            manager = TokenManager(use_test_api)
+            client = get_client(use_test_api)
+            client.token_loader = manager.get
+            client.on_unauthorized = manager.refresh
+            _managers[use_test_api] = manager
+        return manager
+
+def get_token(use_test_api):
+    """
+    トークンを新しく発行し、tokenディレクトリに保存する
+
+    Args:
+        use_test_api: 検証用APIを使用するかどうか
+
+    Returns:
+        bool: 発行成功かどうか
+    """
+    return get_token_manager(use_test_api).issue() is not None
+
+def ensure_token(use_test_api):
+    """
+    有効なトークンを用意する（保存済みのトークンが有効ならそのまま使う）
+
+    Returns:
+        bool: 有効なトークンを用意できたかどうか
+    """
+    return get_token_manager(use_test_api).validate()
@@ -1,11 +1,33 @@
 from logger import slog
-import pandas_datareader.data as pdr
 import pandas as pd
 import talib as ta
 import numpy as np
-from .portfolio import read_capital, write_capital, calculate_commission, save_execution_to_position_file, get_all_positions, get_stocks_from_liquidity_data
-from .broker import buy_stock_cash, sell_stock_cash, wait_for_execution_and_get_price
-from .data_fetcher import fetch_yahoo_finance_data
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from .portfolio import read_capital, write_capital, calculate_commission, get_all_positions, get_stocks_from_liquidity_data
+from .position_store import save_executions
+from .broker import buy_stock_cash, sell_stock_cash, wait_for_execution
+from .data_fetcher import fetch_ranking_universe
+from .liquidity import write_liquidity_data
+from .bar_store import get_bars
+from .crossover import analyze_crossover_panel, SHORT_WINDOW, LONG_WINDOW
+from .sma_state import load_states, save_states, new_state, apply_bars, get_yesterday_signal, bars_needed, is_valid_state
+
+# 移動平均線・クロス判定に必要な日足本数（25日線 + 前日・前々日の比較 + 余裕分）
+INDICATOR_LOOKBACK = 60
+
+# 銘柄分析の並列数（1以下の場合は逐次実行）
+ANALYSIS_WORKERS = 8
+# Trueの場合はプロセスプール、Falseの場合はスレッドプールで並列実行
+ANALYSIS_USE_PROCESSES = False
+# 'panel': 全銘柄を2次元配列で一括計算, 'per_symbol': 銘柄ごとにTA-Libで計算,
+# 'stream': 保存済みの移動平均線の状態に新しい足だけを反映
+ANALYSIS_ENGINE = 'panel'
+
+# 同時に発注・約定待ちする注文数
+ORDER_WORKERS = 16
+# 検証用APIを使用するかどうか
+USE_TEST_API = True
 
 def get_targets():
     """
@@ -105,9 +127,16 @@ def update_capital_after_trading(buy_transactions, sell_transactions):
         return False
 
 
-def get_stock_data(code):
-	df = pdr.DataReader("{}.JP".format(code), "stooq").sort_index()
-	return df
+def get_stock_data(code, lookback=None):
+	"""
+	日足キャッシュ（db/bars）から株価データを取得する
+	キャッシュの最終日付より後の日足だけをstooqから差分取得する
+
+	Args:
+		code: 銘柄コード
+		lookback: 末尾から読み込む本数（Noneの場合は全期間）
+	"""
+	return get_bars(code, lookback=lookback)
 
 def analyze_stock_with_moving_averages(code, company_name):
 	"""
@@ -115,8 +144,8 @@ def analyze_stock_with_moving_averages(code, company_name):
 	"""
 	slog("INFO", f"{company_name}（{code}）の分析を開始します。")
 	
-	# 株価データ取得
-	df = get_stock_data(code)
+	# 株価データ取得（指標計算に必要な期間のみ）
+	df = get_stock_data(code, lookback=INDICATOR_LOOKBACK)
 	close = df['Close']
 	
 	# 移動平均線の計算（5日線と25日線）
@@ -175,9 +204,135 @@ def analyze_stock_with_moving_averages(code, company_name):
 	
 	return df, yesterday_gc, yesterday_dc
 
-def analyze_all_targets():
+def run_per_target(func, targets, max_workers=ANALYSIS_WORKERS, use_processes=ANALYSIS_USE_PROCESSES):
+	"""
+	銘柄ごとの処理 func(銘柄コード, 銘柄名) を並列に実行する
+
+	Args:
+		func: 銘柄ごとに呼び出す関数（プロセスプールの場合はpickle可能であること）
+		targets: [(銘柄コード, 銘柄名), ...] のリスト
+		max_workers: 並列数（1以下の場合は逐次実行）
+		use_processes: Trueの場合はプロセスプールを使用
+
+	Returns:
+		tuple: (outcomes, errors)
+			outcomes: [(銘柄コード, 銘柄名, funcの戻り値), ...]（targetsと同じ順序）
+			errors: [{'code': 銘柄コード, 'name': 銘柄名, 'error_type': 例外名, 'message': 内容}, ...]
+	"""
+	outcomes = []
+	errors = []
+
+	def collect(code, company_name, get_result):
+		try:
+			outcomes.append((code, company_name, get_result()))
+		except Exception as e:
+			slog("ERROR", f"{company_name}（{code}）の処理でエラーが発生: {e}")
+			errors.append({
+				'code': code,
+				'name': company_name,
+				'error_type': type(e).__name__,
+				'message': str(e),
+			})
+
+	if max_workers is None or max_workers <= 1 or len(targets) <= 1:
+		for code, company_name in targets:
+			collect(code, company_name, lambda: func(code, company_name))
+		return outcomes, errors
+
+	executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+	slog("INFO", f"{len(targets)}銘柄を並列処理します（{executor_class.__name__}, {max_workers}並列）")
+
+	with executor_class(max_workers=max_workers) as executor:
+		futures = [executor.submit(func, code, company_name) for code, company_name in targets]
+		# 完了順ではなくtargetsの順序で結果を回収する
+		for (code, company_name), future in zip(targets, futures):
+			collect(code, company_name, future.result)
+
+	return outcomes, errors
+
+def analyze_targets(targets, max_workers=ANALYSIS_WORKERS, use_processes=ANALYSIS_USE_PROCESSES):
+	"""
+	複数銘柄の移動平均線分析を並列に実行する
+
+	Returns:
+		tuple: (outcomes, errors)
+			outcomes: [(銘柄コード, 銘柄名, df, 前日GC, 前日DC), ...]（targetsと同じ順序）
+			errors: run_per_target と同じ形式のエラーリスト
+	"""
+	results, errors = run_per_target(analyze_stock_with_moving_averages, targets, max_workers, use_processes)
+	outcomes = [(code, company_name) + tuple(result) for code, company_name, result in results]
+	return outcomes, errors
+
+def load_target_bars(code, company_name):
+	"""指標計算に必要な期間の日足を取得する（run_per_target用）"""
+	return get_stock_data(code, lookback=INDICATOR_LOOKBACK)
+
+def analyze_targets_with_panel(targets, max_workers=ANALYSIS_WORKERS, use_processes=ANALYSIS_USE_PROCESSES):
+	"""
+	全銘柄の日足を取得した後、移動平均線・クロスを2次元配列で一括計算する
+
+	Returns:
+		tuple: (outcomes, errors) analyze_targets と同じ形式
+	"""
+	loaded, errors = run_per_target(load_target_bars, targets, max_workers, use_processes)
+	frames = {code: df for code, company_name, df in loaded}
+	names = {code: company_name for code, company_name, df in loaded}
+
+	panel = analyze_crossover_panel(frames, names)
+	buy_codes = {code for code, name in panel['buy_list']}
+	sell_codes = {code for code, name in panel['sell_list']}
+
+	for code, (gc_date, gc_value) in panel['latest_gc'].items():
+		slog("INFO", f"{names[code]}（{code}）最新のゴールデンクロス: {gc_date.strftime('%Y-%m-%d')} (価格: {gc_value:.2f}円)")
+	for code, (dc_date, dc_value) in panel['latest_dc'].items():
+		slog("INFO", f"{names[code]}（{code}）最新のデッドクロス: {dc_date.strftime('%Y-%m-%d')} (価格: {dc_value:.2f}円)")
+
+	outcomes = [
+		(code, company_name, df, code in buy_codes, code in sell_codes)
+		for code, company_name, df in loaded
+	]
+	return outcomes, errors
+
+def load_bars_for_state(lookbacks, code, company_name):
+	"""状態の更新に必要な本数の日足だけを取得する（run_per_target用）"""
+	return get_stock_data(code, lookback=lookbacks.get(code) or INDICATOR_LOOKBACK)
+
+def analyze_targets_with_state(targets, max_workers=ANALYSIS_WORKERS, use_processes=ANALYSIS_USE_PROCESSES):
+	"""
+	保存済みの移動平均線の状態（db/sma_state.json）に新しい足だけを反映して判定する
+	状態がない銘柄はINDICATOR_LOOKBACK本の日足から初期化する
+
+	Returns:
+		tuple: (outcomes, errors) analyze_targets と同じ形式
+	"""
+	states = load_states()
+	lookbacks = {code: bars_needed(states.get(code)) for code, company_name in targets}
+
+	loaded, errors = run_per_target(partial(load_bars_for_state, lookbacks), targets, max_workers, use_processes)
+
+	outcomes = []
+	for code, company_name, df in loaded:
+		state = states.get(code)
+		if (state is None or (state['short_window'], state['long_window']) != (SHORT_WINDOW, LONG_WINDOW)
+				or not is_valid_state(state)):
+			state = new_state(SHORT_WINDOW, LONG_WINDOW)
+			states[code] = state
+			slog("INFO", f"移動平均線の状態を初期化: {company_name}（{code}）")
+
+		applied = apply_bars(state, df)
+		yesterday_gc, yesterday_dc = get_yesterday_signal(state)
+		slog("INFO", f"{company_name}（{code}）: {applied}本を反映 (最終日: {state['last_date']})")
+		outcomes.append((code, company_name, df, yesterday_gc, yesterday_dc))
+
+	save_states(states)
+	return outcomes, errors
+
+def analyze_all_targets(max_workers=ANALYSIS_WORKERS, use_processes=ANALYSIS_USE_PROCESSES, engine=ANALYSIS_ENGINE):
 	"""
 	ポジションファイルから取得した全銘柄を分析し、buy_listとsell_listを作成
+
+	Returns:
+		tuple: (results, buy_list, sell_list, errors)
 	"""
 	slog("INFO", "全銘柄の移動平均線分析を開始します。")
 
@@ -188,23 +343,30 @@ def analyze_all_targets():
 	buy_list = []
 	sell_list = []
 
-	for code, company_name in targets:
-		try:
-			df, yesterday_gc, yesterday_dc = analyze_stock_with_moving_averages(code, company_name)
-			results[code] = df
-			
-			# 前日にゴールデンクロスが発生した銘柄をbuy_listに追加
-			if yesterday_gc:
-				buy_list.append((code, company_name))
-				slog("INFO", f"買いリストに追加: {company_name}（{code}）")
-			
-			# 前日にデッドクロスが発生した銘柄をsell_listに追加
-			if yesterday_dc:
-				sell_list.append((code, company_name))
-				slog("INFO", f"売りリストに追加: {company_name}（{code}）")
-				
-		except Exception as e:
-			slog("ERROR", f"{company_name}（{code}）の分析でエラーが発生: {e}")
+	if engine == 'panel':
+		outcomes, errors = analyze_targets_with_panel(targets, max_workers=max_workers, use_processes=use_processes)
+	elif engine == 'stream':
+		outcomes, errors = analyze_targets_with_state(targets, max_workers=max_workers, use_processes=use_processes)
+	else:
+		outcomes, errors = analyze_targets(targets, max_workers=max_workers, use_processes=use_processes)
+
+	for code, company_name, df, yesterday_gc, yesterday_dc in outcomes:
+		results[code] = df
+
+		# 前日にゴールデンクロスが発生した銘柄をbuy_listに追加
+		if yesterday_gc:
+			buy_list.append((code, company_name))
+			slog("INFO", f"買いリストに追加: {company_name}（{code}）")
+
+		# 前日にデッドクロスが発生した銘柄をsell_listに追加
+		if yesterday_dc:
+			sell_list.append((code, company_name))
+			slog("INFO", f"売りリストに追加: {company_name}（{code}）")
+
+	if errors:
+		slog("WARNING", f"分析に失敗した銘柄 ({len(errors)}銘柄):")
+		for error in errors:
+			slog("WARNING", f"  - {error['name']}（{error['code']}） {error['error_type']}: {error['message']}")
 	
 	# 結果をログに出力
 	slog("INFO", "=== 売買対象リスト ===")
@@ -216,12 +378,71 @@ def analyze_all_targets():
 	for code, name in sell_list:
 		slog("INFO", f"  - {name}（{code}）")
 	
-	return results, buy_list, sell_list
+	return results, buy_list, sell_list, errors
+
+def submit_and_wait(side, code, company_name, qty):
+	"""
+	1件の成行注文を送信し、約定を待つ（execute_orders用）
+
+	Returns:
+		dict: {'side', 'code', 'name', 'qty', 'price', 'status'}
+			status: 'filled'（約定） / 'partial'（一部約定） / 'rejected'（注文失敗） /
+				'unfilled'（約定価格取得失敗） / 'error'
+	"""
+	label = "購入" if side == 'buy' else "売却"
+	outcome = {'side': side, 'code': code, 'name': company_name, 'qty': qty, 'price': None, 'status': 'error'}
+
+	try:
+		slog("INFO", f"{label}処理: {company_name}（{code}）{qty}株 成行注文")
+		if side == 'buy':
+			result = buy_stock_cash(code, qty=qty, price=0, use_test_api=USE_TEST_API)
+		else:
+			result = sell_stock_cash(code, qty=qty, price=0, use_test_api=USE_TEST_API)
+
+		if not result:
+			slog("ERROR", f"{label}失敗: {company_name}（{code}）")
+			outcome['status'] = 'rejected'
+			return outcome
+
+		# 約定価格を取得（一部約定の場合は約定した数量だけを記録する）
+		execution = wait_for_execution(result, code, qty=qty, use_test_api=USE_TEST_API)
+		if execution and execution['status'] in ('filled', 'partial') and execution['price']:
+			slog("INFO", f"{label}成功: {company_name}（{code}）{execution['cum_qty']}株 約定価格={execution['price']}円")
+			outcome['qty'] = execution['cum_qty']
+			outcome['price'] = execution['price']
+			outcome['status'] = execution['status']
+		else:
+			slog("WARNING", f"{label}注文送信成功だが約定価格取得失敗: {company_name}（{code}）")
+			outcome['status'] = 'unfilled'
+
+	except Exception as e:
+		slog("ERROR", f"{label}処理でエラー: {company_name}（{code}） - {e}")
+
+	return outcome
+
+def execute_orders(orders, max_workers=ORDER_WORKERS):
+	"""
+	複数の成行注文を同時に送信し、約定を並行して待つ
+
+	Args:
+		orders: [('buy' または 'sell', 銘柄コード, 銘柄名, 数量), ...] のリスト
+		max_workers: 同時に処理する注文数
+
+	Returns:
+		list: submit_and_wait の結果（ordersと同じ順序）
+	"""
+	if not orders:
+		return []
+
+	with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(orders)))) as executor:
+		futures = [executor.submit(submit_and_wait, side, code, company_name, qty) for side, code, company_name, qty in orders]
+		# すべての注文が約定またはタイムアウトするまで待つ
+		return [future.result() for future in futures]
 
 def analyze_stock_data():
 	slog("INFO", "売買リストを作成します。")
 
-	results, buy_list, sell_list = analyze_all_targets()
+	results, buy_list, sell_list, errors = analyze_all_targets()
 
 	# capital.txtから今日の発注可能枠を取得
 	daily_capital = read_capital()
@@ -248,99 +469,51 @@ def analyze_stock_data():
 	# 	buy_list.append(test_stock)
 	# 	slog("INFO", f"テスト用に買いリストに追加: {test_stock[1]}（{test_stock[0]}）")
 
-	# 買いリストの銘柄を100株ずつ成行で購入（検証用API使用）
-	slog("INFO", "=== 購入処理開始 ===")
-	successful_orders = 0
-	total_orders = len(buy_list)
-	buy_execution_results = []  # 約定価格を記録するリスト
-	
-	if daily_capital > 0 and total_orders > 0:
-		for code, company_name in buy_list:
-			try:
-				slog("INFO", f"購入処理: {company_name}（{code}）100株 成行注文")
-				result = buy_stock_cash(code, qty=100, price=0, use_test_api=True)
-				
-				if result:
-					# 約定価格を取得
-					execution_price = wait_for_execution_and_get_price(result, code, use_test_api=True)
-					if execution_price:
-						buy_execution_results.append((code, company_name, 100, execution_price))
-						successful_orders += 1
-						slog("INFO", f"購入成功: {company_name}（{code}）約定価格={execution_price}円")
-						
-						# ポジションファイルに約定情報を記録
-						save_success = save_execution_to_position_file(code, 100, execution_price, 'buy')
-						if not save_success:
-							slog("WARNING", f"ポジションファイル記録失敗: {company_name}（{code}）")
-					else:
-						slog("WARNING", f"購入注文送信成功だが約定価格取得失敗: {company_name}（{code}）")
-				else:
-					slog("ERROR", f"購入失敗: {company_name}（{code}）")
-					
-			except Exception as e:
-				slog("ERROR", f"購入処理でエラー: {company_name}（{code}） - {e}")
-	
-	else:
-		if daily_capital <= 0:
-			slog("WARNING", "発注可能枠が0円のため購入処理をスキップしました")
-		if total_orders == 0:
-			slog("INFO", "購入対象がないため購入処理をスキップしました")
-	
-	slog("INFO", f"購入処理完了: {successful_orders}/{total_orders}件成功")
-
 	# テスト用: 強制的に最初の銘柄を売りリストに追加
 	# if not sell_list and targets:
 	# 	test_stock = targets[0]  # 最初の銘柄
 	# 	sell_list.append(test_stock)
 	# 	slog("INFO", f"テスト用に売りリストに追加: {test_stock[1]}（{test_stock[0]}）")
 
-	# 売りリストの銘柄を100株ずつ成行で売却（検証用API使用）
-	slog("INFO", "=== 売却処理開始 ===")
-	sell_successful_orders = 0
-	total_sell_orders = len(sell_list)
-	sell_execution_results = []  # 約定価格を記録するリスト
-	
-	for code, company_name in sell_list:
-		try:
-			slog("INFO", f"売却処理: {company_name}（{code}）100株 成行注文")
-			result = sell_stock_cash(code, qty=100, price=0, use_test_api=True)
-			
-			if result:
-				# 約定価格を取得
-				execution_price = wait_for_execution_and_get_price(result, code, use_test_api=True)
-				if execution_price:
-					sell_execution_results.append((code, company_name, 100, execution_price))
-					sell_successful_orders += 1
-					slog("INFO", f"売却成功: {company_name}（{code}）約定価格={execution_price}円")
-					
-					# ポジションファイルに約定情報を記録
-					save_success = save_execution_to_position_file(code, 100, execution_price, 'sell')
-					if not save_success:
-						slog("WARNING", f"ポジションファイル記録失敗: {company_name}（{code}）")
-				else:
-					slog("WARNING", f"売却注文送信成功だが約定価格取得失敗: {company_name}（{code}）")
-			else:
-				slog("ERROR", f"売却失敗: {company_name}（{code}）")
-				
-		except Exception as e:
-			slog("ERROR", f"売却処理でエラー: {company_name}（{code}） - {e}")
-	
-	if total_sell_orders == 0:
+	# 買いリスト・売りリストの銘柄を100株ずつ成行で同時に発注（検証用API使用）
+	orders = []
+
+	if daily_capital > 0 and buy_list:
+		orders += [('buy', code, company_name, 100) for code, company_name in buy_list]
+	else:
+		if daily_capital <= 0:
+			slog("WARNING", "発注可能枠が0円のため購入処理をスキップしました")
+		if not buy_list:
+			slog("INFO", "購入対象がないため購入処理をスキップしました")
+
+	if sell_list:
+		orders += [('sell', code, company_name, 100) for code, company_name in sell_list]
+	else:
 		slog("INFO", "売却対象がないため売却処理をスキップしました")
-	
-	slog("INFO", f"売却処理完了: {sell_successful_orders}/{total_sell_orders}件成功")
+
+	slog("INFO", f"=== 発注処理開始 ({len(orders)}件を同時発注) ===")
+	outcomes = execute_orders(orders)
+
+	buy_outcomes = [o for o in outcomes if o['side'] == 'buy']
+	sell_outcomes = [o for o in outcomes if o['side'] == 'sell']
+	filled = [o for o in outcomes if o['status'] in ('filled', 'partial')]
+
+	slog("INFO", f"購入処理完了: {sum(o['status'] == 'filled' for o in buy_outcomes)}/{len(buy_outcomes)}件成功")
+	slog("INFO", f"売却処理完了: {sum(o['status'] == 'filled' for o in sell_outcomes)}/{len(sell_outcomes)}件成功")
+
+	# 全注文の完了後に、約定分をまとめてポジションDBに記録
+	if filled:
+		saved = save_executions([(o['code'], o['qty'], o['price'], o['side']) for o in filled])
+		for o, save_success in zip(filled, saved):
+			if not save_success:
+				slog("WARNING", f"ポジション記録失敗: {o['name']}（{o['code']}）")
 
 	# 取引終了後にcapital.txtを更新
 	slog("INFO", "=== 残高更新処理開始 ===")
 	
 	# 実際の約定価格を使用して取引記録を作成
-	buy_transactions = []
-	for code, company_name, qty, execution_price in buy_execution_results:
-		buy_transactions.append((code, qty, execution_price))
-	
-	sell_transactions = []
-	for code, company_name, qty, execution_price in sell_execution_results:
-		sell_transactions.append((code, qty, execution_price))
+	buy_transactions = [(o['code'], o['qty'], o['price']) for o in filled if o['side'] == 'buy']
+	sell_transactions = [(o['code'], o['qty'], o['price']) for o in filled if o['side'] == 'sell']
 	
 	if buy_transactions or sell_transactions:
 		slog("INFO", "実際の約定価格に基づいて発注可能枠を更新します")
@@ -367,34 +540,19 @@ def execute_trade():
     """
     slog("INFO", "株価データ取得・取引処理を開始します。")
 
-    # 株価データをスクレイピング
-    stock_data = fetch_yahoo_finance_data()
+    # 東証プライム・スタンダード・グロースの売買代金上位をスクレイピング
+    stock_data = fetch_ranking_universe()
 
     if stock_data:
-        slog("INFO", f"東証グロース出来高上位データ取得完了: {len(stock_data)}銘柄")
+        slog("INFO", f"売買代金上位データ取得完了: {len(stock_data)}銘柄")
 
         # 取得したデータをログに出力
         for stock in stock_data[:10]:  # 上位10銘柄のみ表示
             slog("INFO", f"[{stock['rank']}位] {stock['name']}({stock['symbol']}): {stock['current_price']}円 ({stock['change']} {stock['change_rate']}) 出来高: {stock['volume']}")
 
-        # liquidity_data.txtにデータを出力
-        try:
-            with open('../db/liquidity_data.txt', 'w', encoding='utf-8') as f:
-                f.write("東証グロース出来高上位データ\n")
-                f.write("=" * 50 + "\n")
-                for stock in stock_data:
-                    f.write(f"順位: {stock['rank']}\n")
-                    f.write(f"銘柄名: {stock['name']}\n")
-                    f.write(f"銘柄コード: {stock['symbol']}\n")
-                    f.write(f"現在値: {stock['current_price']}円\n")
-                    f.write(f"前日比: {stock['change']}\n")
-                    f.write(f"前日比率: {stock['change_rate']}\n")
-                    f.write(f"出来高: {stock['volume']}\n")
-                    f.write("-" * 30 + "\n")
-
-            slog("INFO", "取得データをliquidity_data.txtに出力しました。")
-        except Exception as e:
-            slog("ERROR", f"liquidity_data.txtへの出力に失敗: {e}")
+        # liquidity_data.json / liquidity_data.txtにデータを出力
+        if write_liquidity_data(stock_data):
+            slog("INFO", "取得データをliquidity_data.json / liquidity_data.txtに出力しました。")
 
         analyze_stock_data()
         return True
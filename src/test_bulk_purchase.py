@@ -2,56 +2,29 @@
 """
 50銘柄を500株ずつ購入するテスト用スクリプト
 liquidity_data.txtから銘柄コードと価格を読み込み、
-.posファイルを生成する処理
+ポジションDBに記録する処理
 
-このスクリプトは実際の取引を行わず、テスト用のポジションファイルのみを生成します。
+このスクリプトは実際の取引を行わず、テスト用のポジションのみを記録します。
 """
 
-import os
-import re
-import datetime
-from taq.portfolio import save_execution_to_position_file
+from taq.position_store import save_executions
+from taq.liquidity import load_liquidity_index
 
 def parse_liquidity_data():
     """
-    liquidity_data.txtから銘柄コードと価格を抽出する
+    出来高上位データのインデックスから銘柄コードと価格を抽出する
 
     Returns:
         list: [(銘柄コード, 価格), ...] のリスト
     """
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    project_root = os.path.dirname(script_dir)
-    data_file = os.path.join(project_root, 'db', 'liquidity_data.txt')
+    index = load_liquidity_index()
+    stocks = [(symbol, int(record['current_price'])) for symbol, record in index.items()]
 
-    stocks = []
-
-    try:
-        with open(data_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-        # 銘柄コードと現在値を抽出するパターン
-        # 例: "銘柄コード: 3905" と "現在値: 2065円"
-        code_pattern = r'銘柄コード: ([^\s]+)'
-        price_pattern = r'現在値: ([0-9,]+)円'
-
-        codes = re.findall(code_pattern, content)
-        prices = re.findall(price_pattern, content)
-
-        # カンマを除去して数値に変換
-        prices = [int(p.replace(',', '')) for p in prices]
-
-        # コードと価格をペアにする
-        stocks = list(zip(codes, prices))
-
-        print(f"抽出された銘柄数: {len(stocks)}")
-
-    except FileNotFoundError:
-        print(f"ERROR: {data_file} が見つかりません")
-        return []
-    except Exception as e:
-        print(f"ERROR: データ解析でエラーが発生: {e}")
+    if not stocks:
+        print("ERROR: 出来高上位データが見つかりません")
         return []
 
+    print(f"抽出された銘柄数: {len(stocks)}")
     return stocks
 
 def bulk_purchase_test(stocks, quantity_per_stock=500):
@@ -73,30 +46,26 @@ def bulk_purchase_test(stocks, quantity_per_stock=500):
     print(f"対象銘柄数: {len(stocks)}")
     print(f"1銘柄あたり購入株数: {quantity_per_stock}株")
 
+    # テスト用の約定処理（実際の取引は行わない）
+    # テストでは現在値をそのまま約定価格とし、全銘柄を1トランザクションで記録する
+    executions = [(symbol, quantity_per_stock, price, 'buy') for symbol, price in stocks]
+    results = save_executions(executions)
+
     success_count = 0
     total_cost = 0
 
-    for i, (symbol, price) in enumerate(stocks, 1):
+    for i, ((symbol, price), success) in enumerate(zip(stocks, results), 1):
         print(f"\n[{i}/{len(stocks)}] 銘柄: {symbol}, 価格: {price}円")
 
-        # テスト用の約定処理（実際の取引は行わない）
-        execution_price = price  # テストでは現在値をそのまま約定価格とする
+        execution_price = price
         cost = quantity_per_stock * execution_price
 
-        # ポジションファイルに記録
-        success = save_execution_to_position_file(
-            symbol=symbol,
-            qty=quantity_per_stock,
-            execution_price=execution_price,
-            transaction_type='buy'
-        )
-
         if success:
             success_count += 1
             total_cost += cost
             print(f"  ✓ 成功: {quantity_per_stock}株 × {execution_price}円 = {cost:,}円")
         else:
-            print(f"  ✗ 失敗: ポジションファイル作成エラー")
+            print(f"  ✗ 失敗: ポジションDB記録エラー")
 
     print(f"\n=== 一括購入テスト完了 ===")
     print(f"成功: {success_count}/{len(stocks)}銘柄")